@@ -0,0 +1,541 @@
+'''
+Numerical equivalence gate of the Model engines. The references are the
+outputs of the legacy step by step workflow of the runner notebooks (inplace
+calls of the water_demand, energy_for_pumping and least_cost functions) run
+with the nexus_tool of a baseline commit, on the NWSAS 20 points data, on a
+synthetic fixture and on WEAP surface water time series. They are committed
+in benchmarks/golden, and every engine of the current tree (the legacy
+workflow included) is compared with them with per column tolerances. Run
+from the repository root, e.g.
+
+python -m benchmarks.equivalence
+python -m benchmarks.equivalence --engines pipeline cube --fixtures nwsas
+python -m benchmarks.equivalence --update --baseline 0582ae8
+
+The exit code is 1 when an engine fails or does not match the references.
+'''
+#Standard library imports
+import os
+import io
+import sys
+import ast
+import copy
+import json
+import time
+import shutil
+import tarfile
+import fnmatch
+import argparse
+import platform
+import tempfile
+import warnings
+import subprocess
+import pandas as pd
+import numpy as np
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+golden_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+target = 'get_unit_pumping_cost'
+# last commit before the optimized kernels
+baseline = '0582ae8'
+
+# (column pattern, rtol, atol), the first matching pattern is used
+tolerances = [('*', 1e-9, 1e-9)]
+
+class Fixture():
+    '''
+    inputs of a Model run: demand points, crop calendar, kc and ky values,
+    technologies (function creating them in a model), the model settings and
+    the legacy workflow computing the outputs. columns are the Model
+    attributes of the compared output columns (the ones written by the
+    stages of target by default) and engines the engines that can run the
+    fixture (all by default)
+    '''
+    def __init__(self, name, df, crop_calendar = None, kc_dict = {},
+                 ky_dict = {}, add_technologies = None, settings = {},
+                 workflow = None, columns = None, engines = None):
+        self.name = name
+        self.df = df
+        self.crop_calendar = crop_calendar
+        self.kc_dict = kc_dict
+        self.ky_dict = ky_dict
+        self.add_technologies = add_technologies
+        self.settings = settings
+        self.workflow = run_irrigation_workflow if workflow is None else workflow
+        self.columns = columns
+        self.engines = engines
+
+    def get_model(self, **kwargs):
+        from nexus_tool import Model
+
+        crop_calendar = None if self.crop_calendar is None else \
+                        self.crop_calendar.copy()
+        model = Model(self.df.copy(), crop_calendar = crop_calendar, **kwargs)
+        model.kc_dict = copy.deepcopy(self.kc_dict)
+        model.ky_dict = copy.deepcopy(self.ky_dict)
+        for name, value in self.settings.items():
+            setattr(model, name, value)
+        if self.add_technologies is not None:
+            self.add_technologies(model)
+        return model
+
+    def get_allowed(self, model):
+        return {country: list(model.technologies) for country in
+                self.df['country'].unique()}
+
+    def get_engines(self):
+        return list(engines) if self.engines is None else self.engines
+
+def add_nwsas_technologies(model):
+    # technologies of the NWSAS least cost runner
+    model.create_wind_turbine('Wind power', life=20, om_cost=0.02,
+                              capital_cost=1300, efficiency=0.6)
+    model.create_pv_system('Solar PV', life=15, om_cost=0.01,
+                           capital_cost=1140, efficiency=0.7)
+    model.create_standard_tech('Diesel set', life=10, om_cost=0.1,
+                               capital_cost=938, fuel_cost=model.df['Dprice1'],
+                               fuel_req=0.095, efficiency=0.27, cf=0.5,
+                               emission_factor=2.7, env_cost=0)
+    model.create_standard_tech('Grid pump', life=10, om_cost=0.1,
+                               capital_cost=845, fuel_cost=model.df['Epricelow'],
+                               fuel_req=1, efficiency=0.55, cf=0.8,
+                               emission_factor=0.728, env_cost=0)
+
+def get_nwsas_fixture():
+    '''
+    inputs of the bundled NWSAS 20 points data (the columns up to
+    crop_share, the rest are results) with the settings of the NWSAS
+    runner notebooks
+    '''
+    lines = pd.read_excel(os.path.join(root, 'NWSAS_waterdemand_20points_data.xlsx'),
+                          header=None)[0]
+    df = pd.read_csv(io.StringIO('\n'.join(lines)))
+    df = df.iloc[:, :list(df.columns).index('crop_share') + 1]
+    df['crop_share'] = df['crop_share'].map(ast.literal_eval)
+    fuel_prices = pd.read_excel(os.path.join(root, 'nwsas_data', 'Fuel_prices.xlsx'))
+    df = df.merge(fuel_prices[['country', 'Dprice1', 'Epricelow']], on='country')
+    crop_calendar = pd.read_excel(os.path.join(root, 'nwsas_data',
+                                               'NWSAS_crop_calendar.xlsx'))
+    kc_dict = {'dates': [0.8,0.9,1,0.8],
+               'vegetable': [0.5,1,1,0.8],
+               'olives': [0.45,0.55,0.55,0.6]}
+    ky_dict = {'dates': 0.5, 'vegetable': 1.1, 'olives': 0.8}
+    settings = {'pumping_hours_per_day': 10, 'deff': 1, 'aeff': 0.45,
+                'trans_eff': 0.9, 'pump_eff': 0.4, 'start_year': 2016,
+                'end_year': 2030, 'discount_rate': 0.05}
+    return Fixture('nwsas', df, crop_calendar, kc_dict, ky_dict,
+                   add_nwsas_technologies, settings)
+
+def get_synthetic_fixture(n_points = 500, n_crops = 5, n_technologies = 4):
+    from benchmarks.synthetic import (get_points, get_crop_calendar,
+                                      add_technologies)
+
+    df = get_points(n_points, n_crops)
+    crop_calendar, kc_dict, ky_dict = get_crop_calendar(n_crops)
+    settings = {'trans_eff': 0.9, 'pump_eff': 0.6, 'start_year': 2020,
+                'end_year': 2040, 'discount_rate': 0.05}
+    # constant fuel prices, the baseline has no fuel_escalation
+    return Fixture('synthetic', df, crop_calendar, kc_dict, ky_dict,
+                   lambda model: add_technologies(model, n_technologies,
+                                                  escalation = False),
+                   settings)
+
+def get_weap_fixture(n_points = 100, n_years = 2):
+    '''
+    long format WEAP results with the settings of the Souss-Massa runners,
+    for the surface water hydraulics (pipe area, flow velocity, Reynolds
+    number, friction factor, head and pumping energy)
+    '''
+    from benchmarks.synthetic import get_weap_series
+
+    settings = {'elevation': 'elevation_diff', 'L': 'distance', 'pwd': 'pwd',
+                'sswd': 'sswd', 'peak_Q': 'pwd', 'avg_Q': 'sswd',
+                'swpp_e': 'swpp_e', 'pd_e': 'swpp_e', 'swpa_e': 'swpa_e'}
+    return Fixture('weap', get_weap_series(n_points, n_years),
+                   settings = settings, workflow = run_weap_workflow,
+                   columns = ['A', 'mV', 'Re', 'f', 'tdh_sw', 'swpp_e',
+                              'swpa_e'],
+                   engines = ['legacy'])
+
+fixtures = {'nwsas': get_nwsas_fixture, 'synthetic': get_synthetic_fixture,
+            'weap': get_weap_fixture}
+
+def run_irrigation_workflow(model, fixture):
+    from nexus_tool.least_cost import get_least_cost
+
+    # the baseline get_total_pumping_energy requires the surface water
+    # energy, there is none in these ground water fixtures
+    for i in range(1,13):
+        model.df[f'{model.swpa_e}{i}'] = 0.0
+    model.get_eto(inplace = True)
+    model.get_effective_rainfall(inplace = True)
+    model.get_calendar_days(inplace = True)
+    model.get_kc_values(inplace = True)
+    model.get_water_demand(inplace = True)
+    model.get_gw_tdh(inplace = True)
+    model.get_GWpumping_energy(inplace = True)
+    model.get_total_pumping_energy(inplace = True)
+    model.get_annual_electricity(inplace = True)
+    model.get_cf()
+    model.get_installed_capacity()
+    model.get_max_capacity()
+    model.get_lcoe()
+    # every technology is allowed in every country. The least cost kernel is
+    # called directly, the baseline Model.get_least_cost unpacks its result
+    # frame into the column names
+    lcoe_df = pd.DataFrame({name: tech.df['lcoe'] for name, tech in
+                            model.technologies.items()})
+    least_cost = get_least_cost(lcoe_df)
+    model.df['least_cost_tech'] = least_cost['least_cost_technology']
+    model.df['lcoe'] = least_cost['lcoe']
+    model.get_pumping_cost(inplace = True)
+    model.get_unit_pumping_cost(inplace = True)
+
+def run_weap_workflow(model, fixture):
+    model.get_A(inplace = True)
+    model.get_V(inplace = True, axis = 0)
+    model.get_Re(inplace = True, axis = 0)
+    model.get_f(inplace = True, axis = 0)
+    model.get_sw_tdh(inplace = True, axis = 0)
+    model.get_SWpumping_energy(inplace = True, axis = 0)
+
+def run_legacy(fixture):
+    model = fixture.get_model()
+    fixture.workflow(model, fixture)
+    return model
+
+def run_pipeline(fixture, memory_optimizer = False, **kwargs):
+    model = fixture.get_model(**kwargs)
+    model.memory_optimizer = memory_optimizer
+    model.set_stage_options('get_least_cost', geo_boundary = 'country',
+                            technologies = fixture.get_allowed(model))
+    model.run(target)
+    return model
+
+def run_samples(fixture):
+    '''
+    pipeline whose technology and least cost lcoe are replaced by the
+    closed-form ones of get_lcoe_samples (through get_lcoe_sensitivity,
+    with the base parameters as the only sample and several point blocks)
+    '''
+    from nexus_tool.sensitivity import sample_parameters
+
+    model = run_pipeline(fixture)
+    samples = sample_parameters({'discount_rate': [model.discount_rate]}, 1)
+    lcoe_df, _ = model.get_lcoe_sensitivity(samples, percentiles = (50,),
+                                            geo_boundary = 'country',
+                                            technologies = fixture.get_allowed(model),
+                                            chunk_size = max(model.df.shape[0] // 3, 1))
+    for name, tech in model.technologies.items():
+        tech.df['lcoe'] = lcoe_df[f'{name} p50']
+    model.df['lcoe'] = lcoe_df['lcoe p50']
+    return model
+
+def run_chunked(fixture):
+    model = fixture.get_model()
+    model.set_stage_options('get_least_cost', geo_boundary = 'country',
+                            technologies = fixture.get_allowed(model))
+    def prepare(chunk_model):
+        # the fuel prices are given per point, so the technologies are
+        # created again for every block
+        chunk_model.technologies = {}
+        fixture.add_technologies(chunk_model)
+
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'source.parquet')
+        output = os.path.join(folder, 'output.parquet')
+        model.df.to_parquet(source, index=False)
+        model.run_chunked(source, output, target = target,
+                          chunk_size = max(model.df.shape[0] // 3, 1),
+                          geo_boundary = 'country', prepare = prepare)
+        model.df = pd.read_parquet(output)
+    # the per block technology results are not kept
+    model.technologies = {}
+    return model
+
+# name -> (function running a fixture and returning the model, tolerances
+# checked before the default ones)
+engines = {'legacy': (run_legacy, []),
+           'pipeline': (run_pipeline, []),
+           'columns': (lambda fixture: run_pipeline(fixture, copy_mode = 'columns'), []),
+           'cube': (lambda fixture: run_pipeline(fixture, backend = 'cube'), []),
+           'memory': (lambda fixture: run_pipeline(fixture, memory_optimizer = True),
+                      [('*', 1e-4, 1e-6)]),
+           'chunked': (run_chunked, []),
+           'samples': (run_samples, [])}
+
+def register_engine(name, function, engine_tolerances = []):
+    '''
+    adds an engine to the gate: function(fixture) must return the Model
+    after computing the outputs of get_unit_pumping_cost
+    '''
+    engines[name] = (function, engine_tolerances)
+
+def get_output_columns(fixture):
+    '''
+    compared columns of a fixture: the given Model attributes, or the
+    columns written by the stages of target (not their intermediates, nor
+    the optional stages without input data)
+    '''
+    from nexus_tool.pipeline import (stages, get_columns, get_stage_name,
+                                     is_available)
+
+    model = fixture.get_model()
+    if fixture.columns is not None:
+        return [getattr(model, name) for name in fixture.columns]
+    order = []
+    def visit(name):
+        if name in order:
+            return
+        for requirement in stages[name].requires:
+            visit(requirement)
+        for requirement in stages[name].optional:
+            if is_available(model, requirement, None):
+                visit(requirement)
+        order.append(name)
+    visit(get_stage_name(target))
+    return get_columns(model, [spec for name in order for spec in
+                               stages[name].writes])
+
+def get_outputs(model, columns = None):
+    '''
+    reference tables of a model run: the output columns (all by default),
+    the crop calendar kc values and the technology capacities and lcoe
+    '''
+    columns = list(model.df.columns) if columns is None else \
+              [column for column in columns if column in model.df.columns]
+    outputs = {'points': model.df[columns].reset_index(drop=True)}
+    kc = ['{}{}'.format(model.kc, i) for i in range(1,13)]
+    if (model.crop_calendar is not None) and \
+       all(column in model.crop_calendar.columns for column in kc):
+        outputs['kc'] = model.crop_calendar[[model.crop_column] + kc]
+    technologies = pd.DataFrame(index=model.df.index)
+    for name, tech in model.technologies.items():
+        df = getattr(tech, 'df', None)
+        for column in ['max_cap', 'lcoe']:
+            if isinstance(df, pd.DataFrame) and (column in df.columns):
+                technologies[f'{name}|{column}'] = df[column]
+    if not technologies.empty:
+        outputs['technologies'] = technologies.reset_index(drop=True)
+    return outputs
+
+def get_tolerance(column, engine_tolerances = []):
+    for pattern, rtol, atol in list(engine_tolerances) + tolerances:
+        if fnmatch.fnmatch(column, pattern):
+            return rtol, atol
+
+def compare(reference, outputs, engine_tolerances = []):
+    '''
+    one row per compared column, with the maximum absolute and relative
+    errors and whether the column is within its tolerance
+    '''
+    rows = []
+    for table, expected in reference.items():
+        if table not in outputs:
+            continue
+        actual = outputs[table]
+        for column in expected.columns:
+            row = {'table': table, 'column': column}
+            if column not in actual.columns:
+                rows.append(dict(row, passed = False, error = 'missing'))
+                continue
+            if len(actual[column]) != len(expected[column]):
+                rows.append(dict(row, passed = False, error = 'shape'))
+                continue
+            if pd.api.types.is_numeric_dtype(expected[column]):
+                rtol, atol = get_tolerance(column, engine_tolerances)
+                a = expected[column].to_numpy(dtype=float)
+                b = actual[column].to_numpy(dtype=float)
+                with np.errstate(invalid='ignore'):
+                    difference = np.abs(a - b)
+                    difference[np.isnan(a) & np.isnan(b)] = 0
+                    difference[(a == b)] = 0
+                    relative = difference / np.maximum(np.abs(a), atol)
+                close = np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+                rows.append(dict(row, passed = bool(close.all()),
+                                 max_abs_error = np.nanmax(difference, initial=0),
+                                 max_rel_error = np.nanmax(relative, initial=0)))
+            else:
+                equal = expected[column].astype(str).values == \
+                        actual[column].astype(str).values
+                rows.append(dict(row, passed = bool(equal.all()),
+                                 mismatches = int((~equal).sum())))
+    return pd.DataFrame(rows)
+
+def get_reference_folder(name):
+    return os.path.join(golden_folder, name)
+
+def write_tables(folder, outputs, meta = {}):
+    os.makedirs(folder, exist_ok=True)
+    for table, df in outputs.items():
+        df.to_parquet(os.path.join(folder, f'{table}.parquet'), index=False)
+    with open(os.path.join(folder, 'meta.json'), 'w') as f:
+        json.dump(dict(meta, date = time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       python = platform.python_version(),
+                       pandas = pd.__version__, numpy = np.__version__), f,
+                  indent=1)
+
+def read_reference(name):
+    folder = get_reference_folder(name)
+    if not os.path.isdir(folder):
+        return None
+    return {file_name[:-len('.parquet')]: pd.read_parquet(os.path.join(folder, file_name))
+            for file_name in sorted(os.listdir(folder)) if file_name.endswith('.parquet')}
+
+def write_baseline_outputs(fixture_name, columns, output):
+    '''
+    runs the legacy workflow of a fixture with the nexus_tool importable
+    from the working directory (the baseline, see update_references) and
+    writes its outputs to the output folder, as csv files with all the
+    float digits since the baseline does not depend on pyarrow
+    '''
+    import nexus_tool
+
+    fixture = fixtures[fixture_name]()
+    model = run_legacy(fixture)
+    os.makedirs(output, exist_ok=True)
+    for table, df in get_outputs(model, columns).items():
+        df.to_csv(os.path.join(output, f'{table}.csv'), index=False,
+                  float_format='%.17g')
+    with open(os.path.join(output, 'meta.json'), 'w') as f:
+        json.dump({'nexus_tool': os.path.dirname(os.path.abspath(nexus_tool.__file__)),
+                   'python': platform.python_version(),
+                   'pandas': pd.__version__, 'numpy': np.__version__}, f)
+
+def update_references(fixture_names = list(fixtures), revision = baseline,
+                      python = sys.executable):
+    '''
+    writes the references of the fixtures with the legacy workflow of the
+    nexus_tool of a git revision, extracted to a temporary folder and run in
+    a subprocess of python (an interpreter with the dependencies of that
+    revision, e.g. pandas < 2 for the baseline)
+    '''
+    archive = subprocess.run(['git', 'archive', revision, 'nexus_tool'],
+                             cwd=root, capture_output=True, check=True).stdout
+    commit = subprocess.run(['git', 'rev-parse', '--short', revision], cwd=root,
+                            capture_output=True, text=True,
+                            check=True).stdout.strip()
+    with tempfile.TemporaryDirectory() as folder:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(folder)
+        # the working directory comes first in sys.path with -m, so the
+        # baseline nexus_tool is imported instead of the one of root
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+                        [root] + [path for path in
+                                  [os.environ.get('PYTHONPATH')] if path]))
+        for fixture_name in fixture_names:
+            output = os.path.join(folder, 'outputs', fixture_name)
+            columns = os.path.join(folder, f'{fixture_name}.json')
+            with open(columns, 'w') as f:
+                json.dump(get_output_columns(fixtures[fixture_name]()), f)
+            process = subprocess.run([python, '-m', 'benchmarks.equivalence',
+                                      '--baseline-outputs', fixture_name,
+                                      columns, output], cwd=folder, env=env,
+                                     capture_output=True, text=True)
+            if process.returncode:
+                raise RuntimeError(f'The legacy workflow of {commit} failed on '
+                                   f'{fixture_name}:\n{process.stderr}')
+            with open(os.path.join(output, 'meta.json')) as f:
+                meta = json.load(f)
+            if not meta.pop('nexus_tool').startswith(os.path.abspath(folder)):
+                raise RuntimeError(f'The legacy workflow did not run with the '
+                                   f'nexus_tool of {commit}')
+            reference = get_reference_folder(fixture_name)
+            if os.path.isdir(reference):
+                shutil.rmtree(reference)
+            outputs = {name[:-len('.csv')]: pd.read_csv(os.path.join(output, name))
+                       for name in sorted(os.listdir(output)) if name.endswith('.csv')}
+            write_tables(reference, outputs, {'baseline': commit,
+                                              'baseline_environment': meta})
+
+def run_timed(function, fixture):
+    start = time.perf_counter()
+    model = function(fixture)
+    return model, time.perf_counter() - start
+
+def check(fixture_names = list(fixtures), engine_names = None):
+    '''
+    runs the engines on the fixtures and compares them with the references.
+    An engine that raises is reported as failed
+
+    Returns the summary (one row per fixture and engine, with the time,
+    speedup over the legacy workflow and maximum errors) and the per column
+    details
+    '''
+    summary = []
+    details = []
+    for fixture_name in fixture_names:
+        fixture = fixtures[fixture_name]()
+        reference = read_reference(fixture_name)
+        if reference is None:
+            summary.append({'fixture': fixture_name, 'engine': 'references',
+                            'passed': False,
+                            'error': 'no references, run with --update'})
+            continue
+        legacy_time = np.nan
+        for engine_name in fixture.get_engines():
+            if (engine_names is not None) and (engine_name not in engine_names):
+                continue
+            row = {'fixture': fixture_name, 'engine': engine_name}
+            function, engine_tolerances = engines[engine_name]
+            try:
+                model, elapsed = run_timed(function, fixture)
+                outputs = get_outputs(model)
+            except Exception as error:
+                summary.append(dict(row, passed = False,
+                                    error = f'{type(error).__name__}: {error}'[:500]))
+                continue
+            if engine_name == 'legacy':
+                legacy_time = elapsed
+            result = compare(reference, outputs, engine_tolerances)
+            result.insert(0, 'engine', engine_name)
+            result.insert(0, 'fixture', fixture_name)
+            details.append(result)
+            numeric = result.dropna(subset=['max_abs_error']) if \
+                      'max_abs_error' in result.columns else result.iloc[:0]
+            summary.append(dict(row, time = elapsed,
+                                speedup = legacy_time / elapsed,
+                                columns = result.shape[0],
+                                failed = int((~result['passed']).sum()),
+                                max_abs_error = numeric['max_abs_error'].max(),
+                                max_rel_error = numeric['max_rel_error'].max(),
+                                passed = bool(result['passed'].all())))
+    return pd.DataFrame(summary), pd.concat(details, ignore_index=True) \
+                                  if details else pd.DataFrame()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='nexus_tool numerical equivalence gate')
+    parser.add_argument('--fixtures', nargs='+', choices=list(fixtures),
+                        default=list(fixtures))
+    parser.add_argument('--engines', nargs='+', choices=list(engines))
+    parser.add_argument('--update', action='store_true',
+                        help='regenerate the references from the legacy '
+                             'workflow of the baseline')
+    parser.add_argument('--baseline', default=baseline,
+                        help='git revision of the references')
+    parser.add_argument('--python', default=sys.executable,
+                        help='interpreter running the baseline')
+    parser.add_argument('--baseline-outputs', nargs=3,
+                        metavar=('FIXTURE', 'COLUMNS', 'OUTPUT'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    warnings.simplefilter('ignore')
+    if args.baseline_outputs:
+        fixture_name, columns, output = args.baseline_outputs
+        with open(columns) as f:
+            write_baseline_outputs(fixture_name, json.load(f), output)
+        return 0
+    if args.update:
+        update_references(args.fixtures, args.baseline, args.python)
+    summary, details = check(args.fixtures, args.engines)
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None,
+                           'display.width', 200):
+        print(summary)
+        if not details.empty:
+            failed = details.loc[~details['passed']]
+            if not failed.empty:
+                print(failed)
+    return 0 if summary['passed'].all() else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
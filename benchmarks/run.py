@@ -0,0 +1,245 @@
+'''
+Scaling benchmarks of the Model stages on synthetic data. Every case varies
+one dimension (points, crops, years or technologies) from the base case and
+runs in its own process, so the peak memory of each case is measured
+separately. Run from the repository root, e.g.
+
+python -m benchmarks.run --suite quick
+python -m benchmarks.run --suite full --dimensions points crops
+python -m benchmarks.run --compare benchmarks/results/a.json benchmarks/results/b.json
+'''
+#Standard library imports
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+import platform
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+
+suites = {'quick': {'base': {'points': 1000, 'crops': 3, 'years': 15,
+                             'technologies': 4},
+                    'points': [1000, 10000],
+                    'crops': [1, 3, 10],
+                    'years': [1, 15],
+                    'technologies': [2, 4]},
+          'full': {'base': {'points': 10000, 'crops': 3, 'years': 15,
+                            'technologies': 4},
+                   'points': [1000, 10000, 100000, 1000000, 10000000],
+                   'crops': [1, 3, 10, 25, 50],
+                   'years': [1, 5, 15, 30, 50],
+                   'technologies': [1, 2, 4, 8, 16]}}
+dimensions = ['points', 'crops', 'years', 'technologies']
+
+def get_cases(suite, selected = dimensions, pipelines = ['irrigation', 'weap']):
+    '''
+    one factor at a time cases of a suite, without duplicates
+    '''
+    cases = []
+    for pipeline in pipelines:
+        for dimension in selected:
+            if (pipeline == 'weap') and (dimension in ['crops', 'technologies']):
+                continue
+            for value in suites[suite][dimension]:
+                case = dict(suites[suite]['base'], pipeline = pipeline)
+                case[dimension] = value
+                if case not in cases:
+                    cases.append(case)
+    return cases
+
+def get_irrigation_model(case, backend):
+    from nexus_tool import Model
+    from benchmarks.synthetic import (get_points, get_crop_calendar,
+                                      add_technologies, countries)
+
+    df = get_points(case['points'], case['crops'])
+    crop_calendar, kc_dict, ky_dict = get_crop_calendar(case['crops'])
+    model = Model(df, crop_calendar = crop_calendar, pump_eff = 0.6,
+                  trans_eff = 0.9, backend = backend)
+    model.kc_dict = kc_dict
+    model.ky_dict = ky_dict
+    model.start_year = 2020
+    # the first project year is the construction year, without generation
+    model.end_year = 2020 + case['years'] + 1
+    model.discount_rate = 0.05
+    add_technologies(model, case['technologies'])
+    # every technology allowed in every country, as in the NWSAS runner
+    model.set_stage_options('get_least_cost', geo_boundary = 'country',
+                            technologies = {country: list(model.technologies)
+                                            for country in countries})
+    return model
+
+def run_irrigation(model):
+    model.run('get_unit_pumping_cost')
+
+def get_weap_model(case, backend):
+    from nexus_tool import Model
+    from benchmarks.synthetic import get_weap_series
+
+    model = Model(get_weap_series(case['points'], case['years']))
+    # same settings as the Souss-Massa runners
+    model.elevation = 'elevation_diff'
+    model.L = 'distance'
+    model.pwd = 'pwd'
+    model.sswd = 'sswd'
+    model.peak_Q = model.pwd
+    model.avg_Q = model.sswd
+    model.swpp_e = 'swpp_e'
+    model.pd_e = 'swpp_e'
+    model.swpa_e = 'swpa_e'
+    return model
+
+def run_weap(model):
+    model.get_A(inplace=True)
+    model.get_V(inplace=True, axis=0)
+    model.get_Re(inplace=True, axis=0)
+    model.get_f(inplace=True, axis=0)
+    model.get_sw_tdh(inplace=True, axis=0)
+    model.get_SWpumping_energy(inplace=True, axis=0)
+
+pipelines = {'irrigation': (get_irrigation_model, run_irrigation),
+             'weap': (get_weap_model, run_weap)}
+
+def run_case(case, backend = 'wide'):
+    '''
+    generates the data of a case and times every Model stage and the whole
+    pipeline
+    '''
+    from nexus_tool.profiling import (record_profile, get_profile,
+                                      get_peak_rss, get_rss)
+
+    warnings.simplefilter('ignore')
+    result = dict(case, backend = backend)
+    get_model, run = pipelines[case['pipeline']]
+    start = time.perf_counter()
+    model = get_model(case, backend)
+    result['generate_time'] = time.perf_counter() - start
+    result['rows'] = model.df.shape[0]
+    rss = get_rss()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        with record_profile():
+            run(model)
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'[:500]
+    result['wall_time'] = time.perf_counter() - wall
+    result['cpu_time'] = time.process_time() - cpu
+    # every case runs in a new process, so the high water mark is the peak
+    # memory of the case (data generation included)
+    result['peak_rss'] = get_peak_rss()
+    result['rss_delta'] = get_rss() - rss
+    profile = get_profile()
+    profile = profile.loc[profile['name'].str.startswith('Model.')]
+    result['stages'] = {name.split('.', 1)[1]: {
+                            'wall_time': group['wall_time'].sum(),
+                            'cpu_time': group['cpu_time'].sum(),
+                            'rss_delta': int(group['rss_delta'].max())}
+                        for name, group in profile.groupby('name', sort=False)}
+    return result
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run_suite(suite = 'quick', selected = dimensions,
+              selected_pipelines = ['irrigation', 'weap'], backend = 'wide',
+              max_rows = 50000000, output = None):
+    '''
+    runs the cases of a suite, each one in a new process, and writes the
+    results to output (benchmarks/results/<commit>-<suite>-<backend>.json
+    by default)
+    '''
+    commit = get_commit()
+    results = {'commit': commit, 'suite': suite,
+               'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'pandas': pd.__version__, 'numpy': np.__version__,
+               'platform': platform.platform(),
+               'cpu_count': os.cpu_count(), 'cases': []}
+    context = multiprocessing.get_context('spawn')
+    for case in get_cases(suite, selected, selected_pipelines):
+        rows = case['points'] * (case['years'] * 12 if case['pipeline'] == 'weap'
+                                 else 1)
+        if rows > max_rows:
+            results['cases'].append(dict(case, backend = backend, rows = rows,
+                                         skipped = f'more than {max_rows} rows'))
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_case, case, backend).result()
+        results['cases'].append(result)
+        print(format_result(result), flush=True)
+
+    if output is None:
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'results', f'{commit}-{suite}-{backend}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f'Results written to {output}')
+    return results
+
+def format_result(result):
+    case = ', '.join(f'{name}={result[name]}' for name in dimensions)
+    if 'error' in result:
+        return f"{result['pipeline']} ({case}): {result['error']}"
+    return (f"{result['pipeline']} ({case}): {result['wall_time']:.3f} s, "
+            f"{result['peak_rss'] / 1024 ** 2:.1f} MiB peak")
+
+def get_table(results):
+    '''
+    one row per case and stage (plus 'total' for the whole pipeline)
+    '''
+    rows = []
+    for result in results['cases']:
+        if ('skipped' in result) or ('error' in result):
+            continue
+        case = {name: result[name] for name in ['pipeline', 'backend'] + dimensions}
+        rows.append(dict(case, stage = 'total', wall_time = result['wall_time']))
+        for stage, values in result['stages'].items():
+            rows.append(dict(case, stage = stage, wall_time = values['wall_time']))
+    return pd.DataFrame(rows)
+
+def compare(before, after):
+    '''
+    wall times of two result files and their ratio (after / before)
+    '''
+    tables = []
+    for path in [before, after]:
+        with open(path) as f:
+            tables.append(get_table(json.load(f)))
+    keys = ['pipeline'] + dimensions + ['stage']
+    table = tables[0].merge(tables[1], on=keys, suffixes=('_before', '_after'))
+    table['ratio'] = table['wall_time_after'] / table['wall_time_before']
+    return table
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='nexus_tool scaling benchmarks')
+    parser.add_argument('--suite', choices=list(suites), default='quick')
+    parser.add_argument('--dimensions', nargs='+', choices=dimensions,
+                        default=dimensions)
+    parser.add_argument('--pipelines', nargs='+', choices=list(pipelines),
+                        default=list(pipelines))
+    parser.add_argument('--backend', choices=['wide', 'cube'], default='wide')
+    parser.add_argument('--max-rows', type=int, default=50000000)
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    args = parser.parse_args(argv)
+    if args.compare:
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(compare(*args.compare))
+        return
+    run_suite(args.suite, args.dimensions, args.pipelines, args.backend,
+              args.max_rows, args.output)
+
+if __name__ == '__main__':
+    sys.exit(main())
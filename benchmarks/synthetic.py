@@ -0,0 +1,133 @@
+#Standard library imports
+import datetime
+import pandas as pd
+import numpy as np
+
+months = range(1,13)
+countries = ['Algeria', 'Tunisia', 'Libya']
+
+def get_crops(n_crops):
+    return [f'crop_{i}' for i in range(n_crops)]
+
+def get_points(n_points, n_crops = 3, seed = 0):
+    '''
+    demand points with the columns of the NWSAS input data: location,
+    elevation, ground water depth, cropland area and share, and the monthly
+    climate columns (tmin, tavg, tmax, prec, srad and wind)
+    '''
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'long': rng.uniform(-1, 12, n_points),
+                       'lat': rng.uniform(25, 35, n_points),
+                       'elevation': rng.uniform(0, 800, n_points),
+                       'gw_depth': rng.uniform(5, 150, n_points),
+                       'crop_area': rng.uniform(0.1, 20, n_points),
+                       'country': rng.choice(countries, n_points),
+                       'Dprice1': rng.uniform(0.1, 0.9, n_points),
+                       'Epricelow': rng.uniform(0.03, 0.2, n_points)})
+    season = np.cos((np.arange(12) - 6.5) / 12 * 2 * np.pi)
+    base = rng.uniform(15, 25, (n_points, 1))
+    tavg = base - 10 * season + rng.normal(0, 1, (n_points, 12))
+    climate = {'tmin': tavg - rng.uniform(5, 10, (n_points, 12)),
+               'tavg': tavg,
+               'tmax': tavg + rng.uniform(5, 10, (n_points, 12)),
+               'prec': rng.gamma(1, 10, (n_points, 12)),
+               'srad': 20000 - 8000 * season + rng.normal(0, 1000, (n_points, 12)),
+               'wind': rng.uniform(1, 8, (n_points, 12))}
+    columns = {f'{name}{i}': values[:, i - 1] for name, values in
+               climate.items() for i in months}
+    df = pd.concat([df, pd.DataFrame(columns)], axis=1)
+    crops = get_crops(n_crops)
+    shares = rng.dirichlet(np.ones(n_crops), n_points)
+    df['crop_share'] = [dict(zip(crops, share)) for share in shares]
+    return df
+
+def get_crop_calendar(n_crops, seed = 0):
+    '''
+    crop calendar with four consecutive seasons per crop, the kc values
+    (init, dev, mid, late) and the yield response factors (ky)
+    '''
+    rng = np.random.default_rng(seed)
+    crops = get_crops(n_crops)
+    calendar = []
+    kc_dict = {}
+    ky_dict = {}
+    for crop in crops:
+        row = {'crop': crop}
+        # seasons start on the first day of a month, as in the NWSAS calendar
+        day = datetime.date(2001, int(rng.integers(1, 13)), 1)
+        for season, (low, high) in zip(['init', 'dev', 'mid', 'late'],
+                                       [(20, 60), (30, 60), (40, 120), (20, 40)]):
+            end = day + datetime.timedelta(days=int(rng.integers(low, high)))
+            row[f'{season}_start'] = day.strftime('%d/%m')
+            row[f'{season}_end'] = end.strftime('%d/%m')
+            day = end + datetime.timedelta(days=1)
+        calendar.append(row)
+        kc_init = rng.uniform(0.3, 0.6)
+        kc_mid = rng.uniform(0.9, 1.2)
+        kc_dict[crop] = [kc_init, (kc_init + kc_mid) / 2, kc_mid,
+                         rng.uniform(0.5, 0.9)]
+        ky_dict[crop] = rng.uniform(0.6, 1.2)
+    return pd.DataFrame(calendar), kc_dict, ky_dict
+
+def add_technologies(model, n_technologies, seed = 0, escalation = True):
+    '''
+    creates n_technologies technologies in the model, cycling through wind
+    turbines, PV systems, diesel sets and grid pumps with perturbed costs.
+    With escalation = False the fuel prices are constant (as in the models
+    without fuel_escalation)
+    '''
+    rng = np.random.default_rng(seed)
+    escalations = [{'fuel_escalation': 0.02}, {'fuel_escalation': 0.01}] if \
+                  escalation else [{}, {}]
+    for i in range(n_technologies):
+        kind = i % 4
+        factor = rng.uniform(0.8, 1.2)
+        if kind == 0:
+            model.create_wind_turbine(f'Wind power {i}', life=20, om_cost=0.02,
+                                      capital_cost=1300 * factor,
+                                      efficiency=0.6)
+        elif kind == 1:
+            model.create_pv_system(f'Solar PV {i}', life=15, om_cost=0.01,
+                                   capital_cost=1140 * factor, efficiency=0.7)
+        elif kind == 2:
+            model.create_standard_tech(f'Diesel set {i}', life=10, om_cost=0.1,
+                                       capital_cost=938 * factor,
+                                       efficiency=0.27, cf=0.5,
+                                       fuel_cost=model.df['Dprice1'],
+                                       fuel_req=0.095, emission_factor=2.7,
+                                       env_cost=0, **escalations[0])
+        else:
+            model.create_standard_tech(f'Grid pump {i}', life=10, om_cost=0.1,
+                                       capital_cost=845 * factor,
+                                       efficiency=0.55, cf=0.8,
+                                       fuel_cost=model.df['Epricelow'],
+                                       fuel_req=1, emission_factor=0.728,
+                                       env_cost=0, **escalations[1])
+    return model
+
+def get_weap_series(n_points, n_years, start_year = 2020, seed = 0):
+    '''
+    long format WEAP results, one row per demand point, year and month, with
+    the columns used by the Souss-Massa runners (Demand point, Supply point,
+    links, type, Year, Month, sswd, pwd, elevation_diff and distance)
+    '''
+    rng = np.random.default_rng(seed)
+    points = pd.DataFrame({'Demand point': [f'DP {i}' for i in range(n_points)],
+                           'Supply point': [f'SP {i % 50}' for i in range(n_points)],
+                           'type': rng.choice(['Agriculture', 'Domestic', 'GW pumping'],
+                                              n_points),
+                           'elevation_diff': rng.uniform(5, 300, n_points),
+                           'distance': rng.uniform(100, 50000, n_points),
+                           'Pipe_diameter': rng.choice([0.4, 0.8], n_points)})
+    points['links'] = points['Supply point'] + ' to ' + points['Demand point']
+    index = pd.MultiIndex.from_product([range(n_points),
+                                        range(start_year, start_year + n_years),
+                                        months], names=['point', 'Year', 'Month'])
+    df = index.to_frame(index=False)
+    df = points.iloc[df['point'].values].reset_index(drop=True).join(
+                                                    df[['Year', 'Month']])
+    seasonal = 1 + 0.5 * np.sin((df['Month'].values - 4) / 12 * 2 * np.pi)
+    df['sswd'] = rng.gamma(2, 50000, df.shape[0]) * seasonal
+    df['pwd'] = df['sswd'] / 3600 / 30 / 10
+    df.loc[df['type'] == 'Agriculture', 'pwd'] *= 2
+    return df
@@ -1,4 +1,5 @@
 #Standard library imports
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from pandas import read_csv
@@ -17,8 +18,11 @@ from nexus_tool.water_demand import (
     get_calendar_days,
     get_kc_values,
     get_water_demand,
+    get_water_demand_cube,
 )
 
+from nexus_tool.cube import Cube
+
 from nexus_tool.energy_for_pumping import (
     get_gw_tdh,
     get_A,
@@ -35,16 +39,96 @@ from nexus_tool.energy_for_pumping import (
 from nexus_tool.least_cost import (
     get_wind_cf,
     get_pv_cf,
+    get_hourly_pv_cf,
+    get_pv_yield_cf,
     get_installed_capacity,
     get_max_capacity,
     get_lcoe,
+    get_price_trajectory,
+    get_grid_extension_cost,
     get_least_cost,
+    get_least_cost_masked,
+    get_least_cost_allocation,
+    get_emissions,
+    get_emission_intensity,
+    get_pareto_front,
+    get_carbon_price_sweep,
+    get_allowed_mask,
     get_tech_generation,
     get_pumping_cost,
     get_unit_pumping_cost,
 )
 
+from nexus_tool.hybrid import (
+    get_hourly_load,
+    get_hybrid_candidates,
+    get_hybrid_sizing,
+)
+
+from nexus_tool.sensitivity import (
+    sample_parameters,
+    get_lcoe_sensitivity,
+)
+
+from nexus_tool.pipeline import (
+    stages,
+    get_upstream,
+    get_columns,
+    get_input_columns,
+    get_stage_name,
+    run_stages,
+    invalidate,
+)
+
+from nexus_tool.cache import StageCache
+
+from nexus_tool.chunked import (
+    read_chunks,
+    run_chunked,
+)
+
+from nexus_tool.datasets import (
+    write_dataset,
+    read_dataset,
+    read_excel_cached,
+    load_data,
+)
+
+from nexus_tool.memory import (
+    optimize_memory,
+    load_spilled,
+)
+
+from nexus_tool.profiling import (
+    profile,
+    record_profile,
+    get_profile,
+    get_profile_summary,
+    write_chrome_trace,
+    call_recorded,
+    add_records,
+    is_enabled,
+)
+
+from nexus_tool.scenarios import (
+    ScenarioRunner,
+    get_cases,
+)
+
 class Model():
+    '''
+    Water-energy nexus model of a set of demand points (rows of df).
+
+    Every Model instance owns its state (data, technologies, ky/kc
+    dictionaries and computed stages), so models of different basins or
+    scenarios can be run concurrently in one interpreter, each in its own
+    thread. A single instance is not thread-safe: its methods must not be
+    called concurrently, except through the n_workers options, which only
+    read the instance while the work runs and update it from the calling
+    thread. Instances can be pickled, so they can also be sent to process
+    pools. The module level state (stage declarations, the clear-sky
+    profiles cache and the profiling records) is read-only or thread-safe
+    '''
     # water properties:
     eto = 'ETo_'
     lat = 'lat'
@@ -104,6 +188,9 @@ class Model():
     k=0.26  #New - roughness for cast iron
     start_year = 0
     end_year = 30
+    copy_mode = 'full'
+    backend = 'wide'
+    cache = None
     def __init__(self, df, eto = eto, lat = lat, elevation = elevation,
                  wind = wind, srad = srad, tmin = tmin, tmax = tmax, 
                  tavg = tavg, crop_share = crop_share, crop_area = crop_area,
@@ -112,7 +199,8 @@ class Model():
                  pumping_hours_per_day = pumping_hours_per_day,
                  deff = deff, aeff = aeff, gw_depth = gw_depth, 
                  des_int = des_int, des_ener = des_ener, pd_e = pd_e,
-                 ed_e = ed_e, swpp_e = swpp_e, swpa_e = swpa_e,  trans_eff = trans_eff, SWpump_eff=SWpump_eff, pump_eff = pump_eff, ):
+                 ed_e = ed_e, swpp_e = swpp_e, swpa_e = swpa_e,  trans_eff = trans_eff, SWpump_eff=SWpump_eff, pump_eff = pump_eff, 
+                 copy_mode = copy_mode, backend = backend):
         self.df = df
         self.eto = eto
         self.lat = lat
@@ -142,6 +230,20 @@ class Model():
         self.trans_eff = trans_eff
         self.SWpump_eff = SWpump_eff
         self.pump_eff = pump_eff #changed from self.pump_eff = trans_eff
+        self.copy_mode = copy_mode # 'full' or 'columns' (see .__input)
+        self.backend = backend # 'wide' columns or 'cube' (see .get_water_demand)
+        self.cubes = {}
+        self.ky_dict = {}
+        self.kc_dict = {}
+        self.ky_values = {}
+        self.kc_values = {}
+        self.technologies = {}
+        self.stage_state = {} # parameters fingerprint of every computed stage
+        self.stage_options = {} # keyword arguments of every stage (see .run)
+        self.cache = None # StageCache used by .run (see .set_cache)
+        self.memory_optimizer = False # optimize memory after every stage of .run
+        self.memory_spill = None # folder where the dropped intermediates are written
+        self.memory_report = []
             
     def print_properties(self):
         print('Properties names:')
@@ -171,6 +273,97 @@ class Model():
                               'Reynolds Number (.Re)',]):
             print('    - {}: {}'.format(name, val)) 
           
+    ####### stages execution ###########
+    def run(self, target, **kwargs):
+        '''
+        computes target (a stage name such as 'get_unit_pumping_cost' or 
+        'print_summary', or one of its outputs such as 'pumping_cost'), running 
+        only the upstream stages that are missing or whose parameters changed 
+        since they were last computed. kwargs are stored as the options of the 
+        target stage (e.g. geo_boundary for print_summary)
+        '''
+        if kwargs:
+            self.set_stage_options(get_stage_name(target), **kwargs)
+        return run_stages(self, target)
+    
+    def set_stage_options(self, stage, **kwargs):
+        self.stage_options.setdefault(stage, {}).update(kwargs)
+        
+    def run_chunked(self, source, output, target = 'get_unit_pumping_cost', 
+                    chunk_size = 100000, columns = None, output_columns = None,
+                    geo_boundary = 'global', prepare = None):
+        '''
+        runs the model on the rows of the source file in blocks of chunk_size
+        rows, writing the results to output (see nexus_tool.chunked). Returns 
+        the per boundary summary and least cost technologies
+        '''
+        accumulator = run_chunked(self, source, output, target = target, 
+                                  chunk_size = chunk_size, columns = columns,
+                                  output_columns = output_columns, 
+                                  geo_boundary = geo_boundary, 
+                                  prepare = prepare)
+        return accumulator.get_summary(), accumulator.get_technologies()
+    
+    def optimize_memory(self, stage = None, columns = None, downcast = True, 
+                        drop_intermediates = True):
+        '''
+        compacts the dtypes of the data (or of the given columns) and drops 
+        the intermediate columns no stage reads (see nexus_tool.memory). It 
+        runs after every stage of .run when .memory_optimizer is True, and 
+        the bytes saved by every call are kept in .memory_report
+        '''
+        report = optimize_memory(self, stage = stage, columns = columns,
+                                 downcast = downcast, 
+                                 drop_intermediates = drop_intermediates,
+                                 spill = self.memory_spill)
+        self.memory_report.append(report)
+        return report
+        
+    def get_memory_report(self):
+        return pd.DataFrame(self.memory_report, 
+                            columns=['stage', 'bytes_before', 'bytes_after',
+                                     'bytes_saved', 'dropped_columns'])
+    
+    def get_input_columns(self, *targets):
+        return get_input_columns(self, targets)
+    
+    def load_data(self, path, targets = ['get_unit_pumping_cost'], 
+                  columns = [], sheet_name = 0, compact = False):
+        '''
+        sets the data reading only the input columns needed to compute 
+        targets (see .run) plus the given extra columns (e.g. boundaries or 
+        merge keys), with cached excel sheets and, with compact = True, 
+        compact dtypes (see nexus_tool.load_data)
+        '''
+        self.df = load_data(path, columns = self.get_input_columns(*targets) + 
+                                            list(columns), 
+                            sheet_name = sheet_name, compact = compact)
+    
+    def to_parquet(self, path, scenario = None, sub_scenario = None, 
+                   level = None, columns = None, year = 'Year'):
+        '''
+        writes the data (or the given columns) to a parquet dataset 
+        partitioned by scenario / sub_scenario / level / year, which can be 
+        read back with nexus_tool.read_dataset
+        '''
+        df = self.df if columns is None else self.df[columns]
+        write_dataset(df, path, scenario = scenario, sub_scenario = sub_scenario,
+                      level = level, year = year)
+    
+    def set_cache(self, path, max_size = 2 * 1024 ** 3):
+        '''
+        stores the outputs of the stages run by .run in the path folder, so 
+        they are reused by any model (in this or other processes and 
+        sessions) running the same stage on the same inputs and parameters
+        '''
+        self.cache = StageCache(path, max_size = max_size)
+        
+    def invalidate(self, stage = None):
+        invalidate(self, stage)
+        
+    def get_stages(self, target):
+        return get_upstream(get_stage_name(target))
+    
     ####### water related methods ###########
     def set_cropland_share(self, crop_var, geo_boundary = 'global', 
                            boundary_name = None, inplace = False):
@@ -195,6 +388,7 @@ class Model():
         else:
             return get_kc_list(self.df.copy(), crop_share = self.crop_share)
     
+    @profile
     def get_eto(self, inplace = False):
         if inplace:
             get_eto(self.df, eto = self.eto, lat = self.lat, 
@@ -202,19 +396,23 @@ class Model():
                     srad = self.srad, tmin = self.tmin, 
                     tmax = self.tmax, tavg = self.tavg)
         else:
-            return get_eto(self.df.copy(), eto = self.eto, lat = self.lat, 
-                           elevation = self.elevation, wind = self.wind, 
-                           srad = self.srad, tmin = self.tmin, 
-                           tmax = self.tmax, tavg = self.tavg)
+            df = get_eto(self.__input('get_eto'), eto = self.eto, lat = self.lat, 
+                         elevation = self.elevation, wind = self.wind, 
+                         srad = self.srad, tmin = self.tmin, 
+                         tmax = self.tmax, tavg = self.tavg)
+            return self.__output('get_eto', df)
     
+    @profile
     def get_effective_rainfall(self, inplace = False):
         if inplace:
             get_effective_rainfall(self.df, eff = self.eff, prec = self.prec, 
                                    eto = self.eto)
         else:
-            return get_effective_rainfall(self.df.copy(), eff = self.eff, 
-                                          prec = self.prec, eto = self.eto)
+            df = get_effective_rainfall(self.__input('get_effective_rainfall'), eff = self.eff, 
+                                        prec = self.prec, eto = self.eto)
+            return self.__output('get_effective_rainfall', df)
                                           
+    @profile
     def get_calendar_days(self, inplace = False):
         if inplace:
             get_calendar_days(self.crop_calendar, seasons = self.seasons, 
@@ -223,6 +421,7 @@ class Model():
             return get_calendar_days(self.crop_calendar.copy(), seasons = self.seasons, 
                                      start = self.start, end = self.end)
                                      
+    @profile
     def get_kc_values(self, inplace = False):
         if inplace:
             get_kc_values(crop_calendar = self.crop_calendar, 
@@ -236,8 +435,34 @@ class Model():
                                  start = self.start, end = self.end, 
                                  kc = self.kc)
                                  
+    @profile
     def get_water_demand(self, inplace = False):
-        if inplace:
+        '''
+        with backend = 'cube' the per crop intermediates (kc, acwr and 
+        harvest) are kept as Cubes in .cubes instead of one column per month
+        and crop, and only the monthly pcwr, pwd and sswd columns are added 
+        to the data (see .export_cubes)
+        '''
+        if self.backend == 'cube':
+            cubes = get_water_demand_cube(self.df, self.crop_calendar, 
+                             self.ky_dict, self.crop_column, self.aeff, 
+                             self.deff, self.seasons[0], self.seasons[3], 
+                             self.pumping_hours_per_day, 
+                             crop_area = self.crop_area, _eto = self.eto, 
+                             _kc = self.kc, _eff = self.eff, start = self.start, 
+                             end = self.end, crop_share = self.crop_share)
+            if inplace:
+                self.cubes.update(cubes)
+                df = self.df
+            else:
+                df = self.__input('get_water_demand')
+            for name in ['pcwr', 'pwd', 'sswd']:
+                wide = cubes[name].to_wide(getattr(self, name))
+                for column in wide.columns:
+                    df[column] = wide[column]
+            if not inplace:
+                return self.__output('get_water_demand', df)
+        elif inplace:
             get_water_demand(self.df, self.crop_calendar, self.ky_dict, 
                              self.crop_column, self.aeff, self.deff, 
                              self.seasons[0], self.seasons[3], 
@@ -248,27 +473,63 @@ class Model():
                              start = self.start, end = self.end, 
                              crop_share = self.crop_share)
         else:
-            return get_water_demand(self.df.copy(), self.crop_calendar, 
-                             self.ky_dict, self.crop_column, self.aeff, 
-                             self.deff, self.seasons[0], self.seasons[3], 
-                             self.pumping_hours_per_day, 
-                             crop_area = self.crop_area, _eto = self.eto, 
-                             _kc = self.kc, _eff = self.eff, _acwr = self.acwr, 
-                             _pcwr = self.pcwr, _pwd = self.pwd, 
-                             _sswd = self.sswd, start = self.start, 
-                             end = self.end, crop_share = self.crop_share)
+            df = get_water_demand(self.__input('get_water_demand'), self.crop_calendar, 
+                           self.ky_dict, self.crop_column, self.aeff, 
+                           self.deff, self.seasons[0], self.seasons[3], 
+                           self.pumping_hours_per_day, 
+                           crop_area = self.crop_area, _eto = self.eto, 
+                           _kc = self.kc, _eff = self.eff, _acwr = self.acwr, 
+                           _pcwr = self.pcwr, _pwd = self.pwd, 
+                           _sswd = self.sswd, start = self.start, 
+                           end = self.end, crop_share = self.crop_share)
+            return self.__output('get_water_demand', df)
+                             
+    def get_cube(self, name):
+        '''
+        Cube of a monthly variable (e.g. 'eto', 'sswd') or of a per crop 
+        variable ('kc', 'acwr', 'harvest'), from .cubes or from the columns 
+        of the data
+        '''
+        if name in self.cubes:
+            return self.cubes[name]
+        if name in ['kc', 'acwr', 'harvest']:
+            return Cube.from_wide(self.df, self.__get_prefix(name), 
+                                  crops = list(self.crop_calendar[self.crop_column]))
+        return Cube.from_wide(self.df, self.__get_prefix(name))
+        
+    def export_cubes(self, names = None, inplace = False):
+        '''
+        wide columns of the Cubes in .cubes (all by default), added to the 
+        data if inplace
+        '''
+        names = self.cubes.keys() if names is None else names
+        wide = pd.concat([self.cubes[name].to_wide(self.__get_prefix(name)) 
+                          for name in names], axis=1)
+        if inplace:
+            for column in wide.columns:
+                self.df[column] = wide[column]
+        else:
+            return wide
+    
+    def __get_prefix(self, name):
+        if name == 'harvest':
+            return 'harvest_'
+        return getattr(self, name)
                              
     ####### energy related methods ########### 
    
+    @profile
     def get_gw_tdh(self, inplace = False, wdd = 0, oap = 0, pld = 0):
         if inplace:
             get_gw_tdh(self.df, gw_depth = self.gw_depth, wdd = 0, oap = 0, pld = 0, 
                        interp_method = 'nearest', tdh_gw = self.tdh_gw)
         else:
-            return get_gw_tdh(self.df.copy(), gw_depth = self.gw_depth, wdd = 0, oap = 0, 
-                              pld = 0, interp_method = 'nearest', 
-                              tdh_gw = self.tdh_gw)
+            df = get_gw_tdh(self.__input('get_gw_tdh'), gw_depth = self.gw_depth, wdd = 0, oap = 0, 
+                            pld = 0, interp_method = 'nearest', 
+                            tdh_gw = self.tdh_gw)
+            return self.__output('get_gw_tdh', df)
                               
+    @profile
     def get_GWpumping_energy(self, inplace = False):
         if inplace:
             self.GWpumping_energy=get_GWpumping_energy(self.df, self.trans_eff, self.pump_eff, 
@@ -277,13 +538,15 @@ class Model():
                                tdh_gw = self.tdh_gw, desalination = False, 
                                des_int = self.des_int, des_ener = self.des_ener)
         else:
-            return get_GWpumping_energy(self.df.copy(), self.trans_eff, self.pump_eff, 
-                                      pd_e = self.pd_e, pwd = self.pwd, 
-                                      sswd = self.sswd, ed_e = self.ed_e, 
-                                      tdh_gw = self.tdh_gw, desalination = False, 
-                                      des_int = self.des_int, 
-                                      des_ener = self.des_ener)
+            df = get_GWpumping_energy(self.__input('get_GWpumping_energy'), self.trans_eff, self.pump_eff, 
+                                    pd_e = self.pd_e, pwd = self.pwd, 
+                                    sswd = self.sswd, ed_e = self.ed_e, 
+                                    tdh_gw = self.tdh_gw, desalination = False, 
+                                    des_int = self.des_int, 
+                                    des_ener = self.des_ener)
+            return self.__output('get_GWpumping_energy', df)
     
+    @profile
     def get_A(self, inplace=False):
         if inplace:
             self.df[self.A]= get_A(D=self.df[self.D])
@@ -291,6 +554,7 @@ class Model():
         else:
             return get_A(D=self.df[self.D])
     
+    @profile
     def get_V(self, inplace=False, axis=1):
         if inplace:
             self.df=get_V(self.df, avg_Q=self.avg_Q, A=self.df[self.A], 
@@ -298,28 +562,34 @@ class Model():
                           axis=axis)
             
         else:
-            return get_V(self.df.copy(), avg_Q=self.avg_Q, A=self.df[self.A], 
-                         mV=self.mV, axis=axis)
+            df = get_V(self.__input('get_V'), avg_Q=self.avg_Q, A=self.df[self.A], 
+                       mV=self.mV, axis=axis)
+            return self.__output('get_V', df)
     
     
+    @profile
     def get_Re(self, inplace=False, axis=1):
         if inplace: 
             self.df=get_Re(self.df, Re=self.Re, mV=self.mV, D=self.df[self.D], 
                            Ken_visc=1000, axis=axis)
             
         else:
-            return get_Re(self.df.copy(), Re=self.Re, mV=self.mV, 
-                          D=self.df[self.D], Ken_visc=1000, axis=axis)
+            df = get_Re(self.__input('get_Re'), Re=self.Re, mV=self.mV, 
+                        D=self.df[self.D], Ken_visc=1000, axis=axis)
+            return self.__output('get_Re', df)
     
+    @profile
     def get_f(self, inplace=False, axis=1):
         if inplace:
             self.df=get_f(self.df, f=self.f, k=0.26, D=self.df[self.D], 
                           Re=self.Re, axis=axis)
         else:
-            return get_f(self.df.copy(), f=self.f, k=0.26, D=self.df[self.D], 
-                         Re=self.Re, axis=axis)
+            df = get_f(self.__input('get_f'), f=self.f, k=0.26, D=self.df[self.D], 
+                       Re=self.Re, axis=axis)
+            return self.__output('get_f', df)
     
                                    
+    @profile
     def get_sw_tdh(self, inplace = False, axis=1):
         if inplace:
             self.df=get_sw_tdh(self.df, tdh_sw=self.tdh_sw, 
@@ -329,14 +599,16 @@ class Model():
                                pump_hours = self.pumping_hours_per_day, 
                                axis=axis)
         else:
-            return get_sw_tdh(self.df.copy(), tdh_sw=self.tdh_sw, 
-                              elevation=self.elevation, f =self.f, 
-                              L=self.df[self.L], Q=self.avg_Q, 
-                              D=self.df[self.D], g= 9.81, 
-                              pump_hours = self.pumping_hours_per_day, 
-                              axis=axis)   
+            df = get_sw_tdh(self.__input('get_sw_tdh'), tdh_sw=self.tdh_sw, 
+                            elevation=self.elevation, f =self.f, 
+                            L=self.df[self.L], Q=self.avg_Q, 
+                            D=self.df[self.D], g= 9.81, 
+                            pump_hours = self.pumping_hours_per_day, 
+                            axis=axis)
+            return self.__output('get_sw_tdh', df)   
     
     
+    @profile
     def get_SWpumping_energy(self, inplace = False, axis=1):
         if inplace:
             self.SWpumping_energy=get_SWpumping_energy(self.df, 
@@ -344,25 +616,30 @@ class Model():
                     swpp_e = self.swpp_e, peak_Q = self.peak_Q, swpa_e = self.swpa_e,
                     avg_Q = self.avg_Q, g=self.g, dens=self.dens, axis=axis)
         else:
-            return get_SWpumping_energy(self.df.copy(), 
-                           SWpump_eff=self.SWpump_eff, tdh_sw = self.tdh_sw, 
-                           swpp_e = self.swpp_e, peak_Q = self.peak_Q, 
-                           swpa_e = self.swpa_e, sswd = self.sswd, g=self.g, 
-                           dens=self.dens, axis=axis)
+            df = get_SWpumping_energy(self.__input('get_SWpumping_energy'), 
+                         SWpump_eff=self.SWpump_eff, tdh_sw = self.tdh_sw, 
+                         swpp_e = self.swpp_e, peak_Q = self.peak_Q, 
+                         swpa_e = self.swpa_e, sswd = self.sswd, g=self.g, 
+                         dens=self.dens, axis=axis)
+            return self.__output('get_SWpumping_energy', df)
     
+    @profile
     def get_total_pumping_energy(self, inplace =False):
         if inplace:
             get_total_pumping_energy(self.df, swpa_e = self.swpa_e, ed_e = self.ed_e)
         else:
-            return get_total_pumping_energy(self.df.copy(), swpa_e=self.swpa_e, ed_e = self.ed_e)
+            df = get_total_pumping_energy(self.__input('get_total_pumping_energy'), swpa_e=self.swpa_e, ed_e = self.ed_e)
+            return self.__output('get_total_pumping_energy', df)
     
     
     
+    @profile
     def get_annual_electricity(self, inplace = False):
         if inplace:
             get_annual_electricity(self.df, self.ed_e)
         else:
-            return get_annual_electricity(self.df.copy(), self.ed_e)
+            df = get_annual_electricity(self.__input('get_annual_electricity'), self.ed_e)
+            return self.__output('get_annual_electricity', df)
                                       
     ####### technologies and LCOE related methods #########
     def create_wind_turbine(self, wind_turbine, life, om_cost, 
@@ -372,121 +649,264 @@ class Model():
                                                            efficiency)
                                                            
     def create_pv_system(self, pv_system, life, om_cost, 
-                         capital_cost, efficiency):
+                         capital_cost, efficiency, cf_model = 'simple', 
+                         tilt = None):
         self.technologies[pv_system] = self.PVSystem(life, om_cost, 
                                                      capital_cost, 
                                                      efficiency, None, 
                                                      0, 1, 0, 0)
+        self.technologies[pv_system].cf_model = cf_model
+        self.technologies[pv_system].tilt = tilt
                                                      
     def create_standard_tech(self, tech_name, life, om_cost, capital_cost, 
                              efficiency, cf, fuel_cost, fuel_req, emission_factor, 
-                             env_cost):
+                             env_cost, fuel_escalation = 0):
         self.technologies[tech_name] = self.Technology(life, om_cost, 
                                                 capital_cost, efficiency, cf, 
                                                 fuel_cost, fuel_req, 
-                                                emission_factor, env_cost)
+                                                emission_factor, env_cost,
+                                                fuel_escalation)
+        
+    def get_grid_distance(self, lines, x = 'long', y = 'lat', 
+                          crs = 'EPSG:4326', projected_crs = None, 
+                          column = 'grid_distance'):
+        '''
+        distance (m) from every point (x and y columns in crs, or the
+        geometries if the data is a GeoDataFrame) to the nearest line,
+        computed in projected_crs (a metric CRS) or in the UTM zone of the
+        points if not given (see weap_tools.get_distance_to_lines)
+        '''
+        from nexus_tool.weap_tools import get_distance_to_lines
+        import geopandas as gpd
         
-    def get_cf(self, technologies = 'all', axis=1):
-        technologies = self.__check_tech_input(technologies)
+        if isinstance(self.df, gpd.GeoDataFrame):
+            points = self.df
+        else:
+            points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(self.df[x], 
+                                                                  self.df[y]), 
+                                      crs=crs)
+        self.df[column] = get_distance_to_lines(points, lines, 
+                                                crs = projected_crs)
+    
+    def set_grid_extension(self, tech_name, cost_per_km, 
+                           distance = 'grid_distance', max_distance = None):
+        self.technologies[tech_name].extension_cost = get_grid_extension_cost(
+                                                    self.df[distance].values,
+                                                    cost_per_km, max_distance)
+        
+    @profile
+    def get_cf(self, technologies = 'all', axis=1, n_workers = 1, 
+               executor = 'thread'):
+        technologies = [technology for technology in 
+                        self.__check_tech_input(technologies) if 
+                        type(self.technologies[technology]) in 
+                        [self.WindTurbine, self.PVSystem]]
+        calls = []
         for technology in technologies:
             if type(self.technologies[technology]) == self.WindTurbine:
-                self.get_wind_cf(technology, axis)
-            elif type(self.technologies[technology]) == self.PVSystem:
-                self.get_pv_cf(technology, axis)
+                calls.append(self.__wind_cf_call(technology, axis))
+            else:
+                calls.append(self.__pv_cf_call(technology, axis))
+        for technology, cf in zip(technologies, 
+                                  self.__run_calls(calls, n_workers, executor)):
+            self.technologies[technology].cf = cf
     
     def get_wind_cf(self, wind_turbine, axis=1):
-        tech = self.technologies[wind_turbine]
-        self.technologies[wind_turbine].cf = get_wind_cf(self.df, wind = self.wind, 
-                    mu = tech.mu, t = tech.t, p_rated = tech.p_rated, 
-                    z = tech.z, zr = tech.zr, es = tech.es, u_arr = tech.u_arr,
-                    p_curve = tech.p_curve, axis = axis)
+        function, kwargs = self.__wind_cf_call(wind_turbine, axis)
+        self.technologies[wind_turbine].cf = function(**kwargs)
                     
     def get_pv_cf(self, pv_system, axis=1):
+        function, kwargs = self.__pv_cf_call(pv_system, axis)
+        self.technologies[pv_system].cf = function(**kwargs)
+        
+    def __wind_cf_call(self, wind_turbine, axis):
+        tech = self.technologies[wind_turbine]
+        return get_wind_cf, dict(df = self.df, wind = self.wind, mu = tech.mu, 
+                                 t = tech.t, p_rated = tech.p_rated, z = tech.z, 
+                                 zr = tech.zr, es = tech.es, u_arr = tech.u_arr,
+                                 p_curve = tech.p_curve, axis = axis)
+    
+    def __pv_cf_call(self, pv_system, axis):
         tech = self.technologies[pv_system]
-        self.technologies[pv_system].cf = get_pv_cf(self.df, self.srad, axis)
+        if axis and (tech.cf_model == 'hourly'):
+            return get_pv_yield_cf, dict(df = self.df, srad = self.srad, 
+                                         lat = self.lat, tavg = self.tavg, 
+                                         tilt = tech.tilt, 
+                                         temp_coeff = tech.temp_coeff, 
+                                         noct = tech.noct)
+        return get_pv_cf, dict(df = self.df, srad = self.srad, axis = axis)
                     
-    def get_installed_capacity(self, technologies = 'all', axis=1):
-        technologies = self.__check_tech_input(technologies)
-        for technology in technologies:
-            tech = self.technologies[technology]
-            self.technologies[technology].df = get_installed_capacity(self.df, 
-                                                                      tech.cf, 
-                                                                      self.pd_e,
-                                                                      axis)
+    @profile
+    def get_installed_capacity(self, technologies = 'all', axis=1, 
+                               n_workers = 1, executor = 'thread'):
+        technologies = list(self.__check_tech_input(technologies))
+        calls = [(get_installed_capacity, 
+                  dict(df = self.df, cf = self.technologies[technology].cf, 
+                       pd_e = self.pd_e, axis = axis)) 
+                 for technology in technologies]
+        for technology, ic_df in zip(technologies, 
+                                     self.__run_calls(calls, n_workers, executor)):
+            self.technologies[technology].df = ic_df
                                                 
-    def get_max_capacity(self, technologies = 'all', axis=1):
-        technologies = self.__check_tech_input(technologies)
-        for technology in technologies:
+    @profile
+    def get_max_capacity(self, technologies = 'all', axis=1, n_workers = 1, 
+                         executor = 'thread'):
+        technologies = list(self.__check_tech_input(technologies))
+        calls = [(get_max_capacity, dict(df = self.technologies[technology].df, 
+                                         axis = axis)) 
+                 for technology in technologies]
+        for technology, max_cap in zip(technologies, 
+                                       self.__run_calls(calls, n_workers, executor)):
             tech = self.technologies[technology]
             if axis:
-                self.technologies[technology].df = tech.df.join(get_max_capacity(tech.df, axis))
+                self.technologies[technology].df = tech.df.join(max_cap)
             else:
-                self.technologies[technology].max_cap = get_max_capacity(tech.df, axis)
+                self.technologies[technology].max_cap = max_cap
         
-    def get_lcoe(self, technologies = 'all', years = 'all', axis=1):
-        technologies = self.__check_tech_input(technologies)
-        for technology in technologies:
-            tech = self.technologies[technology]
-            if axis:
-                self.technologies[technology].df['lcoe'] = get_lcoe(
-                                            max_capacity = tech.df['max_cap'],
-                                            total_demand = self.df['annual_el_demand'],
-                                            tech_life=tech.life, om_cost = tech.om_cost,
-                                            capital_cost = tech.capital_cost,
-                                            discount_rate = self.discount_rate,
-                                            project_life = self.end_year - self.start_year,
-                                            fuel_cost = tech.fuel_cost, 
-                                            fuel_req = tech.fuel_req, 
-                                            efficiency = tech.efficiency, 
-                                            emission_factor = tech.emission_factor,
-                                            env_cost = tech.env_cost,
-                                            start_year = self.start_year,
-                                            end_year = self.end_year,
-                                            axis = axis)
-            else:
-                years = self.__get_years(years)
-                self.technologies[technology].lcoe = pd.DataFrame()
+    @profile
+    def get_lcoe(self, technologies = 'all', years = 'all', axis=1, 
+                 n_workers = 1, executor = 'thread'):
+        technologies = list(self.__check_tech_input(technologies))
+        if axis:
+            calls = []
+            for technology in technologies:
+                tech = self.technologies[technology]
+                calls.append((get_lcoe, dict(
+                                    max_capacity = tech.df['max_cap'],
+                                    total_demand = self.df['annual_el_demand'],
+                                    tech_life=tech.life, om_cost = tech.om_cost,
+                                    capital_cost = tech.capital_cost,
+                                    discount_rate = self.discount_rate,
+                                    project_life = self.end_year - self.start_year,
+                                    fuel_cost = self.get_fuel_price(technology), 
+                                    fuel_req = tech.fuel_req, 
+                                    efficiency = tech.efficiency, 
+                                    emission_factor = tech.emission_factor,
+                                    env_cost = tech.env_cost,
+                                    start_year = self.start_year,
+                                    end_year = self.end_year,
+                                    axis = axis,
+                                    extension_cost = tech.extension_cost)))
+            for technology, lcoe in zip(technologies, 
+                                        self.__run_calls(calls, n_workers, executor)):
+                tech = self.technologies[technology]
+                self.technologies[technology].df['lcoe'] = lcoe
+                self.technologies[technology].df['emissions'] = get_emissions(
+                                            self.df['annual_el_demand'],
+                                            efficiency = tech.efficiency,
+                                            fuel_req = tech.fuel_req,
+                                            emission_factor = tech.emission_factor)
+        else:
+            years = list(self.__get_years(years))
+            if not years:
+                raise ValueError(f'No years to compute the lcoe of, between '
+                                 f'start_year ({self.start_year}) and '
+                                 f'end_year ({self.end_year})')
+            calls = []
+            for technology in technologies:
+                tech = self.technologies[technology]
                 for year in years:
-                    self.technologies[technology].lcoe = \
-                            self.technologies[technology].lcoe.append(get_lcoe(
+                    calls.append((get_lcoe, dict(
                                 max_capacity = tech.max_cap.reset_index(),
                                 total_demand = self.df,
                                 tech_life=tech.life, om_cost = tech.om_cost,
                                 capital_cost = tech.capital_cost,
                                 discount_rate = self.discount_rate,
                                 project_life = self.end_year - self.start_year,
-                                fuel_cost = tech.fuel_cost, 
+                                fuel_cost = self.get_yearly_fuel_price(technology), 
                                 fuel_req = tech.fuel_req, 
                                 efficiency = tech.efficiency, 
                                 emission_factor = tech.emission_factor,
                                 env_cost = tech.env_cost,
                                 start_year = year,
                                 end_year = self.end_year,
-                                axis = axis), ignore_index=True)
-                                
-                # self.technologies[technology].lcoe.reset_index(inplace=True)
+                                axis = axis)))
+            results = self.__run_calls(calls, n_workers, executor)
+            for i, technology in enumerate(technologies):
+                self.technologies[technology].lcoe = pd.concat(
+                                    results[i * len(years):(i + 1) * len(years)],
+                                    ignore_index=True)
+    
+    def __run_calls(self, calls, n_workers, executor):
+        # every technology is independent numpy work, so they can be evaluated 
+        # concurrently and merged back in the calling thread, with the 
+        # profiling records of the worker processes
+        if executor not in ['thread', 'process']:
+            raise ValueError(f"executor must be 'thread' or 'process', "
+                             f"got {executor!r}")
+        if (n_workers > 1) and (len(calls) > 1):
+            if executor == 'thread':
+                with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                    futures = [pool.submit(function, **kwargs) 
+                               for function, kwargs in calls]
+                    return [future.result() for future in futures]
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = [pool.submit(call_recorded, function, is_enabled(), 
+                                       **kwargs) for function, kwargs in calls]
+                results = []
+                for future in futures:
+                    result, worker_records = future.result()
+                    add_records(worker_records)
+                    results.append(result)
+                return results
+        return [function(**kwargs) for function, kwargs in calls]
+                                                            
+    def get_fuel_price(self, technology):
+        tech = self.technologies[technology]
+        if (not np.any(tech.fuel_escalation)) or (np.ndim(tech.fuel_cost) == 2):
+            return tech.fuel_cost
+        return get_price_trajectory(tech.fuel_cost, self.start_year, 
+                                    self.end_year, tech.fuel_escalation)
+    
+    def get_yearly_fuel_price(self, technology):
+        '''
+        fuel price of the technology in every year from start_year to end_year, 
+        as a Series indexed by year, for the long format (axis=0) lcoe. Price 
+        matrices shorter than the period keep their last price
+        '''
+        tech = self.technologies[technology]
+        if (not np.any(tech.fuel_escalation)) and (np.ndim(tech.fuel_cost) < 2):
+            return tech.fuel_cost
+        if np.ndim(tech.fuel_cost) == 2:
+            prices = np.asarray(tech.fuel_cost, dtype=float)
+        else:
+            prices = get_price_trajectory(tech.fuel_cost, self.start_year, 
+                                          self.end_year + 1, tech.fuel_escalation)
+        if prices.shape[0] != 1:
+            raise ValueError(f'The fuel price of {technology} is given per point, '
+                             'the long format (axis=0) lcoe needs one price '
+                             'per year')
+        years = range(self.start_year, self.end_year + 1)
+        return pd.Series(prices[0], index=range(self.start_year, 
+                                                self.start_year + prices.shape[1])
+                         ).reindex(years, method='ffill')
                                                             
+    @profile
     def get_least_cost(self,  technologies = 'all', years = 'all',
                        geo_boundary = None, axis=1):
         if axis:
             self.df['least_cost_tech'] = np.nan
             self.df['lcoe'] = np.nan
             if (geo_boundary != None) and (type(technologies) == dict):
-                for key, value in technologies.items():
-                    _technologies = self.__check_tech_input(value)
-                    lcoe_df = pd.DataFrame()
-                    lcoe_df[geo_boundary] = self.df[geo_boundary]
+                allowed = {key: list(self.__check_tech_input(value)) 
+                           for key, value in technologies.items()}
+                lcoe_df = pd.DataFrame(index=self.df.index)
+                for _technologies in allowed.values():
                     for _technology in _technologies:
-                        lcoe_df[_technology] = self.technologies[_technology].df['lcoe']
-                    self.df.loc[self.df[geo_boundary]==key, 'least_cost_tech'], \
-                    self.df.loc[self.df[geo_boundary]==key, 'lcoe'] = \
-                                        get_least_cost(lcoe_df, geo_boundary, key)
+                        if _technology not in lcoe_df.columns:
+                            lcoe_df[_technology] = self.technologies[_technology].df['lcoe']
+                least_cost = get_least_cost_masked(lcoe_df, self.df[geo_boundary], 
+                                                   allowed)
+                self.df['least_cost_tech'] = least_cost['least_cost_technology']
+                self.df['lcoe'] = least_cost['lcoe']
             else:
                 _technologies = self.__check_tech_input(technologies)
                 lcoe_df = pd.DataFrame()
                 for _technology in _technologies:
                     lcoe_df[_technology] = self.technologies[_technology].df['lcoe']
-                self.df['least_cost_tech'], self.df['lcoe'] = get_least_cost(lcoe_df)
+                least_cost = get_least_cost(lcoe_df)
+                self.df['least_cost_tech'] = least_cost['least_cost_technology']
+                self.df['lcoe'] = least_cost['lcoe']
         else:
             _technologies = self.__check_tech_input(technologies)
             lcoe_df = pd.DataFrame()
@@ -512,24 +932,212 @@ class Model():
             self.lcoe['least_cost_technology'] = lcoe['least_cost_technology']
             self.lcoe['lcoe'] = lcoe['lcoe']
     
+    @profile
+    def get_least_cost_allocation(self, caps, technologies = 'all', 
+                                  geo_boundary = None, cap_boundary = None, 
+                                  metric = 'capacity'):
+        '''
+        least-cost technology shares of every point subject to the caps (see 
+        least_cost.get_least_cost_allocation). cap_boundary is the column 
+        with the boundary of the caps, or a list with one column (or None 
+        for a dictionary) per caps when caps is a list
+        '''
+        if (geo_boundary != None) and (type(technologies) == dict):
+            allowed = {key: list(self.__check_tech_input(value)) 
+                       for key, value in technologies.items()}
+            _technologies = list(dict.fromkeys([_technology for value in 
+                                                allowed.values() for 
+                                                _technology in value]))
+            mask = get_allowed_mask(self.df[geo_boundary], _technologies, allowed)
+        else:
+            _technologies = list(self.__check_tech_input(technologies))
+            mask = None
+        if type(cap_boundary) == list:
+            cap_boundary = [None if boundary is None else self.df[boundary] 
+                            for boundary in cap_boundary]
+        elif cap_boundary is not None:
+            cap_boundary = self.df[cap_boundary]
+        
+        lcoe_df = pd.DataFrame(index=self.df.index)
+        capacity_df = pd.DataFrame(index=self.df.index)
+        for _technology in _technologies:
+            lcoe_df[_technology] = self.technologies[_technology].df['lcoe']
+            capacity_df[_technology] = self.technologies[_technology].df['max_cap']
+        
+        allocation = get_least_cost_allocation(lcoe_df, 
+                                self.df['annual_el_demand'].values, capacity_df,
+                                caps, cap_boundary = cap_boundary,
+                                allowed_mask = mask, metric = metric)
+        self.df['least_cost_tech'] = allocation['least_cost_technology']
+        self.df['lcoe'] = allocation['lcoe']
+        return allocation[_technologies]
+    
+    def get_pareto_front(self, technologies = 'all'):
+        _technologies = self.__check_tech_input(technologies)
+        lcoe_df = pd.DataFrame(index=self.df.index)
+        emissions_df = pd.DataFrame(index=self.df.index)
+        for _technology in _technologies:
+            lcoe_df[_technology] = self.technologies[_technology].df['lcoe']
+            emissions_df[_technology] = self.technologies[_technology].df['emissions']
+        return get_pareto_front(lcoe_df, emissions_df)
+        
+    def get_carbon_price_sweep(self, carbon_prices, technologies = 'all', 
+                               geo_boundary = None):
+        if (geo_boundary != None) and (type(technologies) == dict):
+            allowed = {key: list(self.__check_tech_input(value)) 
+                       for key, value in technologies.items()}
+            _technologies = list(dict.fromkeys([_technology for value in 
+                                                allowed.values() for 
+                                                _technology in value]))
+            mask = get_allowed_mask(self.df[geo_boundary], _technologies, allowed)
+        else:
+            _technologies = list(self.__check_tech_input(technologies))
+            mask = None
+            
+        lcoe_df = pd.DataFrame(index=self.df.index)
+        intensity = {}
+        for _technology in _technologies:
+            tech = self.technologies[_technology]
+            lcoe_df[_technology] = tech.df['lcoe']
+            intensity[_technology] = get_emission_intensity(tech.efficiency, 
+                                                            tech.fuel_req, 
+                                                            tech.emission_factor)
+        return get_carbon_price_sweep(lcoe_df, intensity, carbon_prices, 
+                                      allowed_mask = mask)
+    
+    def get_lcoe_sensitivity(self, samples, technologies = 'all', 
+                             geo_boundary = None, percentiles = (5, 50, 95),
+                             n_workers = 1, chunk_size = None):
+        if (geo_boundary != None) and (type(technologies) == dict):
+            allowed = {key: list(self.__check_tech_input(value)) 
+                       for key, value in technologies.items()}
+            _technologies = list(dict.fromkeys([_technology for value in 
+                                                allowed.values() for 
+                                                _technology in value]))
+            mask = get_allowed_mask(self.df[geo_boundary], _technologies, allowed)
+        else:
+            _technologies = list(self.__check_tech_input(technologies))
+            mask = None
+            
+        techs = {}
+        for _technology in _technologies:
+            tech = self.technologies[_technology]
+            techs[_technology] = {'max_cap': tech.df['max_cap'].values,
+                                  'life': tech.life, 'om_cost': tech.om_cost,
+                                  'capital_cost': tech.capital_cost,
+                                  'efficiency': tech.efficiency,
+                                  'fuel_cost': np.asarray(self.get_fuel_price(_technology), 
+                                                          dtype=float),
+                                  'fuel_req': tech.fuel_req,
+                                  'emission_factor': tech.emission_factor,
+                                  'env_cost': tech.env_cost,
+                                  'extension_cost': tech.extension_cost}
+                                  
+        lcoe_df, probability_df = get_lcoe_sensitivity(techs, samples, 
+                                    total_demand = self.df['annual_el_demand'].values,
+                                    project_life = self.end_year - self.start_year,
+                                    discount_rate = self.discount_rate, mask = mask,
+                                    percentiles = percentiles, n_workers = n_workers,
+                                    chunk_size = chunk_size)
+        lcoe_df.index = self.df.index
+        probability_df.index = self.df.index
+        return lcoe_df, probability_df
+    
+    def get_hybrid_sizing(self, pv_system, diesel_set, energy = None, 
+                          pv_ratios = [0, 0.5, 1, 1.5, 2, 3, 4], 
+                          battery_hours = [0, 2, 4, 6, 8, 12],
+                          diesel_ratios = [0, 0.25, 0.5, 0.75, 1],
+                          battery_cost = 300, battery_life = 10, 
+                          battery_eff = 0.85, dod = 0.8, max_unmet = 0, 
+                          chunk_size = None, inplace = False):
+        # the ground and surface water pumping energy (see get_total_pumping_energy)
+        energy = 'total_pumping_energy' if energy is None else energy
+        pv = self.technologies[pv_system]
+        diesel = self.technologies[diesel_set]
+        fuel_cost = np.asarray(diesel.fuel_cost, dtype=float)
+        if fuel_cost.ndim == 2:
+            # hybrid sizing is done for a typical year, with the first year prices
+            fuel_cost = fuel_cost[:, 0]
+        tavg = self.tavg if f'{self.tavg}1' in self.df.columns else None
+        sizing = get_hybrid_sizing(
+                        pv_cf = get_hourly_pv_cf(self.df, self.srad, self.lat,
+                                                 tavg = tavg, tilt = pv.tilt,
+                                                 temp_coeff = pv.temp_coeff,
+                                                 noct = pv.noct),
+                        load = get_hourly_load(self.df, energy, 
+                                               self.pumping_hours_per_day),
+                        candidates = get_hybrid_candidates(pv_ratios, 
+                                                           battery_hours,
+                                                           diesel_ratios),
+                        discount_rate = self.discount_rate, 
+                        pv_cost = pv.capital_cost, pv_om = pv.om_cost, 
+                        pv_life = pv.life, battery_cost = battery_cost, 
+                        battery_life = battery_life, battery_eff = battery_eff, 
+                        dod = dod, diesel_cost = diesel.capital_cost, 
+                        diesel_om = diesel.om_cost, diesel_life = diesel.life,
+                        fuel_cost = fuel_cost, fuel_req = diesel.fuel_req,
+                        diesel_eff = diesel.efficiency, max_unmet = max_unmet,
+                        chunk_size = chunk_size)
+        sizing.index = self.df.index
+        if inplace:
+            for column in sizing.columns:
+                self.df[column] = sizing[column]
+        else:
+            return sizing
+    
     def get_tech_generation(self):
         get_tech_generation(self.df, self.technologies.keys())
         
+    @profile
     def get_pumping_cost(self, inplace = False):
         if inplace:
             get_pumping_cost(self.df, 'annual_el_demand', 'lcoe')
         else:
-            return get_pumping_cost(self.df.copy(), 'annual_el_demand', 'lcoe')
+            df = get_pumping_cost(self.__input('get_pumping_cost'), 'annual_el_demand', 'lcoe')
+            return self.__output('get_pumping_cost', df)
             
+    @profile
     def get_unit_pumping_cost(self, inplace = False):
         if inplace:
             get_unit_pumping_cost(self.df, 'pumping_cost',
                                   self.df.filter(like=self.sswd).sum(axis=1))
         else:
-            return get_unit_pumping_cost(self.df.copy(), 'pumping_cost',
-                                self.df.filter(like=self.sswd).sum(axis=1))
+            df = get_unit_pumping_cost(self.__input('get_unit_pumping_cost'), 'pumping_cost',
+                              self.df.filter(like=self.sswd).sum(axis=1))
+            return self.__output('get_unit_pumping_cost', df)
                                       
     ####### additional methods #############
+    def __input(self, stage):
+        '''
+        data given to a non-inplace method. With copy_mode = 'full' it is a 
+        copy of the whole data, with copy_mode = 'columns' only the columns 
+        the stage reads that are in the data are copied (see 
+        nexus_tool.pipeline), and the method returns only the columns it 
+        computed
+        '''
+        if self.copy_mode == 'columns':
+            return self.df[self.__get_stage_columns(stage, 'reads')].copy()
+        return self.df.copy()
+    
+    def __output(self, stage, df):
+        if self.copy_mode == 'columns':
+            reads = self.__get_stage_columns(stage, 'reads')
+            writes = self.__get_stage_columns(stage, 'writes', df)
+            return df[[column for column in df.columns 
+                       if (column not in reads) or (column in writes)]]
+        return df
+    
+    def __get_stage_columns(self, stage, kind, df = None):
+        # the long format (axis=0) data has one column per variable instead 
+        # of one per month
+        specs = getattr(stages[stage], kind)
+        columns = get_columns(self, specs) + \
+                  get_columns(self, [spec.replace('{i}', '') for spec in specs 
+                                     if '{i}' in spec])
+        df = self.df if df is None else df
+        return [column for column in dict.fromkeys(columns) 
+                if column in df.columns]
+    
     def __check_tech_input(self, technologies):
         if type(technologies) == str:
             if technologies.lower() in ['all', 'a', 'everything']:
@@ -546,6 +1154,7 @@ class Model():
             years = [years]
         return years
     
+    @profile
     def print_summary(self, geo_boundary = 'global'):
         if 'month' in geo_boundary:
             _id_vars = [geo_boundary] if type(geo_boundary) == str else geo_boundary.copy()
@@ -623,8 +1232,14 @@ class Model():
         efficiency = 1
         emission_factor = 0
         env_cost = 0
+        fuel_escalation = 0
+        extension_cost = 0
         def __init__(self, life, om_cost, capital_cost, efficiency, cf,
-                     fuel_cost, fuel_req, emission_factor, env_cost):
+                     fuel_cost, fuel_req, emission_factor, env_cost, 
+                     fuel_escalation = 0):
+            self.df = pd.DataFrame()
+            self.max_cap = pd.DataFrame()
+            self.lcoe = pd.DataFrame()
             self.life = life
             self.om_cost = om_cost
             self.capital_cost = capital_cost
@@ -634,6 +1249,7 @@ class Model():
             self.fuel_req = fuel_req
             self.emission_factor = emission_factor
             self.env_cost = env_cost
+            self.fuel_escalation = fuel_escalation
 
     
     class WindTurbine(Technology):
@@ -659,10 +1275,14 @@ class Model():
             self.zr = zr
             self.es = es
             self.u_arr = u_arr
-            self.p_curve = p_curve
+            self.p_curve = list(p_curve)
            
     class PVSystem(Technology):
-        pass
+        # properties:
+        cf_model = 'simple' # 'simple' (srad / 86400) or 'hourly' (get_pv_yield_cf)
+        tilt = None # panel tilt in degrees, None to use the latitude
+        temp_coeff = -0.004 # power temperature coefficient (1/C)
+        noct = 45 # nominal operating cell temperature (C)
             
             
             
@@ -0,0 +1,76 @@
+#Standard library imports
+import os
+import hashlib
+import pandas as pd
+
+def get_frame_hash(df):
+    '''
+    hash of the values and index of a DataFrame. Object columns (e.g. the
+    crop_share dictionaries) are hashed through their string representation
+    '''
+    df = df.copy(deep=False)
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].astype(str)
+    return hashlib.md5(pd.util.hash_pandas_object(df).values.tobytes() +
+                       str(list(df.columns)).encode()).hexdigest()
+
+class StageCache():
+    '''
+    On-disk cache of the columns computed by the Model stages, shared by all
+    the processes and sessions using the same folder. Entries are parquet
+    files named after the hash of the stage, its parameters and its input
+    columns (see nexus_tool.pipeline), and the least recently used ones are
+    deleted when the folder grows over max_size bytes
+    '''
+    def __init__(self, path, max_size = 2 * 1024 ** 3):
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    def get_key(self, *parts):
+        return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.path, f'{key}.parquet')
+
+    def get(self, key):
+        path = self.get_path(key)
+        try:
+            df = pd.read_parquet(path)
+        except (FileNotFoundError, OSError):
+            return None
+        # the modification time is the last use time for the LRU eviction
+        os.utime(path)
+        return df
+
+    def put(self, key, df):
+        path = self.get_path(key)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        df.to_parquet(temp_path)
+        # atomic, so concurrent processes never read a partially written file
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.parquet'):
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith('.parquet'):
+                os.remove(os.path.join(self.path, name))
@@ -0,0 +1,201 @@
+#Standard library imports
+import copy
+import pandas as pd
+import numpy as np
+
+#Local application/library specific imports
+from nexus_tool.pipeline import run_stages
+
+def read_chunks(path, chunk_size, columns = None):
+    '''
+    reads a csv or parquet file in blocks of chunk_size rows, indexed by the
+    position of the rows in the file
+    '''
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        start = 0
+        for batch in parquet_file.iter_batches(batch_size=chunk_size,
+                                               columns=columns):
+            df = batch.to_pandas()
+            # indexed by the position of the rows in the file, as the csv blocks
+            df.index = pd.RangeIndex(start, start + df.shape[0])
+            start += df.shape[0]
+            yield df
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=columns):
+            yield chunk
+
+class ChunkWriter():
+    '''
+    writes DataFrame blocks one after the other to a csv or parquet file
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.header = True
+
+    def write(self, df):
+        if self.path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        else:
+            df.to_csv(self.path, mode='w' if self.header else 'a',
+                      header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class SummaryAccumulator():
+    '''
+    per boundary sums needed to build the print_summary table and the least
+    cost technology shares without keeping the rows in memory
+    '''
+    def __init__(self, geo_boundary = 'global'):
+        self.geo_boundary = geo_boundary
+        self.sums = None
+        self.technologies = None
+
+    def update(self, model):
+        df = model.df
+        temp_df = pd.DataFrame(index=df.index)
+        temp_df['boundary'] = geo_boundary_values(df, self.geo_boundary)
+        temp_df['Irrigated area (ha)'] = df[model.crop_area]
+        temp_df['Water demand (m3)'] = df.filter(like=model.sswd).sum(axis=1)
+        for column, name in [('annual_el_demand', 'Energy demand (kWh)'),
+                             ('pumping_cost', 'Pumping cost ($)'),
+                             ('lcoe', 'lcoe')]:
+            if column in df.columns:
+                temp_df[name] = df[column]
+        if 'lcoe' in temp_df.columns:
+            temp_df['lcoe count'] = temp_df['lcoe'].notna().astype(int)
+        sums = temp_df.groupby('boundary').sum(min_count=1)
+        self.sums = sums if self.sums is None else self.sums.add(sums, fill_value=0)
+
+        if 'least_cost_tech' in df.columns:
+            temp_df['least_cost_tech'] = df['least_cost_tech']
+            temp_df['points'] = 1
+            technologies = temp_df.groupby(['boundary', 'least_cost_tech'])[
+                                  ['points', 'Energy demand (kWh)']].sum()
+            self.technologies = technologies if self.technologies is None \
+                                else self.technologies.add(technologies,
+                                                           fill_value=0)
+
+    def get_summary(self):
+        '''
+        same table as Model.print_summary for the non monthly boundaries
+        '''
+        sums = self.sums
+        summary = pd.DataFrame(index=sums.index)
+        summary.index.name = self.geo_boundary
+        summary['Irrigated area (ha)'] = sums['Irrigated area (ha)']
+        summary['Water demand (Mm3)'] = sums['Water demand (m3)'] / 1000000
+        summary['Water intensity (m3/ha)'] = sums['Water demand (m3)'] / \
+                                             summary['Irrigated area (ha)']
+        if 'Energy demand (kWh)' in sums.columns:
+            summary['Energy demand (GWh)'] = sums['Energy demand (kWh)'] / 1000000
+        if ('lcoe' in sums.columns) and ('Pumping cost ($)' in sums.columns):
+            summary['Average lcoe ($/kWh)'] = sums['lcoe'] / sums['lcoe count']
+            summary['Pumping cost (M$)'] = sums['Pumping cost ($)'] / 1000000
+            summary['Pumping cost ($/m3)'] = summary['Pumping cost (M$)'] / \
+                                             summary['Water demand (Mm3)']
+        return summary
+
+    def get_technologies(self):
+        '''
+        number of points and energy demand supplied by every least cost
+        technology in every boundary
+        '''
+        if self.technologies is None:
+            return None
+        technologies = self.technologies.copy()
+        technologies.index.names = [self.geo_boundary, 'least_cost_tech']
+        return technologies
+
+def geo_boundary_values(df, geo_boundary):
+    if geo_boundary == 'global':
+        return np.full(df.shape[0], geo_boundary, dtype=object)
+    return df[geo_boundary].values
+
+# technology attributes that can be given per point
+point_attributes = ['fuel_cost', 'fuel_escalation', 'extension_cost']
+
+def get_chunk_value(value, rows):
+    '''
+    rows of a technology attribute given per point (e.g. the grid extension
+    cost of set_grid_extension). Scalars and price trajectories shared by
+    all the points (1 x years) are kept
+    '''
+    if (np.ndim(value) == 0) or (np.shape(value)[0] == 1):
+        return value
+    if isinstance(value, pd.Series):
+        return value.iloc[rows].reset_index(drop=True)
+    return np.asarray(value)[rows]
+
+def get_chunk_model(model, df):
+    '''
+    copy of model working on a block of rows (df, indexed by the position of
+    the rows in the source, see read_chunks). The mutable state (stage
+    state, options, cubes and memory report) is not shared with the model
+    or the other blocks, and the technologies are copied with their values
+    given per point sliced to the rows of the block. The data of the copy is
+    indexed from 0, as some kernels (e.g. get_wind_cf) build their results
+    with a default index
+    '''
+    chunk_model = copy.copy(model)
+    for name, value in vars(model).items():
+        if isinstance(value, (dict, list)) and (name != 'technologies'):
+            setattr(chunk_model, name, copy.deepcopy(value))
+    rows = df.index.values
+    chunk_model.df = df.reset_index(drop=True)
+    chunk_model.cubes = {}
+    chunk_model.stage_state = {}
+    chunk_model.memory_report = []
+    chunk_model.technologies = copy.deepcopy(model.technologies)
+    for tech in chunk_model.technologies.values():
+        for name in point_attributes:
+            setattr(tech, name, get_chunk_value(getattr(tech, name), rows))
+    return chunk_model
+
+def run_chunked(model, source, output, target = 'get_unit_pumping_cost',
+                chunk_size = 100000, columns = None, output_columns = None,
+                geo_boundary = 'global', prepare = None):
+    '''
+    streams the rows of source (csv or parquet file) in blocks of chunk_size
+    through the stages needed to compute target (see Model.run), writes the
+    resulting rows to output (csv or parquet file) block by block and keeps
+    only the per boundary sums used by the summary in memory. Stages that
+    need all the rows at once (e.g. get_least_cost_allocation) are not
+    supported
+
+    columns = input columns to read (all by default)
+    output_columns = columns to write (all by default)
+    prepare = optional function called with the model of every block before
+              running the stages (e.g. to set the cropland share, or the
+              technology parameters given per point such as fuel prices)
+
+    Returns a SummaryAccumulator
+    '''
+    writer = ChunkWriter(output)
+    accumulator = SummaryAccumulator(geo_boundary)
+    try:
+        for df in read_chunks(source, chunk_size, columns):
+            chunk_model = get_chunk_model(model, df)
+            if prepare is not None:
+                prepare(chunk_model)
+            run_stages(chunk_model, target)
+            accumulator.update(chunk_model)
+            writer.write(chunk_model.df if output_columns is None else
+                         chunk_model.df[output_columns])
+    finally:
+        writer.close()
+    return accumulator
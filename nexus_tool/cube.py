@@ -0,0 +1,95 @@
+#Standard library imports
+import pandas as pd
+import numpy as np
+
+months = list(range(1,13))
+
+class Cube():
+    '''
+    Labeled N-D array, e.g. (point x month x crop), used instead of the wide
+    '{prefix}{month}_{crop}' columns. Months and crops are selected by
+    position lookups in the dimension labels instead of column names scans,
+    and the wide columns are only built when exporting (to_wide)
+
+    values = numpy array
+    coords = dictionary of dimension -> labels, in the order of the axes
+    '''
+    def __init__(self, values, coords):
+        self.values = np.asarray(values)
+        self.dims = list(coords.keys())
+        self.coords = {dim: pd.Index(labels) for dim, labels in coords.items()}
+        shape = tuple(len(labels) for labels in self.coords.values())
+        if self.values.shape != shape:
+            raise ValueError(f'values shape {self.values.shape} does not match '
+                             f'the coordinates shape {shape}')
+
+    def __repr__(self):
+        dims = ', '.join(f'{dim}: {len(labels)}' for dim, labels in
+                         self.coords.items())
+        return f'Cube({dims})'
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def get_axis(self, dim):
+        return self.dims.index(dim)
+
+    def sel(self, **labels):
+        '''
+        selects labels along dimensions, e.g. cube.sel(month=3, crop='dates').
+        A single label drops the dimension and returns a view, a list of
+        labels keeps it
+        '''
+        index = []
+        coords = {}
+        takes = []
+        for dim in self.dims:
+            if dim not in labels:
+                index.append(slice(None))
+                coords[dim] = self.coords[dim]
+            elif np.ndim(labels[dim]) == 0:
+                index.append(self.coords[dim].get_loc(labels[dim]))
+            else:
+                locs = self.coords[dim].get_indexer(labels[dim])
+                if (locs < 0).any():
+                    raise KeyError(f'{labels[dim]} not all in {dim}')
+                index.append(slice(None))
+                coords[dim] = self.coords[dim][locs]
+                takes.append((dim, locs))
+        values = self.values[tuple(index)]
+        dims = list(coords.keys())
+        for dim, locs in takes:
+            values = np.take(values, locs, axis=dims.index(dim))
+        return Cube(values, coords) if dims else values
+
+    def sum(self, dim):
+        axis = self.get_axis(dim)
+        coords = {key: value for key, value in self.coords.items() if key != dim}
+        return Cube(self.values.sum(axis=axis), coords)
+
+    def to_wide(self, prefix, index = None):
+        '''
+        wide DataFrame with one row per label of the first dimension and a
+        '{prefix}{label}_{label}...' column for every combination of the
+        labels of the other dimensions (e.g. 'ACWR_1_dates')
+        '''
+        rows = self.coords[self.dims[0]] if index is None else index
+        other = [self.coords[dim] for dim in self.dims[1:]]
+        names = [prefix + '_'.join(str(label) for label in labels) for labels
+                 in pd.MultiIndex.from_product(other)] if other else [prefix]
+        return pd.DataFrame(self.values.reshape(len(rows), -1), index=rows,
+                            columns=names)
+
+    @classmethod
+    def from_wide(cls, df, prefix, crops = None, dim = 'point'):
+        '''
+        builds a (point x month) cube from the '{prefix}{month}' columns, or a
+        (point x month x crop) cube from the '{prefix}{month}_{crop}' columns
+        '''
+        if crops is None:
+            columns = [f'{prefix}{i}' for i in months]
+            return cls(df[columns].values, {dim: df.index, 'month': months})
+        columns = [f'{prefix}{i}_{crop}' for i in months for crop in crops]
+        values = df[columns].values.reshape(df.shape[0], len(months), len(crops))
+        return cls(values, {dim: df.index, 'month': months, 'crop': list(crops)})
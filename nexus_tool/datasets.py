@@ -0,0 +1,177 @@
+#Standard library imports
+import os
+import shutil
+from urllib.parse import quote
+import pandas as pd
+
+partition_levels = ['scenario', 'sub_scenario', 'level']
+
+def write_dataset(df, path, scenario = None, sub_scenario = None, level = None,
+                  year = 'Year', compression = 'zstd'):
+    '''
+    writes df to a parquet dataset partitioned by scenario / sub_scenario /
+    level / year (only the ones given, or found in the data for the year).
+    Rewriting a case replaces its previous partitions, and different cases
+    can be written concurrently
+
+    Returns the list of partition columns
+    '''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = df.copy(deep=False)
+    partition_cols = []
+    case_folder = path
+    for name, value in zip(partition_levels, [scenario, sub_scenario, level]):
+        if value is not None:
+            df[name] = str(value)
+            partition_cols.append(name)
+            case_folder = os.path.join(case_folder, 
+                                       f'{name}={quote(str(value), safe="")}')
+    if partition_cols and os.path.isdir(case_folder):
+        # the years of the previous results missing in the new ones would not
+        # be deleted by delete_matching
+        shutil.rmtree(case_folder)
+    if (year is not None) and (year in df.columns):
+        partition_cols.append(year)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_to_dataset(table, path, partition_cols=partition_cols or None,
+                        existing_data_behavior='delete_matching',
+                        compression=compression)
+    return partition_cols
+
+def get_partitioning(path):
+    '''
+    hive partitioning of a dataset written by write_dataset, with the
+    scenario levels read as strings (e.g. level=1 is not an integer). The
+    partition fields and their types are discovered from all the files, so
+    cases partitioned by different levels can share a dataset
+    '''
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    names = []
+    for file in dataset.files:
+        folders = os.path.relpath(os.path.normpath(file),
+                                  os.path.normpath(path)).split(os.sep)[:-1]
+        for folder in folders:
+            name = folder.split('=', 1)[0]
+            if ('=' in folder) and (name not in names):
+                names.append(name)
+    if not names:
+        return None
+    fields = []
+    for name in names:
+        if (name not in partition_levels) and \
+           pa.types.is_integer(dataset.schema.field(name).type):
+            fields.append(pa.field(name, pa.int64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return ds.partitioning(pa.schema(fields), flavor='hive')
+
+def read_dataset(path, columns = None, filters = None):
+    '''
+    reads a parquet dataset (or file) reading only the given columns and the
+    row groups and partitions matching filters, e.g.
+    filters = [('scenario', '=', 'Reference'), ('Year', '>=', 2020)]
+    '''
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, columns=columns, filters=filters,
+                          partitioning=get_partitioning(path))
+    return table.to_pandas()
+
+def write_parquet_outputs(outputs, results_folder, case):
+    '''
+    ScenarioRunner writer storing every output in its own dataset,
+    results_folder/output_name, partitioned by scenario / sub_scenario /
+    level / Year
+    '''
+    scenario, sub_scenario, level = case
+    paths = {}
+    for name, df in outputs.items():
+        paths[name] = os.path.join(results_folder, name)
+        write_dataset(df, paths[name], scenario = scenario,
+                      sub_scenario = sub_scenario, level = level)
+    return paths
+
+def compact_dtypes(df, columns = None, max_categories = 0.5):
+    '''
+    float64 columns to float32, int64 columns to the smallest integer type 
+    and string columns with few distinct values (less than max_categories 
+    of the rows) to categoricals. Only the given columns if any
+    '''
+    for column in df.columns if columns is None else columns:
+        dtype = df[column].dtype
+        if dtype == 'float64':
+            df[column] = df[column].astype('float32')
+        elif dtype == 'int64':
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        elif (dtype == object) or pd.api.types.is_string_dtype(dtype):
+            values = df[column]
+            if values.map(type).eq(str).all() and \
+               (values.nunique() < max_categories * max(len(values), 1)):
+                df[column] = values.astype('category')
+    return df
+
+def get_excel_cache(path, sheet_name):
+    '''
+    path of the parquet copy of an excel sheet, named after the file
+    modification time so that it is refreshed when the file changes
+    '''
+    folder = os.path.join(os.path.dirname(os.path.abspath(path)), '.nexus_cache')
+    name = f'{os.path.basename(path)}-{sheet_name}-{os.stat(path).st_mtime_ns}.parquet'
+    return folder, os.path.join(folder, name)
+
+def read_excel_cached(path, sheet_name = 0, columns = None):
+    '''
+    reads an excel sheet through a parquet copy kept in a .nexus_cache folder
+    next to it, so the file is parsed only once until it is modified
+    '''
+    folder, cache_path = get_excel_cache(path, sheet_name)
+    if not os.path.isfile(cache_path):
+        df = pd.read_excel(path, sheet_name=sheet_name)
+        df.columns = [str(column) for column in df.columns]
+        os.makedirs(folder, exist_ok=True)
+        prefix = f'{os.path.basename(path)}-{sheet_name}-'
+        for name in os.listdir(folder):
+            if name.startswith(prefix):
+                os.remove(os.path.join(folder, name))
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, cache_path)
+    if columns is not None:
+        import pyarrow.parquet as pq
+
+        available = pq.read_schema(cache_path).names
+        columns = [column for column in columns if column in available]
+    return pd.read_parquet(cache_path, columns=columns)
+
+def load_data(path, columns = None, sheet_name = 0, compact = False):
+    '''
+    reads a csv, excel or parquet input file, only the given columns (the
+    ones missing in the file are ignored). Excel sheets are cached (see
+    read_excel_cached). With compact = True the dtypes are compacted (see
+    compact_dtypes), which rounds floats to float32 precision
+    '''
+    if path.endswith(('.xlsx', '.xls')):
+        df = read_excel_cached(path, sheet_name = sheet_name, columns = columns)
+    elif path.endswith('.parquet') or os.path.isdir(path):
+        if columns is not None:
+            import pyarrow.parquet as pq
+            import pyarrow.dataset as ds
+
+            available = pq.read_schema(path).names if os.path.isfile(path) \
+                        else ds.dataset(path, partitioning=get_partitioning(path)).schema.names
+            columns = [column for column in columns if column in available]
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        if columns is not None:
+            available = pd.read_csv(path, nrows=0).columns
+            columns = [column for column in columns if column in available]
+        df = pd.read_csv(path, usecols=columns)
+    if compact:
+        df = compact_dtypes(df)
+    return df
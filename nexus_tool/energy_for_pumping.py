@@ -3,9 +3,13 @@ import pandas as pd
 import numpy as np
 from math import pi
 
+#Local application/library specific imports
+from nexus_tool.profiling import profile
+
+@profile
 def get_gw_tdh(df, gw_depth, wdd, oap, pld, tdh_gw, interp_method = 'nearest'):
     df[tdh_gw] = df[gw_depth] + wdd + oap + pld
-    df[tdh_gw].replace(0, np.nan, inplace=True)
+    df[tdh_gw] = df[tdh_gw].replace(0, np.nan)
     # df[tdh_gw].interpolate(method = interp_method, axis=0, inplace=True)
     return df
 #D in m and A in m2
@@ -14,6 +18,7 @@ def get_A(D):
     return A
 
 #Q in m3/sec , A in m2 and V in m/sec
+@profile
 def get_V(df, avg_Q, A, mV, pump_hours, axis=1):
     if axis:
         for i in range (1,13):
@@ -29,6 +34,7 @@ def get_V(df, avg_Q, A, mV, pump_hours, axis=1):
     return df
 
 #Re=Reynold number (unitless), Ken_visc=Kinematic viscosity (m2 /s) 
+@profile
 def get_Re(df,Re,mV,D, Ken_visc, axis=1):
     if axis:
         for i in range (1,13):
@@ -42,6 +48,7 @@ def get_Re(df,Re,mV,D, Ken_visc, axis=1):
     return df
 
 #f=friction coefficient (unitless), k =  Roughness factor (m)
+@profile
 def get_f(df,f, k,D,Re, axis=1):
     if axis:
         for i in range (1,13):
@@ -56,6 +63,7 @@ def get_f(df,f, k,D,Re, axis=1):
     return df
 
 #tds in (m)
+@profile
 def get_sw_tdh(df, tdh_sw, elevation, f, L, avg_Q, D, g, pump_hours, axis=1):
     if axis:
         for i in range (1,13):
@@ -70,6 +78,7 @@ def get_sw_tdh(df, tdh_sw, elevation, f, L, avg_Q, D, g, pump_hours, axis=1):
 
     return df
 
+@profile
 def get_GWpumping_energy(df, trans_eff, pump_eff, pd_e, pwd, sswd, ed_e, tdh_gw, 
                        des_int, des_ener, desalination = False):
     GWpump_plant_eff = trans_eff * pump_eff
@@ -90,6 +99,7 @@ def get_GWpumping_energy(df, trans_eff, pump_eff, pd_e, pwd, sswd, ed_e, tdh_gw,
 
 
 #P=  Power in (W), dens=Density (Kg/m3), g=gravitational acceleration in (m/sec2)
+@profile
 def get_SWpumping_energy(df, tdh_sw, SWpump_eff, swpp_e, swpa_e, g, peak_Q, 
                          avg_Q, dens, axis=1):
     if axis:   
@@ -113,16 +123,25 @@ def get_SWpumping_energy(df, tdh_sw, SWpump_eff, swpp_e, swpa_e, g, peak_Q,
         
     return df
         
+@profile
 def get_total_pumping_energy(df, swpa_e, ed_e):
+    '''
+    surface and ground water pumping energy. The surface water energy is taken
+    as 0 when it is not in the data (ground water only datasets)
+    '''
     for i in range (1,13):
         _ed_e = '{}{}'.format(ed_e, i)
         _swpa_e = '{}{}'.format(swpa_e, i)
         total_pumping_energy ='{}{}'.format('total_pumping_energy', i)
         
-        df[total_pumping_energy]=(df[_swpa_e]+df[_ed_e])     
+        if _swpa_e in df.columns:
+            df[total_pumping_energy]=(df[_swpa_e]+df[_ed_e])
+        else:
+            df[total_pumping_energy]=df[_ed_e]
     
     return df
 
+@profile
 def get_annual_electricity(df, ed_e):
     
     df['annual_el_demand'] = df.filter(like='total_pumping_energy').sum(axis=1)
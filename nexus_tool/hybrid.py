@@ -0,0 +1,146 @@
+#Standard library imports
+import itertools
+import pandas as pd
+import numpy as np
+
+days_in_month = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+def get_hourly_load(df, energy, pumping_hours_per_day):
+    '''
+    hourly pumping load in kW (points x 12 x 24) for the representative day of
+    every month. The monthly energy demand (kWh) is spread evenly over the
+    daily pumping hours, centered at noon
+    '''
+    hours = int(round(pumping_hours_per_day))
+    start = int(12 - hours / 2)
+    shape = np.zeros(24)
+    shape[start:start + hours] = 1
+    monthly_energy = np.column_stack([df[f'{energy}{i}'].values
+                                      for i in range(1,13)]).astype(float)
+    daily_energy = monthly_energy / days_in_month
+    return (daily_energy / hours)[:, :, np.newaxis] * shape
+
+def get_crf(discount_rate, life):
+    if discount_rate == 0:
+        return 1 / life
+    return discount_rate * (1 + discount_rate) ** life / \
+           ((1 + discount_rate) ** life - 1)
+
+def get_hybrid_candidates(pv_ratios, battery_hours, diesel_ratios):
+    '''
+    grid of candidate system designs (candidates x 3), with the pv capacity
+    (kW), battery capacity (kWh) and diesel capacity (kW) per kW of peak load
+    '''
+    return np.array(list(itertools.product(pv_ratios, battery_hours,
+                                           diesel_ratios)), dtype=float)
+
+def simulate_dispatch(pv_cf, load, pv_kw, battery_kwh, diesel_kw, battery_eff,
+                      dod):
+    '''
+    load following dispatch over the 8760 hours of the year, vectorized for
+    all points and candidate designs at once. PV serves the load first, the
+    surplus charges the battery, and the remaining deficit is covered by the
+    battery and then by the diesel set
+
+    pv_cf, load = (points x 12 x 24) hourly pv capacity factor and load (kW)
+    pv_kw, battery_kwh, diesel_kw = (points x candidates) system sizes
+
+    Returns the yearly pv, battery, diesel and unmet energy (kWh) of every
+    point and candidate
+    '''
+    charge_eff = discharge_eff = np.sqrt(battery_eff)
+    min_soc = battery_kwh * (1 - dod)
+    soc = battery_kwh.copy()
+    pv_energy = np.zeros(pv_kw.shape)
+    battery_energy = np.zeros(pv_kw.shape)
+    diesel_energy = np.zeros(pv_kw.shape)
+    unmet_energy = np.zeros(pv_kw.shape)
+
+    for month in range(12):
+        for day in range(days_in_month[month]):
+            for hour in range(24):
+                _load = load[:, month, hour][:, np.newaxis]
+                _cf = pv_cf[:, month, hour][:, np.newaxis]
+                if not (_load.any() or _cf.any()):
+                    continue
+                pv = _cf * pv_kw
+                direct = np.minimum(pv, _load)
+                deficit = _load - direct
+                charge = np.minimum((pv - direct) * charge_eff, battery_kwh - soc)
+                discharge = np.minimum(deficit, (soc - min_soc) * discharge_eff)
+                soc += charge - discharge / discharge_eff
+                deficit -= discharge
+                diesel = np.minimum(deficit, diesel_kw)
+
+                pv_energy += direct
+                battery_energy += discharge
+                diesel_energy += diesel
+                unmet_energy += deficit - diesel
+
+    return pv_energy, battery_energy, diesel_energy, unmet_energy
+
+def get_hybrid_sizing(pv_cf, load, candidates, discount_rate, pv_cost, pv_om,
+                      pv_life, battery_cost, battery_life, battery_eff, dod,
+                      diesel_cost, diesel_om, diesel_life, fuel_cost, fuel_req,
+                      diesel_eff, max_unmet = 0, chunk_size = None):
+    '''
+    searches the least-cost pv/battery/diesel design of every point over the
+    candidates grid (see get_hybrid_candidates). Capital costs are annualized
+    with the capital recovery factor and O&M costs are a share of the capital
+    cost, as in get_lcoe. Designs leaving more than max_unmet of the yearly
+    load unserved are discarded
+
+    pv_cf, load = (points x 12 x 24) hourly pv capacity factor and load (kW)
+    fuel_cost = scalar or one value per point
+    '''
+    n_points = load.shape[0]
+    if chunk_size is None:
+        chunk_size = max(1, int(1e6 / candidates.shape[0]))
+    peak_load = load.max(axis=(1,2))
+    yearly_load = (load * days_in_month[np.newaxis, :, np.newaxis]).sum(axis=(1,2))
+    fuel_cost = np.broadcast_to(np.asarray(fuel_cost, dtype=float), (n_points,))
+
+    pv_annual_cost = pv_cost * (get_crf(discount_rate, pv_life) + pv_om)
+    battery_annual_cost = battery_cost * get_crf(discount_rate, battery_life)
+    diesel_annual_cost = diesel_cost * (get_crf(discount_rate, diesel_life) + diesel_om)
+
+    results = []
+    for start in range(0, n_points, chunk_size):
+        _slice = slice(start, start + chunk_size)
+        _peak_load = peak_load[_slice, np.newaxis]
+        pv_kw = candidates[:, 0] * _peak_load
+        battery_kwh = candidates[:, 1] * _peak_load
+        diesel_kw = candidates[:, 2] * _peak_load
+        pv_energy, battery_energy, diesel_energy, unmet_energy = \
+            simulate_dispatch(pv_cf[_slice], load[_slice], pv_kw, battery_kwh,
+                              diesel_kw, battery_eff, dod)
+
+        annual_cost = pv_kw * pv_annual_cost + \
+                      battery_kwh * battery_annual_cost + \
+                      diesel_kw * diesel_annual_cost + \
+                      diesel_energy * fuel_req * \
+                      fuel_cost[_slice, np.newaxis] / diesel_eff
+        _yearly_load = yearly_load[_slice, np.newaxis]
+        served = _yearly_load - unmet_energy
+        feasible = (unmet_energy <= max_unmet * _yearly_load) & (served > 0)
+        lcoe = np.where(feasible, annual_cost / np.where(served > 0, served, 1),
+                        np.inf)
+
+        best = lcoe.argmin(axis=1)
+        rows = np.arange(best.shape[0])
+        found = feasible.any(axis=1)
+        chunk = pd.DataFrame({'hybrid_pv_kw': pv_kw[rows, best],
+                              'hybrid_battery_kwh': battery_kwh[rows, best],
+                              'hybrid_diesel_kw': diesel_kw[rows, best],
+                              'hybrid_lcoe': lcoe[rows, best]})
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chunk['hybrid_pv_share'] = (pv_energy + battery_energy)[rows, best] / \
+                                       _yearly_load[:, 0]
+            chunk['hybrid_diesel_share'] = diesel_energy[rows, best] / \
+                                           _yearly_load[:, 0]
+            chunk['hybrid_unmet_share'] = unmet_energy[rows, best] / \
+                                          _yearly_load[:, 0]
+        chunk.loc[~found] = np.nan
+        results.append(chunk)
+
+    return pd.concat(results, ignore_index=True)
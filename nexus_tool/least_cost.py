@@ -1,8 +1,12 @@
 #Standard library imports
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 from math import pi
 
+#Local application/library specific imports
+from nexus_tool.profiling import profile
+
 def wind_cf(df, wind, mu, t, p_rated, z, zr, es, u_arr, p_curve):
     u_zr = df[wind]
     
@@ -16,6 +20,7 @@ def wind_cf(df, wind, mu, t, p_rated, z, zr, es, u_arr, p_curve):
     
     return energy_produced/(p_rated * t)
     
+@profile
 def get_wind_cf(df, wind, mu, t, p_rated, z, zr, es, u_arr, p_curve, axis=1):
     cf_df = pd.DataFrame()
     if axis:
@@ -30,6 +35,7 @@ def get_wind_cf(df, wind, mu, t, p_rated, z, zr, es, u_arr, p_curve, axis=1):
                                                  zr, es, u_arr, p_curve)
     return cf_df
     
+@profile
 def get_pv_cf(df, srad, axis=1):
     cf_df = pd.DataFrame()
     if axis:
@@ -42,6 +48,107 @@ def get_pv_cf(df, srad, axis=1):
         cf_df['cf'] = df[srad] / (60*60*24)
     return cf_df
     
+def get_cos_incidence(latitude, declination, hour_angle):
+    return np.clip(np.sin(latitude) * np.sin(declination) + np.cos(latitude) * 
+                   np.cos(declination) * np.cos(hour_angle), 0, None)
+
+@lru_cache(maxsize=None)
+def get_clear_sky_profile(lat_band, month, tilt):
+    '''
+    hourly clear-sky profiles for the representative day of the month at the 
+    center of a latitude band. Cached, so they are shared between points, 
+    technologies and runs. Returns the normalized horizontal irradiance 
+    profile (sums to 1), the matching beam profile transposed to a plane 
+    tilted towards the equator, and the daily extraterrestrial radiation 
+    (kWh/(m2.day))
+    '''
+    J = 15 + (month - 1) * 30
+    declination = 0.409 * np.sin((2 * pi / 365) * J - 1.39)
+    ird = 1 + 0.033 * np.cos((2 * pi / 365) * J)
+    hour_angle = np.radians((np.arange(24) + 0.5 - 12) * 15)
+    latitude = np.radians(lat_band)
+    # an equator facing plane has the geometry of a horizontal plane at lat - tilt
+    tilted_latitude = latitude - np.sign(lat_band) * np.radians(tilt)
+    
+    cos_zenith = get_cos_incidence(latitude, declination, hour_angle)
+    daylight = cos_zenith > 0
+    cos_incidence = np.where(daylight, get_cos_incidence(tilted_latitude, 
+                                                         declination, 
+                                                         hour_angle), 0)
+    extraterrestrial = 1.367 * ird * cos_zenith # kW/m2
+    air_mass = 1 / np.where(daylight, cos_zenith, 1)
+    clear_sky = np.where(daylight, extraterrestrial * 0.7 ** (air_mass ** 0.678), 0)
+    
+    horizontal = np.zeros(24)
+    beam = np.zeros(24)
+    if clear_sky.sum() > 0:
+        horizontal = clear_sky / clear_sky.sum()
+        beam = horizontal * cos_incidence / np.where(daylight, cos_zenith, 1)
+    horizontal.setflags(write=False)
+    beam.setflags(write=False)
+    return horizontal, beam, extraterrestrial.sum()
+    
+@profile
+def get_hourly_pv_cf(df, srad, lat, tavg = None, tilt = None, band_width = 1, 
+                     temp_coeff = -0.004, noct = 45, albedo = 0.2):
+    '''
+    hourly pv capacity factor (points x 12 x 24) for the representative day 
+    of every month. The daily solar radiation (kJ/(m2.day)) is distributed 
+    over the day with the cached clear-sky profile of the latitude band of 
+    each point, split in beam and diffuse with the Liu-Jordan correlation and 
+    transposed to the panel tilt (None to use the latitude). If tavg is given, 
+    the output is derated with the cell temperature from the NOCT model
+    '''
+    bands, inverse = np.unique(np.round(df[lat].values / band_width) * band_width, 
+                               return_inverse=True)
+    inverse = inverse.reshape(-1)
+    tilts = np.abs(bands) if tilt is None else np.full(bands.shape, float(tilt))
+    cos_tilt = np.cos(np.radians(tilts))[inverse, np.newaxis]
+    
+    cf = np.empty((df.shape[0], 12, 24))
+    for i in range(1,13):
+        profiles = [get_clear_sky_profile(float(band), i, float(_tilt)) 
+                    for band, _tilt in zip(bands, tilts)]
+        horizontal = np.stack([profile[0] for profile in profiles])[inverse]
+        beam = np.stack([profile[1] for profile in profiles])[inverse]
+        extraterrestrial = np.array([profile[2] for profile in profiles])[inverse]
+        
+        daily_radiation = df[f'{srad}{i}'].values / 3600 # kWh/(m2.day)
+        clearness = np.clip(np.divide(daily_radiation, extraterrestrial, 
+                                      out=np.zeros(daily_radiation.shape), 
+                                      where=extraterrestrial > 0), 0, 1)
+        diffuse_fraction = np.clip(1.39 - 4.027 * clearness + 
+                                   5.531 * clearness ** 2 - 
+                                   3.108 * clearness ** 3, 0, 1)[:, np.newaxis]
+        daily_radiation = daily_radiation[:, np.newaxis]
+        
+        global_horizontal = horizontal * daily_radiation
+        irradiance = beam * daily_radiation * (1 - diffuse_fraction) + \
+                     global_horizontal * diffuse_fraction * (1 + cos_tilt) / 2 + \
+                     global_horizontal * albedo * (1 - cos_tilt) / 2
+        if tavg is not None:
+            cell_temperature = df[f'{tavg}{i}'].values[:, np.newaxis] + \
+                               (noct - 20) / 0.8 * irradiance
+            irradiance = irradiance * (1 + temp_coeff * (cell_temperature - 25))
+        cf[:, i-1, :] = irradiance
+    return cf
+    
+@profile
+def get_pv_yield_cf(df, srad, lat, tavg = None, tilt = None, band_width = 1, 
+                    temp_coeff = -0.004, noct = 45, albedo = 0.2):
+    '''
+    monthly pv capacity factor (cf_1 to cf_12, as in get_pv_cf) from the 
+    hourly yield model of get_hourly_pv_cf
+    '''
+    cf = get_hourly_pv_cf(df, srad, lat, tavg = tavg, tilt = tilt, 
+                          band_width = band_width, temp_coeff = temp_coeff, 
+                          noct = noct, albedo = albedo).mean(axis=2)
+    cf_df = pd.DataFrame(index=df.index)
+    for i in range (1,13):
+        cf_df['cf_{}'.format(i)] = cf[:, i-1]
+    return cf_df
+    
+@profile
 def get_installed_capacity(df, cf, pd_e, axis=1):
     ic_df = pd.DataFrame()
     if axis:
@@ -56,6 +163,7 @@ def get_installed_capacity(df, cf, pd_e, axis=1):
         ic_df['ic'] = df[pd_e] / cf
     return ic_df
     
+@profile
 def get_max_capacity(df, axis=1):
     if axis:
         return pd.DataFrame({'max_cap': df.filter(like='ic_').max(axis=1)})
@@ -64,20 +172,81 @@ def get_max_capacity(df, axis=1):
 
 
 def get_fuel_cost(fuel_cost, el_gen, efficiency, fuel_req):
-    if type(fuel_cost) == int:
-        fuel = el_gen * fuel_req * fuel_cost / efficiency
-        fuel[0] = 0
+    '''
+    fuel (or electricity) cost for every point and year of el_gen. fuel_cost 
+    can be a scalar, one price per point or a (points x years) price matrix, 
+    e.g. from get_price_trajectory
+    '''
+    fuel_cost = np.asarray(fuel_cost, dtype=float)
+    if fuel_cost.ndim == 1:
+        fuel_cost = fuel_cost[:, np.newaxis]
+    return el_gen * fuel_req * fuel_cost / efficiency
+    
+def get_price_trajectory(base_price, start_year, end_year, escalation = 0,
+                         anchors = None):
+    '''
+    (points x years) price matrix over the project years (start_year to 
+    end_year - 1). Prices either grow from base_price at a yearly escalation 
+    rate, or are linearly interpolated between anchors, a dictionary of 
+    year -> price. Prices and escalation rates can be scalars or one value 
+    per point
+    '''
+    years = np.arange(start_year, end_year)
+    if anchors:
+        anchor_years = sorted(anchors.keys())
+        prices = np.stack(np.broadcast_arrays(*[np.asarray(anchors[year], dtype=float) 
+                                                for year in anchor_years]))
+        prices = prices.reshape(len(anchor_years), -1)
+        # (years x anchors) linear interpolation weights, flat outside the anchors
+        weights = np.stack([np.interp(years, anchor_years, unit) for unit in 
+                            np.eye(len(anchor_years))], axis=1)
+        return (weights @ prices).T
     else:
-        fuel = np.array([gen * fuel_req * cost / efficiency for gen, cost in zip(el_gen, fuel_cost)])
-    return fuel
+        base_price = np.asarray(base_price, dtype=float).reshape(-1, 1)
+        escalation = np.asarray(escalation, dtype=float).reshape(-1, 1)
+        return base_price * (1 + escalation) ** (years - start_year)
+    
+def get_yearly_price(fuel_cost, years):
+    '''
+    price of every row of a long format table (one row per point and year). 
+    fuel_cost is a scalar or one price per year, as a Series indexed by year 
+    or a dictionary of year -> price
+    '''
+    if isinstance(fuel_cost, (pd.Series, dict)):
+        prices = years.map(fuel_cost)
+        if prices.isna().any():
+            raise ValueError(f'No fuel price for the years '
+                             f'{sorted(set(years[prices.isna()]))}')
+        return prices.values
+    if np.ndim(fuel_cost):
+        raise ValueError('The long format (axis=0) lcoe needs a scalar fuel '
+                         'cost or one price per year (a Series indexed by '
+                         f'year), got an array of shape {np.shape(fuel_cost)}')
+    return fuel_cost
     
 def get_emissions(el_gen, efficiency, fuel_req, emission_factor):
     emissions = el_gen * fuel_req * emission_factor / efficiency
     return emissions
 
+def get_grid_extension_cost(distance, cost_per_km, max_distance = None):
+    '''
+    capital cost of connecting every point to the grid, from the distance (m) 
+    to the nearest line. Points farther than max_distance (m) or without a 
+    distance cannot be connected and get an infinite cost
+    '''
+    distance = np.asarray(distance, dtype=float)
+    cost = distance / 1000 * cost_per_km
+    unreachable = np.isnan(distance)
+    if max_distance is not None:
+        unreachable |= distance > max_distance
+    cost[unreachable] = np.inf
+    return cost
+
+@profile
 def get_lcoe(max_capacity, total_demand, tech_life, om_cost, capital_cost,
              discount_rate, project_life, fuel_cost, fuel_req, 
-             efficiency, emission_factor, env_cost, start_year, end_year, axis=1):
+             efficiency, emission_factor, env_cost, start_year, end_year, axis=1,
+             extension_cost = 0):
     if axis:
         # Perform the time-value LCOE calculation
         reinvest_year = 0
@@ -89,25 +258,28 @@ def get_lcoe(max_capacity, total_demand, tech_life, om_cost, capital_cost,
             reinvest_year = tech_life
 
         year = np.arange(project_life)
-        el_gen = np.array([demand * np.ones(project_life -1) for demand in total_demand])
-        el_gen = np.insert(el_gen,0,0,axis=1)
-        discount_factor = np.array([(1 + discount_rate) ** year for i in total_demand])
-        investments = np.array([np.zeros(project_life-1) for i in capital_cost])
-        investments = np.insert(investments,0,capital_cost,axis=1)
+        capital_cost = np.asarray(capital_cost, dtype=float)
+        om_cost = np.asarray(om_cost, dtype=float)
+        el_gen = np.asarray(total_demand, dtype=float)[:, np.newaxis] * \
+                 np.ones(project_life)
+        el_gen[:, 0] = 0
+        discount_factor = (1 + discount_rate) ** year[np.newaxis, :]
+        investments = np.zeros((capital_cost.shape[0], project_life))
+        # grid extension is only paid once, when the point is connected
+        investments[:, 0] = capital_cost + extension_cost
         
         if reinvest_year:
-            investments = np.delete(investments,reinvest_year,axis=1)
-            investments = np.insert(investments,reinvest_year,capital_cost,axis=1)
+            investments[:, reinvest_year] = capital_cost
 
-        salvage = np.array([np.zeros(project_life-1) for i in capital_cost])
+        salvage = np.zeros((capital_cost.shape[0], project_life))
         used_life = project_life
         if reinvest_year:
             # salvage will come from the remaining life after the re-investment
             used_life = project_life - tech_life
-        salvage = np.insert(salvage,-1,capital_cost * (1 - used_life / tech_life),axis=1)
+        salvage[:, -2] = capital_cost * (1 - used_life / tech_life)
 
-        operation_and_maintenance = np.array([i * np.ones(project_life-1) for i in om_cost])
-        operation_and_maintenance = np.insert(operation_and_maintenance,0,0,axis=1)
+        operation_and_maintenance = np.zeros((om_cost.shape[0], project_life))
+        operation_and_maintenance[:, 1:] = om_cost[:, np.newaxis]
         
         fuel = get_fuel_cost(fuel_cost,el_gen,efficiency,fuel_req)
         emissions = get_emissions(el_gen,efficiency,fuel_req,emission_factor)
@@ -130,7 +302,8 @@ def get_lcoe(max_capacity, total_demand, tech_life, om_cost, capital_cost,
         df = get_salvage(df, start_year, end_year, tech_life)
         df['emissions'] = get_emissions(df['total_demand'], efficiency, 
                                         fuel_req, emission_factor)
-        df['fuel_cost'] = df['total_demand'] * fuel_req * fuel_cost / efficiency
+        df['fuel_cost'] = df['total_demand'] * fuel_req * \
+                          get_yearly_price(fuel_cost, df.Year) / efficiency
         df['discounted_costs'] = (df['capital_cost'] + df['om_cost'] + 
                                   df['fuel_cost'] + df['emissions'] * env_cost - 
                                   df['salvage']) / df['discount_factor']
@@ -144,6 +317,67 @@ def get_lcoe(max_capacity, total_demand, tech_life, om_cost, capital_cost,
         
         return dff
         
+@profile
+def get_lcoe_samples(max_capacity, total_demand, tech_life, om_cost, 
+                     capital_cost, discount_rate, project_life, fuel_cost, 
+                     fuel_req, efficiency, emission_factor, env_cost, 
+                     fuel_scale = 1, price_years = False, extension_cost = 0):
+    '''
+    closed-form equivalent of get_lcoe (axis=1) evaluated for a batch of 
+    parameter samples at once. The yearly cash flows are collapsed into 
+    discount sums, so the result is a (samples x points) array without 
+    materializing the years axis
+    
+    max_capacity, total_demand = one value per point
+    tech_life, om_cost, capital_cost, discount_rate, fuel_req, efficiency, 
+    emission_factor, env_cost = scalar or one value per sample
+    fuel_cost = scalar or array broadcastable to (samples x points), or a
+                (points x years) price matrix if price_years is True
+    fuel_scale = scalar or one multiplier of the fuel cost per sample
+    extension_cost = scalar or one grid extension cost per point
+    '''
+    max_capacity = np.asarray(max_capacity, dtype=float).reshape(1, -1)
+    total_demand = np.asarray(total_demand, dtype=float).reshape(1, -1)
+    tech_life, om_cost, capital_cost, discount_rate, fuel_req, efficiency, \
+    emission_factor, env_cost, fuel_scale = [np.asarray(x, dtype=float).reshape(-1, 1) 
+                                             for x in [tech_life, om_cost, 
+                                                       capital_cost, discount_rate, 
+                                                       fuel_req, efficiency, 
+                                                       emission_factor, env_cost,
+                                                       fuel_scale]]
+    fuel_cost = np.asarray(fuel_cost, dtype=float)
+    
+    # sum of discount factors over the operating years (generation starts in year 1)
+    year = np.arange(1, project_life)
+    discount = (1 + discount_rate) ** -year
+    annuity = discount.sum(axis=1, keepdims=True)
+    if price_years:
+        discounted_fuel = discount @ fuel_cost[:, 1:].T
+    else:
+        if fuel_cost.ndim < 2:
+            fuel_cost = fuel_cost.reshape(-1, 1)
+        discounted_fuel = fuel_cost * annuity
+    
+    capital_cost = capital_cost * max_capacity
+    # one re-investment if the technology life is less than the project life
+    reinvest = tech_life < project_life
+    reinvest_factor = np.where(reinvest, (1 + discount_rate) ** -tech_life, 0)
+    used_life = np.where(reinvest, project_life - tech_life, project_life)
+    # salvage is booked in the second to last year, as in get_lcoe
+    salvage = capital_cost * (1 - used_life / tech_life) / \
+              (1 + discount_rate) ** (project_life - 2)
+    
+    extension_cost = np.asarray(extension_cost, dtype=float).reshape(1, -1)
+    discounted_costs = capital_cost * (1 + reinvest_factor) - salvage + \
+                       extension_cost + \
+                       om_cost * capital_cost * annuity + \
+                       total_demand * fuel_req / efficiency * \
+                       (discounted_fuel * fuel_scale + 
+                        emission_factor * env_cost * annuity)
+    discounted_generation = total_demand * annuity
+    
+    return discounted_costs / discounted_generation
+        
 def get_salvage(df, start_year, end_year, tech_life):
     year_used = ((end_year-start_year) % tech_life)
     years_left = tech_life - year_used - 1
@@ -165,6 +399,7 @@ def get_capital_cost(max_capacity, start_year, end_year, tech_life, capital_cost
     df['capital_cost'] = capital_cost * df.new_capacity
     return df
    
+@profile
 def get_least_cost(df, geo_boundary_col = None, geo_boundary_name = None):
     if geo_boundary_col == None:
         filter_vec = [True] * df.shape[0]
@@ -172,21 +407,253 @@ def get_least_cost(df, geo_boundary_col = None, geo_boundary_name = None):
     else:
         filter_vec = df[geo_boundary_col]==geo_boundary_name
         i = 1
+    # the technology columns, before the result columns are added
+    technologies = list(df)[i:]
     df.loc[filter_vec, 'least_cost_technology'] = \
-                                df.loc[filter_vec, list(df)[i:]].idxmin(axis=1)
-    df.loc[filter_vec, 'lcoe'] = df.loc[filter_vec, list(df)[i:]].min(axis=1)
+                                df.loc[filter_vec, technologies].idxmin(axis=1)
+    df.loc[filter_vec, 'lcoe'] = df.loc[filter_vec, technologies].min(axis=1)
     return df.loc[filter_vec, ['least_cost_technology', 'lcoe']]
 
+def get_allowed_mask(boundary, technologies, allowed):
+    '''
+    boolean (points x technologies) matrix with the technologies allowed in the
+    geographic boundary of each point. Points in boundaries that are not in the 
+    allowed dictionary get no technology
+    '''
+    boundaries = pd.Index(list(allowed.keys()))
+    tech_index = pd.Index(technologies)
+    # last row is kept empty for the points outside any listed boundary
+    allowed_matrix = np.zeros((len(boundaries) + 1, len(technologies)), dtype=bool)
+    for i, value in enumerate(allowed.values()):
+        allowed_matrix[i, tech_index.get_indexer(list(value))] = True
+    codes = boundaries.get_indexer(np.asarray(boundary))
+    return allowed_matrix[codes]
+
+@profile
+def get_least_cost_masked(lcoe_df, boundary, allowed):
+    '''
+    vectorized least-cost technology selection with technologies restricted by
+    geographic boundary. Builds the allowed-technology mask from the boundary
+    mapping and runs one masked argmin over the (points x technologies) matrix
+
+    lcoe_df = DataFrame with one lcoe column per technology
+    boundary = array-like with the boundary name of each point
+    allowed = dictionary of boundary name -> list of allowed technologies
+    '''
+    technologies = list(lcoe_df.columns)
+    lcoe = lcoe_df.values.astype(float)
+    mask = get_allowed_mask(boundary, technologies, allowed) & ~np.isnan(lcoe)
+    masked_lcoe = np.where(mask, lcoe, np.inf)
+    idx = masked_lcoe.argmin(axis=1)
+    valid = mask.any(axis=1)
+    
+    least_cost = pd.DataFrame(index=lcoe_df.index)
+    least_cost['least_cost_technology'] = np.where(valid, 
+                                        np.array(technologies, dtype=object)[idx], 
+                                        np.nan)
+    least_cost['lcoe'] = np.where(valid, 
+                                  masked_lcoe[np.arange(lcoe.shape[0]), idx], 
+                                  np.nan)
+    return least_cost
+
+def get_cap_limits(caps, boundary, technologies, n_points):
+    '''
+    (boundaries x technologies) matrix of caps (nan for no cap) and the 
+    boundary of every point (-1 for the points outside the caps index)
+    '''
+    if type(caps) == dict:
+        caps = pd.DataFrame(caps, index=['global'])
+        codes = np.zeros(n_points, dtype=int)
+    elif not isinstance(caps, pd.DataFrame):
+        raise ValueError('The caps must be a DataFrame of boundary x technology '
+                         f'or a dictionary of technology -> maximum, got {type(caps)}')
+    elif boundary is None:
+        raise ValueError('cap_boundary (the boundary name of every point) is '
+                         'needed to apply caps given by boundary')
+    else:
+        boundary = np.asarray(boundary)
+        if boundary.shape[0] != n_points:
+            raise ValueError(f'cap_boundary has {boundary.shape[0]} values for '
+                             f'{n_points} points')
+        codes = caps.index.get_indexer(boundary)
+    return caps.reindex(columns=technologies).values.astype(float), codes
+
+@profile
+def get_least_cost_allocation(lcoe_df, demand, capacity_df, caps, 
+                              cap_boundary = None, allowed_mask = None, 
+                              metric = 'capacity'):
+    '''
+    least-cost supply of all points subject to regional caps, formulated as 
+    a sparse linear program and solved with the scipy HiGHS solver. The 
+    variables are the share of the demand of every point supplied by every 
+    technology (points x technologies), so a point can end up with a mix of 
+    technologies when a cap is binding
+    
+    lcoe_df, capacity_df = DataFrames with one column per technology with the 
+                           lcoe and the required capacity (kW) of every point
+    demand = yearly energy demand of every point (kWh)
+    caps = DataFrame of boundary name (index) x technology with the maximum 
+           capacity (kW) or generation (kWh) allowed in each boundary (nan for 
+           no cap), or a dictionary of technology -> global maximum. A list 
+           of them applies all their caps at once (e.g. per province and 
+           per country caps)
+    cap_boundary = boundary name of every point, to match the caps index, or 
+                   a list with the boundary of every caps of the list (None 
+                   for the dictionaries)
+    allowed_mask = optional boolean (points x technologies) matrix of the 
+                   technologies available in every point
+    metric = 'capacity' or 'generation', the quantity capped
+    '''
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix, vstack
+    
+    technologies = list(lcoe_df.columns)
+    n_points, n_techs = lcoe_df.shape
+    lcoe = lcoe_df.values.astype(float)
+    demand = np.asarray(demand, dtype=float)
+    available = np.isfinite(lcoe)
+    if allowed_mask is not None:
+        available &= allowed_mask
+    supplied = available.any(axis=1)
+    cost = np.where(available, lcoe * demand[:, np.newaxis], 0).ravel()
+    bounds = np.column_stack([np.zeros(n_points * n_techs), 
+                              available.ravel().astype(float)])
+    
+    # the shares of every supplied point add up to one
+    A_eq = coo_matrix((np.ones(n_points * n_techs), 
+                       (np.repeat(np.arange(n_points), n_techs), 
+                        np.arange(n_points * n_techs))), 
+                      shape=(n_points, n_points * n_techs)).tocsr()
+    b_eq = supplied.astype(float)
+    
+    if metric == 'capacity':
+        coefficients = capacity_df.reindex(columns=technologies).values.astype(float)
+    elif metric == 'generation':
+        coefficients = np.repeat(demand[:, np.newaxis], n_techs, axis=1)
+    else:
+        raise ValueError(f"metric must be 'capacity' or 'generation', got {metric}")
+    
+    if type(caps) != list:
+        caps, cap_boundary = [caps], [cap_boundary]
+    elif type(cap_boundary) != list:
+        cap_boundary = [cap_boundary] * len(caps)
+    if len(caps) != len(cap_boundary):
+        raise ValueError(f'Got {len(caps)} caps and {len(cap_boundary)} cap boundaries')
+    A_ub = []
+    b_ub = []
+    for _caps, boundary in zip(caps, cap_boundary):
+        limits, codes = get_cap_limits(_caps, boundary, technologies, n_points)
+        has_cap = ~np.isnan(limits)
+        # one constraint row per (boundary, technology) with a cap
+        cap_rows = np.full(limits.shape, -1)
+        cap_rows[has_cap] = np.arange(has_cap.sum())
+        rows = np.where((codes >= 0)[:, np.newaxis], cap_rows[codes], -1)
+        selected = (rows >= 0) & available
+        A_ub.append(coo_matrix((coefficients[selected], 
+                                (rows[selected], np.flatnonzero(selected))), 
+                               shape=(has_cap.sum(), n_points * n_techs)))
+        b_ub.append(limits[has_cap])
+    A_ub = vstack(A_ub).tocsr()
+    b_ub = np.concatenate(b_ub)
+    
+    result = linprog(cost, A_ub=A_ub if b_ub.size else None, 
+                     b_ub=b_ub if b_ub.size else None, A_eq=A_eq, 
+                     b_eq=b_eq, bounds=bounds, method='highs')
+    if result.status != 0:
+        raise ValueError(f'The allocation problem could not be solved: {result.message}')
+    
+    shares = np.clip(result.x, 0, 1).reshape(n_points, n_techs)
+    allocation = pd.DataFrame(shares, columns=technologies, index=lcoe_df.index)
+    allocation['least_cost_technology'] = np.where(supplied, 
+                                    np.array(technologies, dtype=object)[shares.argmax(axis=1)], 
+                                    np.nan)
+    allocation['lcoe'] = np.where(supplied, 
+                                  (np.where(available, lcoe, 0) * shares).sum(axis=1), 
+                                  np.nan)
+    return allocation
+
+def get_emission_intensity(efficiency, fuel_req, emission_factor):
+    '''
+    emissions per unit of electricity (e.g. kgCO2/kWh), as used in get_emissions
+    '''
+    return fuel_req * emission_factor / efficiency
+
+def get_pareto_front(lcoe_df, emissions_df):
+    '''
+    boolean (points x technologies) DataFrame marking the technologies that 
+    are Pareto-efficient in cost and emissions in every point, i.e. no other 
+    technology has lower or equal lcoe and emissions with one of them strictly 
+    lower. Technologies with nan lcoe or emissions are never efficient
+    '''
+    lcoe = lcoe_df.values.astype(float)
+    emissions = emissions_df.reindex(columns=lcoe_df.columns).values.astype(float)
+    valid = ~(np.isnan(lcoe) | np.isnan(emissions))
+    lcoe = np.where(valid, lcoe, np.inf)
+    emissions = np.where(valid, emissions, np.inf)
+    # (points x technology x other technology) dominance comparison
+    no_worse = (lcoe[:, np.newaxis, :] <= lcoe[:, :, np.newaxis]) & \
+               (emissions[:, np.newaxis, :] <= emissions[:, :, np.newaxis])
+    better = (lcoe[:, np.newaxis, :] < lcoe[:, :, np.newaxis]) | \
+             (emissions[:, np.newaxis, :] < emissions[:, :, np.newaxis])
+    dominated = (no_worse & better & valid[:, np.newaxis, :]).any(axis=2)
+    return pd.DataFrame(valid & ~dominated, columns=lcoe_df.columns, 
+                        index=lcoe_df.index)
+
+def get_carbon_price_sweep(lcoe_df, emission_intensity, carbon_prices, 
+                           allowed_mask = None):
+    '''
+    least-cost technology of every point for a range of carbon prices, 
+    computed as one (points x technologies x prices) array operation
+    
+    lcoe_df = DataFrame with the lcoe ($/kWh) of every technology
+    emission_intensity = emissions of every technology (kgCO2/kWh), as a 
+                         dictionary, Series or DataFrame (one value per point)
+    carbon_prices = carbon prices ($/tCO2), added on top of the env_cost 
+                    already included in the lcoe
+    
+    Returns a DataFrame with the least-cost technology for every carbon 
+    price, and the first carbon price at which the least-cost technology 
+    differs from the one at the first price (switch_carbon_price)
+    '''
+    technologies = list(lcoe_df.columns)
+    carbon_prices = np.asarray(carbon_prices, dtype=float)
+    lcoe = lcoe_df.values.astype(float)
+    if isinstance(emission_intensity, pd.DataFrame):
+        intensity = emission_intensity.reindex(columns=technologies).values.astype(float)
+    else:
+        intensity = np.array([emission_intensity[tech] for tech in technologies], 
+                             dtype=float)[np.newaxis, :]
+    valid = np.isfinite(lcoe)
+    if allowed_mask is not None:
+        valid &= allowed_mask
+    
+    total_cost = lcoe[:, :, np.newaxis] + intensity[:, :, np.newaxis] * \
+                 carbon_prices[np.newaxis, np.newaxis, :] / 1000
+    total_cost = np.where(valid[:, :, np.newaxis], total_cost, np.inf)
+    choice = total_cost.argmin(axis=1)
+    supplied = valid.any(axis=1)
+    
+    names = np.array(technologies, dtype=object)
+    sweep = pd.DataFrame(np.where(supplied[:, np.newaxis], names[choice], np.nan),
+                         columns=carbon_prices, index=lcoe_df.index)
+    switched = choice != choice[:, [0]]
+    sweep['switch_carbon_price'] = np.where(switched.any(axis=1) & supplied, 
+                                            carbon_prices[switched.argmax(axis=1)], 
+                                            np.nan)
+    return sweep
+
 def get_tech_generation(df, technologies):
     for key in technologies:
                 df.loc[df['least_cost_tech']==key, f'{key} generation'] = \
                         df.loc[df['least_cost_tech']==key, 'annual_el_demand']
     return df
 
+@profile
 def get_pumping_cost(df, energy_demand, lcoe):
     df['pumping_cost'] = df[energy_demand] * df[lcoe]
     return df
 
+@profile
 def get_unit_pumping_cost(df, pumping_cost, water_demand):
     df['unit_pumping_cost'] = df[pumping_cost] / water_demand
     return df
\ No newline at end of file
@@ -0,0 +1,53 @@
+#Standard library imports
+import os
+import pandas as pd
+
+#Local application/library specific imports
+from nexus_tool.pipeline import stages, get_columns
+from nexus_tool.datasets import compact_dtypes
+
+def get_memory(df):
+    return int(df.memory_usage(deep=True).sum())
+
+def get_unused_intermediates(model):
+    '''
+    intermediate columns in the data (e.g. the kc, ACWR and harvest columns
+    of every month and crop) that no registered stage reads
+    '''
+    read = set(get_columns(model, [spec for stage in stages.values()
+                                   for spec in stage.reads]))
+    intermediates = get_columns(model, [spec for stage in stages.values()
+                                        for spec in stage.intermediates])
+    return [column for column in intermediates if
+            (column in model.df.columns) and (column not in read)]
+
+def optimize_memory(model, stage = None, columns = None, downcast = True,
+                    drop_intermediates = True, spill = None):
+    '''
+    reduces the memory used by the data: compacts the dtypes of the given
+    columns (all by default, see nexus_tool.datasets.compact_dtypes) and
+    drops the unused intermediate columns, writing them first to
+    spill/<stage>.parquet if a spill folder is given (which then needs the
+    stage)
+
+    Returns a dictionary with the memory before and after and the dropped
+    columns
+    '''
+    if (spill is not None) and (stage is None):
+        raise ValueError('a stage is needed to name the spilled columns file')
+    before = get_memory(model.df)
+    if downcast:
+        compact_dtypes(model.df, columns = columns)
+    dropped = get_unused_intermediates(model) if drop_intermediates else []
+    if dropped:
+        if spill is not None:
+            os.makedirs(spill, exist_ok=True)
+            model.df[dropped].to_parquet(os.path.join(spill, f'{stage}.parquet'))
+        model.df.drop(columns=dropped, inplace=True)
+    after = get_memory(model.df)
+    return {'stage': stage, 'bytes_before': before, 'bytes_after': after,
+            'bytes_saved': before - after, 'dropped_columns': len(dropped)}
+
+def load_spilled(spill, stage, columns = None):
+    return pd.read_parquet(os.path.join(spill, f'{stage}.parquet'),
+                           columns=columns)
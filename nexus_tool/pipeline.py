@@ -0,0 +1,379 @@
+#Standard library imports
+import hashlib
+import pickle
+import pandas as pd
+import numpy as np
+
+#Local application/library specific imports
+from nexus_tool.cache import get_frame_hash
+
+class Stage():
+    '''
+    declaration of a Model stage: the Model method that runs it, the stages
+    it depends on, the Model parameters it uses and the columns it reads from
+    and writes to Model.df. Column specs are templates formatted with the
+    Model attributes, {i} for the month (1 to 12) and {crop} for the crops of
+    the crop calendar, e.g. '{eto}{i}' -> ETo_1 ... ETo_12. Intermediates
+    are columns written by the stage but not needed by the other stages.
+    Optional requirements only run when their input columns are in the data
+    (e.g. the surface water chain for ground water only datasets)
+    '''
+    def __init__(self, name, requires = [], params = [], reads = [],
+                 writes = [], kwargs = {}, satisfied = None, memoize = True,
+                 cache = True, intermediates = [], optional = []):
+        self.name = name
+        self.requires = requires
+        self.optional = optional
+        self.params = params
+        self.reads = reads
+        self.writes = writes
+        self.intermediates = intermediates
+        self.kwargs = kwargs
+        self.satisfied = satisfied
+        self.memoize = memoize
+        # whether the outputs can be stored in the Model.cache (they must be
+        # fully determined by the read columns and the parameters)
+        self.cache = cache and memoize and bool(writes) and (satisfied is None)
+
+    def is_satisfied(self, model, needed = None):
+        '''
+        whether the outputs of the stage are in the data. needed restricts the
+        check to the outputs read by the stages that requested it
+        '''
+        if self.satisfied is not None:
+            return self.satisfied(model)
+        if not self.writes:
+            return False
+        columns = get_columns(model, self.writes)
+        if needed is not None:
+            columns = [column for column in columns if column in needed] or columns
+        return all(column in model.df.columns for column in columns)
+
+    def run(self, model):
+        kwargs = self.kwargs.copy()
+        kwargs.update(model.stage_options.get(self.name, {}))
+        return getattr(model, self.name)(**kwargs)
+
+class ModelAttributes(dict):
+    def __init__(self, model, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+
+    def __missing__(self, key):
+        return getattr(self.model, key)
+
+def get_crops(model):
+    if model.crop_calendar is None:
+        return []
+    return list(model.crop_calendar[model.crop_column])
+
+def get_columns(model, specs):
+    columns = []
+    for spec in specs:
+        months = range(1,13) if '{i}' in spec else [None]
+        crops = get_crops(model) if '{crop}' in spec else [None]
+        for i in months:
+            for crop in crops:
+                columns.append(spec.format_map(ModelAttributes(model, i=i,
+                                                               crop=crop)))
+    return columns
+
+def calendar_satisfied(model):
+    return (model.crop_calendar is not None) and \
+           all('_'.join([season, 'days']) in model.crop_calendar.columns
+               for season in model.seasons)
+
+def kc_values_satisfied(model):
+    return (model.crop_calendar is not None) and \
+           all('{}{}'.format(model.kc, i) in model.crop_calendar.columns
+               for i in range(1,13))
+
+def technologies_satisfied(attribute, column = None):
+    def satisfied(model):
+        for tech in model.technologies.values():
+            value = getattr(tech, attribute, None)
+            if attribute == 'cf':
+                if value is None:
+                    return False
+            elif (value is None) or value.empty or \
+                 ((column is not None) and (column not in value.columns)):
+                return False
+        return bool(model.technologies)
+    return satisfied
+
+stages = {stage.name: stage for stage in [
+    Stage('get_eto', params=['eto', 'lat', 'elevation', 'wind', 'srad', 'tmin',
+                             'tmax', 'tavg'],
+          reads=['{lat}', '{elevation}', '{wind}{i}', '{srad}{i}', '{tmin}{i}',
+                 '{tmax}{i}', '{tavg}{i}'],
+          writes=['{eto}{i}'], kwargs={'inplace': True}),
+    Stage('get_effective_rainfall', requires=['get_eto'],
+          params=['eff', 'prec', 'eto'],
+          reads=['{prec}{i}', '{eto}{i}'],
+          writes=['{eff}{i}'], kwargs={'inplace': True}),
+    Stage('get_calendar_days', params=['seasons', 'start', 'end'],
+          satisfied=calendar_satisfied, kwargs={'inplace': True}),
+    Stage('get_kc_values', requires=['get_calendar_days'],
+          params=['seasons', 'kc_dict', 'crop_column', 'start', 'end', 'kc'],
+          satisfied=kc_values_satisfied, kwargs={'inplace': True}),
+    Stage('get_water_demand', requires=['get_effective_rainfall', 'get_kc_values'],
+          params=['ky_dict', 'crop_column', 'aeff', 'deff', 'seasons',
+                  'pumping_hours_per_day', 'crop_area', 'eto', 'kc', 'eff',
+                  'acwr', 'pcwr', 'pwd', 'sswd', 'crop_share', 'crop_calendar',
+                  'backend'],
+          reads=['{crop_area}', '{crop_share}', '{eto}{i}', '{eff}{i}'],
+          writes=['{pcwr}{i}', '{pwd}{i}', '{sswd}{i}'],
+          intermediates=['{kc}{i}_{crop}', '{acwr}{i}_{crop}', 'harvest_{i}_{crop}'],
+          kwargs={'inplace': True}),
+    Stage('get_gw_tdh', params=['gw_depth', 'tdh_gw'],
+          reads=['{gw_depth}'], writes=['{tdh_gw}'], kwargs={'inplace': True}),
+    Stage('get_GWpumping_energy', requires=['get_water_demand', 'get_gw_tdh'],
+          params=['trans_eff', 'pump_eff', 'pd_e', 'pwd', 'sswd', 'ed_e',
+                  'tdh_gw', 'des_int', 'des_ener'],
+          reads=['{pwd}{i}', '{sswd}{i}', '{tdh_gw}'],
+          writes=['{pd_e}{i}', '{ed_e}{i}'], kwargs={'inplace': True}),
+    Stage('get_A', params=['D', 'A'], reads=['{D}'], writes=['{A}'],
+          kwargs={'inplace': True}),
+    Stage('get_V', requires=['get_A', 'get_water_demand'],
+          params=['avg_Q', 'A', 'mV', 'pumping_hours_per_day'],
+          reads=['{avg_Q}{i}', '{A}'], writes=['{mV}{i}'],
+          kwargs={'inplace': True}),
+    Stage('get_Re', requires=['get_V'], params=['Re', 'mV', 'D'],
+          reads=['{mV}{i}', '{D}'], writes=['{Re}{i}'],
+          kwargs={'inplace': True}),
+    Stage('get_f', requires=['get_Re'], params=['f', 'D', 'Re'],
+          reads=['{Re}{i}', '{D}'], writes=['{f}{i}'],
+          kwargs={'inplace': True}),
+    Stage('get_sw_tdh', requires=['get_f'],
+          params=['tdh_sw', 'elevation', 'f', 'L', 'avg_Q', 'D',
+                  'pumping_hours_per_day'],
+          reads=['{elevation}', '{f}{i}', '{L}', '{avg_Q}{i}', '{D}'],
+          writes=['{tdh_sw}'], kwargs={'inplace': True}),
+    Stage('get_SWpumping_energy', requires=['get_sw_tdh'],
+          params=['SWpump_eff', 'tdh_sw', 'swpp_e', 'peak_Q', 'swpa_e',
+                  'avg_Q', 'g', 'dens'],
+          reads=['{tdh_sw}', '{peak_Q}{i}', '{avg_Q}{i}'],
+          writes=['{swpp_e}{i}', '{swpa_e}{i}'], kwargs={'inplace': True}),
+    Stage('get_total_pumping_energy', requires=['get_GWpumping_energy'],
+          optional=['get_SWpumping_energy'],
+          params=['swpa_e', 'ed_e'],
+          reads=['{swpa_e}{i}', '{ed_e}{i}'],
+          writes=['total_pumping_energy{i}'], kwargs={'inplace': True}),
+    Stage('get_annual_electricity', requires=['get_total_pumping_energy'],
+          reads=['total_pumping_energy{i}'], writes=['annual_el_demand'],
+          kwargs={'inplace': True}),
+    Stage('get_cf', params=['wind', 'srad', 'lat', 'tavg',
+                            'technologies[mu,t,p_rated,z,zr,es,u_arr,p_curve,'
+                            'cf_model,tilt,temp_coeff,noct]'],
+          reads=['{wind}{i}', '{srad}{i}'],
+          satisfied=technologies_satisfied('cf')),
+    Stage('get_installed_capacity', requires=['get_cf', 'get_GWpumping_energy'],
+          params=['pd_e', 'technologies[cf]'], reads=['{pd_e}{i}'],
+          satisfied=technologies_satisfied('df')),
+    Stage('get_max_capacity', requires=['get_installed_capacity'],
+          params=['technologies[]'],
+          satisfied=technologies_satisfied('df', 'max_cap')),
+    Stage('get_lcoe', requires=['get_max_capacity', 'get_annual_electricity'],
+          params=['discount_rate', 'start_year', 'end_year', 'technologies'],
+          reads=['annual_el_demand'],
+          satisfied=technologies_satisfied('df', 'lcoe')),
+    Stage('get_least_cost', requires=['get_lcoe'], params=['technologies'],
+          writes=['least_cost_tech', 'lcoe'], cache=False),
+    Stage('get_pumping_cost', requires=['get_least_cost'],
+          reads=['annual_el_demand', 'lcoe'], writes=['pumping_cost'],
+          kwargs={'inplace': True}),
+    Stage('get_unit_pumping_cost', requires=['get_pumping_cost'],
+          params=['sswd'], reads=['pumping_cost', '{sswd}{i}'],
+          writes=['unit_pumping_cost'], kwargs={'inplace': True}),
+    Stage('print_summary', requires=['get_water_demand', 'get_annual_electricity',
+                                     'get_pumping_cost'],
+          reads=['{crop_area}', '{sswd}{i}', 'annual_el_demand', 'lcoe',
+                 'pumping_cost'], memoize=False),
+]}
+
+def get_fingerprint(value):
+    '''
+    stable hash of a parameter value, used to detect edited parameters.
+    Technologies are hashed by their parameters, not by their results
+    '''
+    if isinstance(value, pd.Series):
+        return get_frame_hash(value.to_frame())
+    if isinstance(value, pd.DataFrame):
+        return get_frame_hash(value)
+    if isinstance(value, dict):
+        return hashlib.md5(pickle.dumps([(str(key), get_fingerprint(val)) for
+                                         key, val in value.items()])).hexdigest()
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        params = {key: val for key, val in vars(value).items() if
+                  (key not in ['df', 'max_cap', 'lcoe']) and
+                  not ((key == 'cf') and isinstance(val, (pd.DataFrame, pd.Series)))}
+        return get_fingerprint(params)
+    if isinstance(value, np.ndarray):
+        return hashlib.md5(value.tobytes() + str(value.shape).encode()).hexdigest()
+    try:
+        return hashlib.md5(pickle.dumps(value)).hexdigest()
+    except Exception:
+        return repr(value)
+
+def get_param(model, param):
+    '''
+    value of a stage parameter. 'technologies[a,b]' stands for the a and b
+    attributes of every technology, so that a stage is not invalidated by
+    technology parameters it does not use
+    '''
+    if not param.endswith(']'):
+        return getattr(model, param)
+    name, attributes = param[:-1].split('[')
+    attributes = [attribute for attribute in attributes.split(',') if attribute]
+    params = {}
+    for key, tech in getattr(model, name).items():
+        params[key] = {}
+        for attribute in attributes:
+            value = getattr(tech, attribute, None)
+            if not isinstance(value, (pd.DataFrame, pd.Series)):
+                params[key][attribute] = value
+    return params
+
+def get_stage_fingerprint(model, stage):
+    '''
+    hash of the parameters, options and input columns of a stage, so it is
+    rerun when any of them is edited
+    '''
+    reads = [column for column in get_columns(model, stage.reads)
+             if column in model.df.columns]
+    return get_fingerprint({'params': {param: get_param(model, param) for
+                                       param in stage.params},
+                            'options': model.stage_options.get(stage.name, {}),
+                            'data': get_frame_hash(model.df[reads])})
+
+def get_upstream(target):
+    '''
+    stages needed to run target, in execution order
+    '''
+    order = []
+    def visit(name):
+        if name in order:
+            return
+        for requirement in stages[name].requires + stages[name].optional:
+            visit(requirement)
+        order.append(name)
+    visit(target)
+    return order
+
+def get_input_columns(model, targets):
+    '''
+    columns of the input data read by the stages needed for targets, i.e.
+    the columns they read that are not computed by any of them
+    '''
+    order = []
+    for target in targets:
+        for name in get_upstream(get_stage_name(target)):
+            if name not in order:
+                order.append(name)
+    written = set(get_columns(model, [spec for name in order for spec in
+                                      stages[name].writes +
+                                      stages[name].intermediates]))
+    columns = []
+    for name in order:
+        for column in get_columns(model, stages[name].reads):
+            if (column not in written) and (column not in columns):
+                columns.append(column)
+    return columns
+
+def get_stage_name(target):
+    if target in stages:
+        return target
+    for stage in stages.values():
+        if target in stage.writes or '{' not in target and \
+           any(spec.replace('{i}', '') == target for spec in stage.writes):
+            return stage.name
+    raise KeyError(f'{target} is not a Model stage or a stage output')
+
+def is_available(model, name, needed):
+    '''
+    whether an optional stage can run (its input columns are in the data) or
+    its outputs were already given
+    '''
+    return stages[name].is_satisfied(model, needed) or \
+           all(column in model.df.columns for column in
+               get_input_columns(model, [name]))
+
+def run_stage(model, stage, fingerprint):
+    '''
+    runs a stage, or loads its outputs from the Model.cache when the same
+    stage was computed with the same parameters and input columns (both in
+    the fingerprint). With the cube backend the intermediates of a stage are
+    kept in Model.cubes instead of the data, so the stage is not cached
+    '''
+    cache = getattr(model, 'cache', None)
+    if (cache is None) or not stage.cache or \
+       (stage.intermediates and (getattr(model, 'backend', 'wide') == 'cube')):
+        return stage.run(model)
+    key = cache.get_key(stage.name, fingerprint)
+    outputs = cache.get(key)
+    if outputs is None:
+        result = stage.run(model)
+        cache.put(key, model.df[[column for column in
+                                 get_columns(model, stage.writes +
+                                             stage.intermediates)
+                                 if column in model.df.columns]])
+        return result
+    for column in outputs.columns:
+        model.df[column] = outputs[column].values
+
+def run_stages(model, target):
+    '''
+    runs the stages needed to produce target (a stage name or an output
+    column), skipping the ones already computed with the same parameters.
+    A stage that never ran is considered computed if the outputs read by its
+    dependents are already in the data (e.g. loaded from a previous run), and
+    a stage is rerun when one of its parameters changed or one of its
+    upstream stages was rerun
+    '''
+    resolved = {}
+    results = {}
+    def resolve(name, needed):
+        if name in resolved:
+            return resolved[name]
+        stage = stages[name]
+        if stage.memoize and (name not in model.stage_state) and \
+           stage.is_satisfied(model, needed):
+            resolved[name] = False
+            return False
+        reads = set(get_columns(model, stage.reads))
+        upstream_rerun = False
+        for requirement in stage.requires:
+            upstream_rerun = resolve(requirement, reads) or upstream_rerun
+        for requirement in stage.optional:
+            if is_available(model, requirement, reads):
+                upstream_rerun = resolve(requirement, reads) or upstream_rerun
+        fingerprint = get_stage_fingerprint(model, stage)
+        needs_run = (not stage.memoize) or upstream_rerun or \
+                    (model.stage_state.get(name) != fingerprint) or \
+                    not stage.is_satisfied(model, needed)
+        if needs_run:
+            columns = list(model.df.columns) if model.df is not None else []
+            results[name] = run_stage(model, stage, fingerprint)
+            if getattr(model, 'memory_optimizer', False) and (model.df is not None):
+                model.optimize_memory(stage = name,
+                                      columns = model.df.columns.difference(columns))
+            if stage.memoize:
+                model.stage_state[name] = fingerprint
+        resolved[name] = needs_run
+        return needs_run
+
+    target = get_stage_name(target)
+    resolve(target, None)
+    return results.get(target)
+
+def invalidate(model, stage = None):
+    '''
+    forgets the state of stage and its downstream stages (or of all stages),
+    so they are recomputed the next time they are requested
+    '''
+    if stage is None:
+        model.stage_state.clear()
+        return
+    for name in stages:
+        if stage in get_upstream(name):
+            model.stage_state.pop(name, None)
@@ -0,0 +1,192 @@
+#Standard library imports
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+import pandas as pd
+
+try:
+    import resource
+except ImportError: # not available on windows
+    resource = None
+
+enabled = False
+records = []
+lock = threading.Lock()
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    with lock:
+        records.clear()
+
+@contextmanager
+def record_profile(reset_records = True):
+    '''
+    enables profiling inside a with block, e.g.
+
+    with record_profile():
+        model.run('get_unit_pumping_cost')
+    table = get_profile()
+    '''
+    global enabled
+    if reset_records:
+        reset()
+    previous = enabled
+    enabled = True
+    try:
+        yield
+    finally:
+        enabled = previous
+
+def get_peak_rss():
+    '''
+    peak resident memory of the process since it started in bytes (a high
+    water mark, that does not change when a call uses less memory than an
+    earlier one)
+    '''
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+def get_rss():
+    '''
+    current resident memory of the process in bytes (0 without psutil)
+    '''
+    try:
+        import psutil
+    except ImportError:
+        return 0
+    return psutil.Process().memory_info().rss
+
+def call_recorded(function, record, *args, **kwargs):
+    '''
+    calls function in a worker process, with profiling enabled if record,
+    and returns its result and the calls recorded by the worker. Records
+    are kept per process, so the parent merges them with add_records, e.g.
+
+    future = pool.submit(call_recorded, function, is_enabled(), **kwargs)
+    result, worker_records = future.result()
+    add_records(worker_records)
+    '''
+    global enabled
+    enabled = record
+    reset()
+    result = function(*args, **kwargs)
+    with lock:
+        return result, list(records)
+
+def add_records(worker_records):
+    with lock:
+        records.extend(worker_records)
+
+def is_enabled():
+    return enabled
+
+def get_frame(args, kwargs):
+    for arg in list(args) + list(kwargs.values()):
+        if isinstance(arg, (pd.DataFrame, pd.Series)):
+            return arg
+        df = getattr(arg, 'df', None)
+        if isinstance(df, pd.DataFrame):
+            return df
+    return None
+
+def profile(function = None, name = None):
+    '''
+    records the wall time, cpu time, rows, resident memory change and
+    columns added of every call of function while profiling is enabled
+    (see enable). The rows and columns are the ones of the first DataFrame
+    (or Series, or object with a df attribute such as Model) argument,
+    positional or keyword. The
+    memory change is the memory kept by the call (e.g. the new columns),
+    not its peak use. Calls run in worker processes are only recorded when
+    they are run through call_recorded.
+    When profiling is disabled the only cost is a flag check
+    '''
+    if function is None:
+        return functools.partial(profile, name = name)
+    name = function.__qualname__ if name is None else name
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return function(*args, **kwargs)
+        df = get_frame(args, kwargs)
+        columns = len(df.columns) if isinstance(df, pd.DataFrame) else 0
+        rss = get_rss()
+        start = time.time()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            # non inplace calls return the frame with the new columns
+            after = result if isinstance(result, pd.DataFrame) else get_frame(args, kwargs)
+            added = (len(after.columns) - columns) if \
+                    isinstance(after, pd.DataFrame) else 0
+            with lock:
+                records.append({'name': name, 'module': function.__module__,
+                                'start': start, 'wall_time': wall,
+                                'cpu_time': cpu,
+                                'rows': 0 if df is None else len(df),
+                                'rss_delta': get_rss() - rss,
+                                'columns_added': added,
+                                'pid': os.getpid(),
+                                'thread': threading.get_ident()})
+    return wrapper
+
+def get_profile():
+    '''
+    table of the recorded calls
+    '''
+    with lock:
+        return pd.DataFrame(list(records),
+                            columns=['name', 'module', 'start', 'wall_time',
+                                     'cpu_time', 'rows', 'rss_delta',
+                                     'columns_added', 'pid', 'thread'])
+
+def get_profile_summary():
+    '''
+    calls, total times and maximum memory change by function
+    '''
+    return get_profile().groupby('name').agg(calls=('wall_time', 'size'),
+                                             wall_time=('wall_time', 'sum'),
+                                             cpu_time=('cpu_time', 'sum'),
+                                             rows=('rows', 'sum'),
+                                             rss_delta=('rss_delta', 'max'),
+                                             columns_added=('columns_added', 'sum')
+                                             ).sort_values('wall_time',
+                                                           ascending=False)
+
+def write_chrome_trace(path):
+    '''
+    writes the recorded calls as a Chrome trace (chrome://tracing or
+    https://ui.perfetto.dev)
+    '''
+    events = []
+    for record in get_profile().to_dict('records'):
+        events.append({'name': record['name'], 'cat': record['module'],
+                       'ph': 'X', 'ts': record['start'] * 1e6,
+                       'dur': record['wall_time'] * 1e6,
+                       'pid': record['pid'], 'tid': record['thread'],
+                       'args': {'cpu_time': record['cpu_time'],
+                                'rows': record['rows'],
+                                'rss_delta': record['rss_delta'],
+                                'columns_added': record['columns_added']}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,150 @@
+#Standard library imports
+import os
+import traceback
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+#Local application/library specific imports
+from nexus_tool.datasets import write_parquet_outputs
+from nexus_tool.profiling import call_recorded, add_records, is_enabled
+
+# inputs shared by all the cases of a worker process (see ScenarioRunner)
+shared_inputs = {}
+
+def set_shared_inputs(shared):
+    global shared_inputs
+    shared_inputs = shared
+
+def get_cases(load_folder, scenarios = None):
+    '''
+    (scenario, sub_scenario, level) folders found under load_folder, i.e.
+    load_folder/scenario/sub_scenario/level
+    '''
+    if scenarios is None:
+        scenarios = sorted(os.listdir(load_folder))
+    cases = []
+    for scenario in scenarios:
+        scenario_folder = os.path.join(load_folder, scenario)
+        if not os.path.isdir(scenario_folder):
+            continue
+        for sub_scenario in sorted(os.listdir(scenario_folder)):
+            sub_scenario_folder = os.path.join(scenario_folder, sub_scenario)
+            if not os.path.isdir(sub_scenario_folder):
+                continue
+            for level in sorted(os.listdir(sub_scenario_folder)):
+                if os.path.isdir(os.path.join(sub_scenario_folder, level)):
+                    cases.append((scenario, sub_scenario, level))
+    return cases
+
+def write_outputs(outputs, results_folder, case):
+    paths = {}
+    output_folder = os.path.join(results_folder, *case)
+    os.makedirs(output_folder, exist_ok=True)
+    for name, df in outputs.items():
+        paths[name] = os.path.join(output_folder, f'{name}.csv')
+        df.to_csv(paths[name], index=False)
+    return paths
+
+def run_case(case_function, load_folder, results_folder, case, shared,
+             writer = write_outputs):
+    '''
+    runs case_function(load_data, **shared) for one case and writes the
+    returned dictionary of name -> DataFrame to results_folder/scenario/
+    sub_scenario/level. Errors are recorded instead of stopping the sweep
+    '''
+    scenario, sub_scenario, level = case
+    record = {'scenario': scenario, 'sub_scenario': sub_scenario,
+              'level': level}
+    try:
+        outputs = case_function(os.path.join(load_folder, *case), **shared)
+        paths = writer(outputs, results_folder, case)
+    except Exception:
+        return [dict(record, output=None, path=None, rows=0,
+                     error=traceback.format_exc())]
+    return [dict(record, output=name, path=paths[name], rows=df.shape[0],
+                 error=None) for name, df in outputs.items()]
+
+def run_shared_case(args):
+    case_function, load_folder, results_folder, case, writer = args
+    return run_case(case_function, load_folder, results_folder, case,
+                    shared_inputs, writer)
+
+class ScenarioRunner():
+    '''
+    Runs a case function over the scenario/sub_scenario/level tree of
+    processed WEAP data (e.g. 'WEAP data/Processed data') and stores its
+    outputs with the same layout under results_folder, as read by the
+    dashboards. The case function receives the folder of the case and the
+    shared inputs as keyword arguments and returns a dictionary of output
+    name -> DataFrame, e.g.:
+
+    def jordan_case(load_data, diameters):
+        jordan = nexus_tool.Model(pd.read_csv(os.path.join(load_data,
+                                                           'Pipelines_flow.csv')))
+        jordan.df['Pipe_diameter'] = jordan.df['pipeline'].map(diameters)
+        ...
+        return {'Pipelines_data': jordan.df.loc[jordan.df.Year>=2020]}
+
+    runner = ScenarioRunner(jordan_case, 'WEAP data/Processed data',
+                            'dashboard/data', shared = {'diameters': {...}},
+                            n_workers = 4)
+    index = runner.run()
+
+    With output_format = 'parquet', every output is stored instead as a
+    parquet dataset results_folder/output_name partitioned by scenario /
+    sub_scenario / level / Year (see nexus_tool.datasets.read_dataset).
+
+    Cases run on a process pool of at most n_workers processes. The shared
+    inputs (e.g. geometries or crop calendars) are sent once to every worker
+    instead of once per case, and the case function must be importable (a
+    module level function) to be used by the workers
+    '''
+    def __init__(self, case_function, load_folder, results_folder,
+                 scenarios = None, shared = None, n_workers = 1,
+                 output_format = 'csv'):
+        self.case_function = case_function
+        self.load_folder = load_folder
+        self.results_folder = results_folder
+        self.scenarios = scenarios
+        self.shared = {} if shared is None else shared
+        self.n_workers = n_workers
+        self.writer = write_parquet_outputs if output_format == 'parquet' \
+                      else write_outputs
+
+    def get_cases(self):
+        return get_cases(self.load_folder, self.scenarios)
+
+    def run(self, cases = None):
+        '''
+        runs all the cases (or the given list of (scenario, sub_scenario,
+        level) tuples) and returns the index of the stored results, which is
+        also written to results_folder/results_index.csv
+        '''
+        cases = self.get_cases() if cases is None else cases
+        args = [(self.case_function, self.load_folder, self.results_folder,
+                 case) for case in cases]
+        n_workers = min(self.n_workers, len(cases))
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers,
+                                     initializer=set_shared_inputs,
+                                     initargs=(self.shared,)) as executor:
+                # the profiling records of the workers are merged back
+                results = []
+                for case_records, worker_records in executor.map(
+                                functools.partial(call_recorded, run_shared_case,
+                                                  is_enabled()),
+                                [arg + (self.writer,) for arg in args]):
+                    add_records(worker_records)
+                    results.append(case_records)
+        else:
+            results = [run_case(*arg, shared=self.shared, writer=self.writer)
+                       for arg in args]
+
+        index = pd.DataFrame([record for records in results for record in records],
+                             columns=['scenario', 'sub_scenario', 'level',
+                                      'output', 'path', 'rows', 'error'])
+        os.makedirs(self.results_folder, exist_ok=True)
+        index.to_csv(os.path.join(self.results_folder, 'results_index.csv'),
+                     index=False)
+        return index
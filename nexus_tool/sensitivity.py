@@ -0,0 +1,195 @@
+#Standard library imports
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+
+#Local application/library specific imports
+from nexus_tool.least_cost import get_lcoe_samples
+
+tech_parameters = ['life', 'om_cost', 'capital_cost', 'efficiency', 'fuel_cost',
+                   'fuel_req', 'emission_factor', 'env_cost']
+
+def draw_samples(distribution, n, rng):
+    if type(distribution) == tuple:
+        method, *args = distribution
+        return getattr(rng, method)(*args, size=n)
+    elif np.ndim(distribution) == 0:
+        return np.full(n, float(distribution))
+    else:
+        samples = np.asarray(distribution, dtype=float)
+        if samples.shape[0] != n:
+            raise ValueError(f'Expected {n} samples, got {samples.shape[0]}')
+        return samples
+
+def sample_parameters(distributions, n, seed = None):
+    '''
+    draws n samples for every uncertain parameter. distributions is a
+    dictionary of parameter -> distribution for the model wide parameters
+    (i.e. discount_rate) and of technology -> {parameter -> distribution} for
+    the technology parameters. A distribution can be a scalar, an array of n
+    values or a tuple with the name of a numpy random Generator method and its
+    arguments, e.g.:
+
+    {'discount_rate': ('uniform', 0.03, 0.08),
+     'Solar PV': {'capital_cost': ('triangular', 900, 1140, 1400)},
+     'Diesel set': {'fuel_cost_scale': ('normal', 1, 0.2)}}
+
+    fuel_cost_scale multiplies the fuel cost of the technology (useful when
+    it is a different value for every point or year), whereas fuel_cost 
+    replaces it
+    '''
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for key, value in distributions.items():
+        if type(value) == dict:
+            samples[key] = {param: draw_samples(dist, n, rng)
+                            for param, dist in value.items()}
+        else:
+            samples[key] = draw_samples(value, n, rng)
+    return samples
+
+def get_samples_number(samples):
+    for value in samples.values():
+        if type(value) == dict:
+            for _value in value.values():
+                return len(_value)
+        else:
+            return len(value)
+    return 1
+
+def get_tech_samples(tech, samples):
+    params = {param: samples.get(param, tech[param]) for param in tech_parameters}
+    # a (points x years) base price is discounted year by year in get_lcoe_samples
+    params['price_years'] = np.ndim(tech['fuel_cost']) == 2
+    if 'fuel_cost' in samples:
+        params['fuel_cost'] = np.asarray(samples['fuel_cost'], dtype=float)
+        params['price_years'] = False
+    elif np.ndim(tech['fuel_cost']) == 1:
+        params['fuel_cost'] = np.asarray(tech['fuel_cost'], dtype=float).reshape(1, -1)
+    params['fuel_scale'] = samples.get('fuel_cost_scale', 1)
+    params['extension_cost'] = tech.get('extension_cost', 0)
+    return params
+
+def get_point_params(tech, n_points):
+    '''
+    tech with a one dimensional fuel cost that is not one value per point
+    (i.e. one price per year) as a (1 x years) price trajectory
+    '''
+    fuel_cost = tech.get('fuel_cost', 0)
+    if (np.ndim(fuel_cost) == 1) and (len(fuel_cost) not in [1, n_points]):
+        tech = dict(tech, fuel_cost = np.asarray(fuel_cost, dtype=float).reshape(1, -1))
+    return tech
+
+def evaluate_block(block):
+    techs, samples, total_demand, project_life, discount_rate, mask, \
+                                                        percentiles = block
+    n_samples = get_samples_number(samples)
+    lcoe = np.empty((n_samples, total_demand.shape[0], len(techs)))
+    for j, (name, tech) in enumerate(techs.items()):
+        params = get_tech_samples(tech, samples.get(name, {}))
+        lcoe[:, :, j] = get_lcoe_samples(max_capacity = tech['max_cap'],
+                                         total_demand = total_demand,
+                                         tech_life = params['life'],
+                                         om_cost = params['om_cost'],
+                                         capital_cost = params['capital_cost'],
+                                         discount_rate = samples.get('discount_rate',
+                                                                     discount_rate),
+                                         project_life = project_life,
+                                         fuel_cost = params['fuel_cost'],
+                                         fuel_req = params['fuel_req'],
+                                         efficiency = params['efficiency'],
+                                         emission_factor = params['emission_factor'],
+                                         env_cost = params['env_cost'],
+                                         fuel_scale = params['fuel_scale'],
+                                         price_years = params['price_years'],
+                                         extension_cost = params['extension_cost'])
+
+    lcoe[~np.isfinite(lcoe)] = np.nan
+    valid = mask[np.newaxis, :, :] & ~np.isnan(lcoe)
+    masked_lcoe = np.where(valid, lcoe, np.inf)
+    choice = masked_lcoe.argmin(axis=2)
+    chosen = valid.any(axis=2)
+    counts = np.stack([((choice == j) & chosen).sum(axis=0)
+                       for j in range(len(techs))], axis=1)
+    least_cost = np.where(chosen, masked_lcoe.min(axis=2), np.nan)
+
+    with warnings.catch_warnings():
+        # points without any allowed technology give all-nan slices
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        tech_percentiles = np.nanpercentile(np.where(mask, lcoe, np.nan),
+                                            percentiles, axis=0)
+        least_cost_percentiles = np.nanpercentile(least_cost, percentiles, axis=0)
+    return tech_percentiles, least_cost_percentiles, counts, chosen.sum(axis=0)
+
+def get_lcoe_sensitivity(techs, samples, total_demand, project_life,
+                         discount_rate, mask = None, percentiles = (5, 50, 95),
+                         n_workers = 1, chunk_size = None):
+    '''
+    evaluates the lcoe of every technology and the least-cost choice for all
+    the parameter samples at once (samples as an extra array axis), splitting
+    the points in blocks that are evaluated on a process pool when n_workers > 1
+
+    techs = dictionary of technology -> dictionary with the base parameters
+            (tech_parameters) and the max_cap array of the technology
+    samples = output of sample_parameters
+    mask = optional boolean (points x technologies) matrix of allowed technologies
+
+    Returns a DataFrame with the lcoe percentiles of every technology and of
+    the least-cost option, and a DataFrame with the probability of every
+    technology being the least-cost one in each point
+    '''
+    names = list(techs.keys())
+    total_demand = np.asarray(total_demand, dtype=float)
+    n_points = total_demand.shape[0]
+    n_samples = get_samples_number(samples)
+    if mask is None:
+        mask = np.ones((n_points, len(names)), dtype=bool)
+    if chunk_size is None:
+        # keeps every (samples x points x technologies) block around 128 MB
+        chunk_size = max(1, int(16e6 / (n_samples * len(names))))
+
+    techs = {name: get_point_params(tech, n_points) for name, tech in techs.items()}
+    blocks = []
+    for start in range(0, n_points, chunk_size):
+        _slice = slice(start, start + chunk_size)
+        _techs = {}
+        for name, tech in techs.items():
+            _tech = tech.copy()
+            _tech['max_cap'] = np.asarray(tech['max_cap'], dtype=float)[_slice]
+            for param in ['fuel_cost', 'extension_cost']:
+                value = tech.get(param, 0)
+                # only the values given per point are split, a price trajectory
+                # shared by all the points (1 x years) goes to every block
+                if np.ndim(value) and (np.shape(value)[0] == n_points):
+                    _tech[param] = np.asarray(value, dtype=float)[_slice]
+            _techs[name] = _tech
+        blocks.append((_techs, samples, total_demand[_slice], project_life,
+                       discount_rate, mask[_slice], percentiles))
+
+    if (n_workers > 1) and (len(blocks) > 1):
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(evaluate_block, blocks))
+    else:
+        results = [evaluate_block(block) for block in blocks]
+
+    tech_percentiles = np.concatenate([r[0] for r in results], axis=1)
+    least_cost_percentiles = np.concatenate([r[1] for r in results], axis=1)
+    counts = np.concatenate([r[2] for r in results], axis=0)
+    chosen = np.concatenate([r[3] for r in results], axis=0)
+
+    lcoe_df = pd.DataFrame()
+    for j, name in enumerate(names):
+        for k, q in enumerate(percentiles):
+            lcoe_df[f'{name} p{q}'] = tech_percentiles[k, :, j]
+    for k, q in enumerate(percentiles):
+        lcoe_df[f'lcoe p{q}'] = least_cost_percentiles[k]
+
+    probability_df = pd.DataFrame(counts / n_samples, columns=names)
+    most_likely = counts.argmax(axis=1)
+    probability_df['least_cost_tech'] = np.where(chosen > 0,
+                                                 np.array(names, dtype=object)[most_likely],
+                                                 np.nan)
+    probability_df['probability'] = counts.max(axis=1) / n_samples
+
+    return lcoe_df, probability_df
@@ -6,6 +6,10 @@ import math
 #Related third party imports
 import pyeto
 
+#Local application/library specific imports
+from nexus_tool.cube import Cube, months
+from nexus_tool.profiling import profile
+
 math.exp = np.exp
 math.pow = np.power
 math.sqrt = np.sqrt
@@ -94,6 +98,7 @@ def get_evap_i(lat,elev,wind,srad,tmin,tmax,tavg,month):
                                        atmosphericVapourPressure,
                                        slopeSvp, psyConstant, shf=0.0)
 
+@profile
 def get_eto(df, eto = eto, lat = lat, elevation = elevation, 
         wind = wind, srad = srad, tmin = tmin, tmax = tmax,
         tavg = tavg):
@@ -101,7 +106,7 @@ def get_eto(df, eto = eto, lat = lat, elevation = elevation,
     calculate ETo for each row for each month 
     '''
     for i in range(1,13):
-        df['{}{}'.format(eto, i)]=0
+        df['{}{}'.format(eto, i)]=0.0
         df['{}{}'.format(eto, i)] = get_evap_i(df[lat],
                                                df[elevation],
                                                df['{}{}'.format(wind, i)],
@@ -115,9 +120,10 @@ def get_eto(df, eto = eto, lat = lat, elevation = elevation,
 def get_eff_rainfall_i(prec,eto):
     return (1.253*((prec**0.824)-2.935))*10**(0.001*eto)
     
+@profile
 def get_effective_rainfall(df, eff = eff, prec = prec, eto = eto):
     for i in range(1,13):
-        df['{}{}'.format(eff, i)]=0
+        df['{}{}'.format(eff, i)]=0.0
         df.loc[df['{}{}'.format(prec, i)] < 12.5, '{}{}'.format(eff, i)] = df['{}{}'.format(prec, i)]/30
         df.loc[df['{}{}'.format(prec, i)] >= 12.5, '{}{}'.format(eff, i)] = get_eff_rainfall_i(df['{}{}'.format(prec, i)],df['{}{}'.format(eto, i)])/30 
     return df
@@ -130,6 +136,7 @@ def get_season_days(crop_calendar, season, start = start, end = end):
     crop_calendar["_".join([season, 'days'])] = ((season_end - season_start).dt.days+1) % 365
     return crop_calendar
 
+@profile
 def get_calendar_days(crop_calendar, seasons, start = start, end = end):
     for season in seasons:
         crop_calendar = get_season_days(crop_calendar, season, start = start, end = end)
@@ -211,10 +218,11 @@ def get_kc_i(plantation,Li,Ld,Lm,Le,kci,kcd,kcm,kce,isodate):
     
     return ckc
 
+@profile
 def get_kc_values(crop_calendar, seasons, kc_dict, crop_column = crop_column, 
                   start = start, end = end, kc = kc):
     for i in range(1,13):
-        crop_calendar['{}{}'.format(kc, i)]=0
+        crop_calendar['{}{}'.format(kc, i)]=0.0
         
     for index,row in crop_calendar.iterrows():
         crop = row[crop_column]
@@ -273,15 +281,16 @@ def get_harvest_fraction(i, crop_calendar, crop, init, late,
     else:
         return 0
         
+@profile
 def get_water_demand(df, crop_calendar, ky_dict, crop_column, aeff, deff, 
                      init_season, late_season, pumping_hours_per_day, 
                      crop_area = crop_area, _eto = eto, _kc = kc, _eff = eff, 
                      _acwr = acwr, _pcwr = pcwr, _pwd = pwd, _sswd = sswd, 
                      start = start, end = end, crop_share = crop_share):
     for i in range (1,13):
-        df['{}{}'.format(_pcwr,i)]=0 #PCWR: Peak Crop Water Requirement (l/s/ha) or "Duty", Previously PDWR
-        df['{}{}'.format(_pwd,i)]=0  #PWD: Peak Water Demand in (l/s)
-        df['{}{}'.format(_sswd,i)]=0 #SSWD: Seasonal Scheme Water Demand in (m3)
+        df['{}{}'.format(_pcwr,i)]=0.0 #PCWR: Peak Crop Water Requirement (l/s/ha) or "Duty", Previously PDWR
+        df['{}{}'.format(_pwd,i)]=0.0  #PWD: Peak Water Demand in (l/s)
+        df['{}{}'.format(_sswd,i)]=0.0 #SSWD: Seasonal Scheme Water Demand in (m3)
         
     #STEP 1: Compute the ACWR from ETc - check FAO1992- page 43-
 
@@ -297,7 +306,7 @@ def get_water_demand(df, crop_calendar, ky_dict, crop_column, aeff, deff,
             pcwr = f'{_pcwr}{i}'
             pwd = f'{_pwd}{i}'
             sswd = f'{_sswd}{i}'
-            df[kc+'_'+crop] = float(crop_calendar.loc[crop_calendar[crop_column]==crop,kc])
+            df[kc+'_'+crop] = float(crop_calendar.loc[crop_calendar[crop_column]==crop,kc].iloc[0])
             ky=ky_dict[crop] #Yield response factor coeff = 0.8 for date palms, source TABLE 53-FAO: http://www.fao.org/3/y4360e/y4360e0b.htm 
             df[acwr] = (df[eto]*30*df[kc+'_'+crop]*ky - df[eff]*30 - (0.12*df[eff])*30) #Assumption: awc=12% effective rainfall
             df.loc[df[acwr]<0,acwr] = 0
@@ -310,4 +319,51 @@ def get_water_demand(df, crop_calendar, ky_dict, crop_column, aeff, deff,
                                          start_name = start, end_name = end)
             df[pwd] += (df[pcwr] *(df[f'harvest_{i}_'+crop]*24))/(pumping_hours_per_day*aeff*deff)
             df[sswd] += (df[acwr]*10*(df[f'harvest_{i}_'+crop])/(aeff*deff))
-           
\ No newline at end of file
+           
+
+@profile
+def get_water_demand_cube(df, crop_calendar, ky_dict, crop_column, aeff, deff, 
+                          init_season, late_season, pumping_hours_per_day, 
+                          crop_area = crop_area, _eto = eto, _kc = kc, 
+                          _eff = eff, start = start, end = end, 
+                          crop_share = crop_share):
+    '''
+    same computation as get_water_demand, on (point x month x crop) arrays 
+    instead of one column per month and crop. Returns a dictionary of Cubes: 
+    kc, acwr and harvest (point x month x crop), and pcwr, pwd and sswd 
+    (point x month)
+    '''
+    crops = list(crop_calendar[crop_column])
+    n_points = df.shape[0]
+    coords = {'point': df.index, 'month': months, 'crop': crops}
+    _eto = Cube.from_wide(df, _eto).values[:, :, np.newaxis]
+    _eff = Cube.from_wide(df, _eff).values[:, :, np.newaxis]
+    kc_values = np.array([[float(crop_calendar.loc[crop_calendar[crop_column]==crop,
+                                                   f'{_kc}{i}'].iloc[0])
+                           for crop in crops] for i in months])
+    ky = np.array([ky_dict[crop] for crop in crops])
+    fraction = np.array([[get_harvest_fraction(i, crop_calendar, crop, 
+                                               init_season, late_season, 
+                                               crop_column, start_name = start,
+                                               end_name = end)
+                          for crop in crops] for i in months])
+    shares = np.array([[x[crop] for crop in crops] for x in df[crop_share]], 
+                      dtype=float).reshape(n_points, len(crops))
+    
+    acwr = _eto*30*kc_values*ky - _eff*30 - (0.12*_eff)*30 #Assumption: awc=12% effective rainfall
+    acwr = np.where(acwr < 0, 0, acwr)
+    harvest = df[crop_area].values[:, np.newaxis, np.newaxis] * \
+              shares[:, np.newaxis, :] * fraction
+    # get_water_demand accumulates the peak requirement crop after crop, and 
+    # every crop uses the accumulated value for its peak demand
+    pcwr = np.cumsum(((acwr*10)/30)*2*0.012, axis=2)
+    pwd = ((pcwr * (harvest*24))/(pumping_hours_per_day*aeff*deff)).sum(axis=2)
+    sswd = (acwr*10*harvest/(aeff*deff)).sum(axis=2)
+    
+    point_month = {'point': df.index, 'month': months}
+    return {'kc': Cube(np.broadcast_to(kc_values, acwr.shape), coords),
+            'acwr': Cube(acwr, coords),
+            'harvest': Cube(harvest, coords),
+            'pcwr': Cube(pcwr[:, :, -1], point_month),
+            'pwd': Cube(pwd, point_month),
+            'sswd': Cube(sswd, point_month)}
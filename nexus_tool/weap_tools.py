@@ -1,15 +1,27 @@
 #Standard library imports
 import os
 import glob
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 import geopandas as gpd
 import numpy as np
 import fiona
 import shapely
+from shapely.strtree import STRtree
 import rasterio
 import rasterio.mask
 from rasterio.merge import merge
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 from rasterio.fill import fillnodata
+from rasterio.windows import Window, from_bounds
+from rasterio.windows import bounds as window_bounds
+from rasterio.windows import transform as window_transform
+from rasterio.transform import from_origin
+from rasterio.vrt import WarpedVRT
+import rasterio.shutil
+import rasterio.coords
 fiona.drvsupport.supported_drivers['kml'] = 'rw' # enable KML support
 fiona.drvsupport.supported_drivers['KML'] = 'rw' # enable KML support
 
@@ -39,7 +51,13 @@ def mask_raster(raster_path, mask_path, crs):
                      "crs": crs})
     return out_image, out_meta
     
-def reproject_raster(raster_path, dst_crs, outpul_file):
+def get_resampling(resampling):
+    if isinstance(resampling, str):
+        return Resampling[resampling]
+    return resampling
+
+def reproject_raster(raster_path, dst_crs, outpul_file, resampling = 'nearest',
+                     num_threads = 1, warp_mem_limit = 0):
     with rasterio.open(raster_path) as src:
         transform, width, height = calculate_default_transform(
             src.crs, dst_crs, src.width, src.height, *src.bounds)
@@ -60,25 +78,212 @@ def reproject_raster(raster_path, dst_crs, outpul_file):
                     src_crs=src.crs,
                     dst_transform=transform,
                     dst_crs=dst_crs,
-                    resampling=Resampling.nearest)
+                    resampling=get_resampling(resampling),
+                    num_threads=num_threads,
+                    warp_mem_limit=warp_mem_limit)
+                    
+def write_windows(dst, windows, read, n_workers):
+    '''
+    writes read(window) to every window of dst. With n_workers > 1 the 
+    windows are read by a pool of threads, at most n_workers at a time 
+    besides the one being written, and written in order by the calling thread
+    '''
+    if n_workers > 1:
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            pending = deque()
+            for window in windows:
+                if len(pending) >= n_workers:
+                    done_window, future = pending.popleft()
+                    dst.write(future.result(), window=done_window)
+                pending.append((window, pool.submit(read, window)))
+            while pending:
+                done_window, future = pending.popleft()
+                dst.write(future.result(), window=done_window)
+    else:
+        for window in windows:
+            dst.write(read(window), window=window)
+                    
+def reproject_raster_windowed(raster_path, dst_crs, output_file, 
+                              resampling = 'nearest', res = None, 
+                              nodata = None, n_workers = 1, 
+                              warp_mem_limit = 256, 
+                              memory_limit = 512 * 1024 ** 2, 
+                              block_size = 512, compress = 'deflate', 
+                              cog = False):
+    '''
+    reprojects a raster window by window: every output window is warped 
+    from the source through a WarpedVRT and written to a tiled, compressed 
+    GeoTIFF (or Cloud Optimized GeoTIFF with cog = True), so the raster is 
+    never held in memory.
+    
+    resampling = name (e.g. 'bilinear', 'average', 'mode') or Resampling
+    res = output resolution in dst_crs units (computed by default)
+    nodata = output nodata (the one of the source by default)
+    n_workers = threads warping windows concurrently, each with its own 
+                source handle
+    warp_mem_limit = GDAL warp memory limit of every worker in MB
+    memory_limit = approximate memory used by the windows in bytes
+    block_size = output tile size (multiple of 16)
+    '''
+    with rasterio.open(raster_path) as src:
+        transform, width, height = calculate_default_transform(
+            src.crs, dst_crs, src.width, src.height, *src.bounds, 
+            resolution=res)
+        count = src.count
+        dtype = src.dtypes[0]
+        nodata = src.nodata if nodata is None else nodata
+    vrt_options = {'crs': dst_crs, 'transform': transform, 'width': width,
+                   'height': height, 'resampling': get_resampling(resampling),
+                   'warp_mem_limit': warp_mem_limit}
+    if nodata is not None:
+        vrt_options['nodata'] = nodata
+    profile = {'driver': 'GTiff', 'width': width, 'height': height, 
+               'count': count, 'dtype': dtype, 'nodata': nodata, 
+               'crs': dst_crs, 'transform': transform, 'tiled': True, 
+               'blockxsize': block_size, 'blockysize': block_size, 
+               'compress': compress, 'BIGTIFF': 'IF_SAFER'}
+    windows = get_block_windows(width, height, count, dtype, memory_limit, 
+                                n_workers, block_size)
+    tiff_file = f'{output_file}.tmp.tif' if cog else output_file
+    
+    # rasterio datasets must not be shared between threads, so every worker 
+    # opens its own source and warped VRT. They are closed with close() and 
+    # not as context managers, whose exit would leave the GDAL environment 
+    # of the worker thread from the calling thread
+    local = threading.local()
+    datasets = []
+    lock = threading.Lock()
+    
+    def read(window):
+        if not hasattr(local, 'vrt'):
+            src = rasterio.open(raster_path)
+            local.vrt = WarpedVRT(src, **vrt_options)
+            with lock:
+                datasets.extend([local.vrt, src])
+        return local.vrt.read(window=window)
+    
+    try:
+        with rasterio.open(tiff_file, 'w', **profile) as dst:
+            write_windows(dst, windows, read, n_workers)
+    finally:
+        for dataset in datasets:
+            dataset.close()
+            
+    if cog:
+        # the COG driver adds the overviews and reorders the tiles
+        rasterio.shutil.copy(tiff_file, output_file, driver='COG', 
+                             COMPRESS=compress.upper(), BLOCKSIZE=block_size,
+                             RESAMPLING=get_resampling(resampling).name.upper(),
+                             BIGTIFF='IF_SAFER')
+        os.remove(tiff_file)
+    return output_file
                     
 def sample_raster(path, gdf):
-    with rasterio.open(path) as src:
-        return [float(val) for val in src.sample([(x.coords.xy[0][0], 
-                                                   x.coords.xy[1][0]) for x in 
-                                                   gdf['geometry']])]
+    values = sample_rasters(path, gdf, bands = [1], nodata = None)
+    return [float(val) for val in values[:, 0]]
+
+def get_pixel_indices(transform, x, y):
+    '''
+    row and column of the pixels containing the x, y coordinates, computed 
+    for all the points at once with the inverse of the affine transform
+    '''
+    inverse = ~transform
+    cols = inverse.a * x + inverse.b * y + inverse.c
+    rows = inverse.d * x + inverse.e * y + inverse.f
+    return np.floor(rows).astype(np.int64), np.floor(cols).astype(np.int64)
+
+def get_coordinates(points, crs = None):
+    '''
+    x and y arrays of a GeoDataFrame (projected to crs if both have a CRS) 
+    or of a (x, y) tuple of arrays. Geometries that are not points (e.g. 
+    links) are located by their first coordinate
+    '''
+    if isinstance(points, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        geometry = points.geometry
+        if (crs is not None) and (geometry.crs is not None) and \
+           (geometry.crs != crs):
+            geometry = geometry.to_crs(crs)
+        coords, index = shapely.get_coordinates(np.asarray(geometry.values), 
+                                                return_index=True)
+        geometries, first = np.unique(index, return_index=True)
+        if geometries.shape[0] != geometry.shape[0]:
+            raise ValueError('Empty or missing geometries can not be located')
+        return coords[first, 0], coords[first, 1]
+    x, y = points
+    return np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+
+def sample_band_blocks(src, bands, rows, cols, values, window_size = 512):
+    '''
+    fills values (points x bands) with the pixels at rows and cols of the 
+    bands of src, reading only the blocks (grouped in windows of at least 
+    window_size pixels per side) that contain points
+    '''
+    block_height, block_width = src.block_shapes[0]
+    window_height = block_height * int(np.ceil(window_size / block_height))
+    window_width = block_width * int(np.ceil(window_size / block_width))
+    inside = np.flatnonzero((rows >= 0) & (rows < src.height) & 
+                            (cols >= 0) & (cols < src.width))
+    n_window_cols = int(np.ceil(src.width / window_width))
+    window_ids = (rows[inside] // window_height) * n_window_cols + \
+                 cols[inside] // window_width
+    order = np.argsort(window_ids, kind='stable')
+    inside = inside[order]
+    window_ids = window_ids[order]
+    ids, starts = np.unique(window_ids, return_index=True)
+    for window_id, index in zip(ids, np.split(inside, starts[1:])):
+        row_off = int(window_id // n_window_cols) * window_height
+        col_off = int(window_id % n_window_cols) * window_width
+        window = Window(col_off, row_off, 
+                        min(window_width, src.width - col_off),
+                        min(window_height, src.height - row_off))
+        data = src.read(bands, window=window)
+        values[index] = data[:, rows[index] - row_off, 
+                             cols[index] - col_off].T
+    
+def sample_rasters(paths, points, bands = None, nodata = np.nan, 
+                   window_size = 512):
+    '''
+    samples one or more rasters at points (GeoDataFrame of points, 
+    reprojected to the CRS of every raster, or (x, y) arrays in the raster 
+    CRS). The pixel of every point is found with the affine transform for 
+    all the points at once, and only the raster blocks containing points are 
+    read.
+    
+    paths = raster path or list of raster paths
+    bands = list of bands read from every raster (all by default)
+    nodata = value of the points outside the rasters or on nodata pixels; 
+             None keeps the raster nodata value (0 if it has none), as 
+             rasterio sample does
+    
+    Returns a float array of points x (bands of the first raster, bands of 
+    the second raster ...)
+    '''
+    paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+    columns = []
+    for path in paths:
+        with rasterio.open(path) as src:
+            _bands = list(range(1, src.count + 1)) if bands is None else list(bands)
+            x, y = get_coordinates(points, src.crs)
+            rows, cols = get_pixel_indices(src.transform, x, y)
+            fill = (0 if src.nodata is None else src.nodata) if nodata is None \
+                   else nodata
+            values = np.full((x.shape[0], len(_bands)), fill, dtype=float)
+            sample_band_blocks(src, _bands, rows, cols, values, 
+                               window_size = window_size)
+            if (nodata is not None) and (src.nodata is not None):
+                values[values == src.nodata] = nodata
+            columns.append(values)
+    return np.concatenate(columns, axis=1)
                                                    
 def merge_rasters(files_path, dst_crs, outpul_file):
     files = glob.glob(files_path)
-    src_files_to_mosaic = []
     
-    for fp in files:
-        src = rasterio.open(fp)
-        src_files_to_mosaic.append(src)
-    
-    mosaic, out_trans = merge(src_files_to_mosaic)
+    with ExitStack() as stack:
+        src_files_to_mosaic = [stack.enter_context(rasterio.open(fp)) 
+                               for fp in files]
+        mosaic, out_trans = merge(src_files_to_mosaic)
+        out_meta = src_files_to_mosaic[-1].meta.copy()
 
-    out_meta = src.meta.copy()
     out_meta.update({"driver": "GTiff",
                  "height": mosaic.shape[1],
                  "width": mosaic.shape[2],
@@ -89,4 +294,220 @@ def merge_rasters(files_path, dst_crs, outpul_file):
     
     with rasterio.open(outpul_file, "w", **out_meta) as dest:
         dest.write(mosaic)
-    
\ No newline at end of file
+        
+class RasterHandles():
+    '''
+    open rasters, at most max_open at the same time (the least recently 
+    used one is closed when another one has to be opened)
+    '''
+    def __init__(self, max_open):
+        self.max_open = max(max_open, 1)
+        self.handles = OrderedDict()
+        
+    def get(self, path):
+        if path in self.handles:
+            self.handles.move_to_end(path)
+        else:
+            if len(self.handles) >= self.max_open:
+                _, src = self.handles.popitem(last=False)
+                src.close()
+            self.handles[path] = rasterio.open(path)
+        return self.handles[path]
+        
+    def close(self):
+        for src in self.handles.values():
+            src.close()
+        self.handles.clear()
+        
+def get_mosaic_sources(files):
+    '''
+    bounds, resolution, CRS, bands, data type and nodata of every raster, 
+    opening them one at a time. The rasters must have the same CRS, number 
+    of bands and data type
+    '''
+    sources = []
+    for path in files:
+        with rasterio.open(path) as src:
+            sources.append({'path': path, 'bounds': src.bounds, 
+                            'res': src.res, 'crs': src.crs, 'count': src.count,
+                            'dtype': src.dtypes[0], 'nodata': src.nodata})
+    for source in sources[1:]:
+        if source['crs'] != sources[0]['crs']:
+            raise ValueError('All the rasters must have the same CRS, reproject '
+                             'them first (see reproject_raster)')
+        for key, name in [('count', 'number of bands'), ('dtype', 'data type')]:
+            if source[key] != sources[0][key]:
+                raise ValueError(f"All the rasters must have the same {name}: "
+                                 f"{source['path']} has {source[key]} and "
+                                 f"{sources[0]['path']} {sources[0][key]}")
+    return sources
+    
+def get_mosaic_grid(sources, res = None):
+    '''
+    transform, width and height of the grid covering all the sources, with 
+    the resolution of the first one by default
+    '''
+    left = min(source['bounds'].left for source in sources)
+    bottom = min(source['bounds'].bottom for source in sources)
+    right = max(source['bounds'].right for source in sources)
+    top = max(source['bounds'].top for source in sources)
+    xres, yres = sources[0]['res'] if res is None else res
+    width = max(int(round((right - left) / xres)), 1)
+    height = max(int(round((top - bottom) / yres)), 1)
+    return from_origin(left, top, xres, yres), width, height
+    
+def get_block_windows(width, height, count, dtype, memory_limit, n_workers, 
+                      block_size):
+    '''
+    output windows, aligned with the output blocks, small enough for every 
+    worker to hold about two copies of a window (e.g. the mosaic window and 
+    one source read) within memory_limit bytes
+    '''
+    pixel_bytes = count * (2 * np.dtype(dtype).itemsize + 3)
+    budget = memory_limit / (max(n_workers, 1) + 1)
+    side = int(np.sqrt(budget / pixel_bytes)) // block_size * block_size
+    side = max(side, block_size)
+    return [Window(col_off, row_off, min(side, width - col_off), 
+                   min(side, height - row_off))
+            for row_off in range(0, height, side) 
+            for col_off in range(0, width, side)]
+            
+def fill_mosaic_window(sources, window, transform, count, dtype, nodata, 
+                       method, handles):
+    '''
+    values of a window of the mosaic read from the overlapping sources. With 
+    method = 'first' the first source with data in a pixel is used, with 
+    'last' the last one
+    '''
+    left, bottom, right, top = window_bounds(window, transform)
+    _transform = window_transform(window, transform)
+    data = np.full((count, int(window.height), int(window.width)), 
+                   0 if nodata is None else nodata, dtype=dtype)
+    filled = np.zeros(data.shape, dtype=bool)
+    for source in sources:
+        _left = max(left, source['bounds'].left)
+        _bottom = max(bottom, source['bounds'].bottom)
+        _right = min(right, source['bounds'].right)
+        _top = min(top, source['bounds'].top)
+        if (_left >= _right) or (_bottom >= _top):
+            continue
+        dst_window = from_bounds(_left, _bottom, _right, _top, _transform)
+        row_off = max(int(round(dst_window.row_off)), 0)
+        col_off = max(int(round(dst_window.col_off)), 0)
+        rows = min(int(round(dst_window.height)), data.shape[1] - row_off)
+        cols = min(int(round(dst_window.width)), data.shape[2] - col_off)
+        if (rows <= 0) or (cols <= 0):
+            continue
+        src = handles.get(source['path'])
+        values = src.read(window=from_bounds(_left, _bottom, _right, _top, 
+                                             src.transform),
+                          out_shape=(count, rows, cols), masked=True,
+                          resampling=Resampling.nearest)
+        valid = ~np.ma.getmaskarray(values)
+        done = filled[:, row_off:row_off + rows, col_off:col_off + cols]
+        update = (valid & ~done) if method == 'first' else valid
+        data[:, row_off:row_off + rows, col_off:col_off + cols][update] = \
+                                                        values.data[update]
+        done |= valid
+        if (method == 'first') and filled.all():
+            break
+    return data
+    
+def merge_rasters_windowed(files_path, output_file, res = None, nodata = None, 
+                           method = 'first', memory_limit = 512 * 1024 ** 2, 
+                           max_open_files = 64, n_workers = 1, 
+                           block_size = 512, compress = 'deflate'):
+    '''
+    mosaic of rasters (glob pattern or list of paths, with the same CRS, 
+    bands and data type) written block by block to a tiled and compressed 
+    GeoTIFF, so the mosaic is never held in memory. The output grid covers 
+    all the sources, and every window is filled from the sources overlapping 
+    it. The output has the CRS of the sources, reproject them first to 
+    mosaic them in another CRS (see reproject_raster_windowed).
+    
+    res = output resolution (the one of the first source by default)
+    nodata = output nodata (the one of the first source by default)
+    method = 'first' or 'last', source used where they overlap
+    memory_limit = approximate memory used by the windows in bytes
+    max_open_files = open sources at the same time, per worker
+    n_workers = threads filling windows concurrently (the reads release the 
+                GIL), the windows are written in order by the calling thread
+    block_size = output tile size (multiple of 16)
+    '''
+    files = sorted(glob.glob(files_path)) if isinstance(files_path, str) \
+            else list(files_path)
+    if not files:
+        raise ValueError(f'No rasters found in {files_path}')
+    sources = get_mosaic_sources(files)
+    count = sources[0]['count']
+    dtype = sources[0]['dtype']
+    nodata = sources[0]['nodata'] if nodata is None else nodata
+    transform, width, height = get_mosaic_grid(sources, res)
+    windows = get_block_windows(width, height, count, dtype, memory_limit, 
+                                n_workers, block_size)
+    
+    profile = {'driver': 'GTiff', 'width': width, 'height': height, 
+               'count': count, 'dtype': dtype, 'nodata': nodata,
+               'crs': sources[0]['crs'], 
+               'transform': transform, 'tiled': True, 
+               'blockxsize': block_size, 'blockysize': block_size, 
+               'compress': compress, 'BIGTIFF': 'IF_SAFER'}
+    # rasterio datasets must not be shared between threads, so every worker 
+    # keeps its own open sources
+    local = threading.local()
+    all_handles = []
+    lock = threading.Lock()
+    
+    def fill(window):
+        if not hasattr(local, 'handles'):
+            local.handles = RasterHandles(max_open_files)
+            with lock:
+                all_handles.append(local.handles)
+        window_sources = [source for source in sources if not 
+                          rasterio.coords.disjoint_bounds(
+                                source['bounds'], 
+                                window_bounds(window, transform))]
+        return fill_mosaic_window(window_sources, window, transform, count, 
+                                  dtype, nodata, method, local.handles)
+    
+    try:
+        with rasterio.open(output_file, 'w', **profile) as dst:
+            write_windows(dst, windows, fill, n_workers)
+    finally:
+        for handles in all_handles:
+            handles.close()
+    return output_file
+    
+def get_distance_to_lines(points, lines, crs = None):
+    '''
+    distance (m) from every point to the nearest line (e.g. transmission 
+    lines), computed in bulk with a STRtree spatial index of the lines. points 
+    and lines are GeoDataFrames (lines can also be a path to any vector file), 
+    and both are projected to crs, a metric projected CRS, or to the UTM zone 
+    of the points if not given. Points without any line get nan
+    '''
+    if type(lines) == str:
+        lines = gpd.read_file(lines)
+    if (points.crs is None) or (lines.crs is None):
+        raise ValueError('The points and the lines must have a CRS')
+    if crs is None:
+        crs = points.estimate_utm_crs()
+    points = points.to_crs(crs)
+    lines = lines.to_crs(crs)
+    if points.crs.is_geographic or \
+       (points.crs.axis_info[0].unit_name not in ['metre', 'meter']):
+        raise ValueError(f'The distances must be computed in a projected CRS '
+                         f'in metres (e.g. a UTM zone), got {points.crs.name}')
+    
+    line_geometries = lines.geometry.values
+    line_geometries = np.array(line_geometries[~(line_geometries.is_empty | 
+                                                 line_geometries.isna())])
+    distance = np.full(points.shape[0], np.nan)
+    if line_geometries.shape[0] == 0:
+        return distance
+    tree = STRtree(line_geometries)
+    (point_index, _), nearest_distance = tree.query_nearest(
+                                        np.array(points.geometry.values),
+                                        return_distance=True, all_matches=False)
+    distance[point_index] = nearest_distance
+    return distance
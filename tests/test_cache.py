@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from nexus_tool.cache import StageCache
+from nexus_tool.profiling import record_profile, get_profile
+from test_pipeline import get_gw_model
+
+def test_stages_are_loaded_from_the_cache(tmp_path):
+    expected = get_gw_model()
+    expected.run('get_total_pumping_energy')
+    with record_profile():
+        for i in range(2):
+            model = get_gw_model()
+            model.set_cache(str(tmp_path))
+            model.run('get_total_pumping_energy')
+            pd.testing.assert_frame_equal(model.df, expected.df, check_like=True)
+    # the second model only reads the cache
+    names = list(get_profile()['name'])
+    assert names.count('get_GWpumping_energy') == 1
+    # other data is a different entry
+    model = get_gw_model()
+    model.df['gw_depth'] *= 2
+    model.set_cache(str(tmp_path))
+    model.run('get_total_pumping_energy')
+    assert (model.df['ED_E_1'] > expected.df['ED_E_1']).all()
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = StageCache(str(tmp_path))
+    df = pd.DataFrame({'a': np.arange(1000.)})
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, df)
+        os.utime(cache.get_path(key), (i, i))
+    cache.get('a')
+    cache.max_size = 3.5 * os.path.getsize(cache.get_path('a'))
+    cache.put('d', df)
+    assert cache.get('b') is None
+    for key in ['a', 'c', 'd']:
+        pd.testing.assert_frame_equal(cache.get(key), df)
+
+def test_cube_backend_is_not_restored_without_cubes(tmp_path):
+    pytest.importorskip('pyeto')
+    from benchmarks.equivalence import get_synthetic_fixture
+
+    fixture = get_synthetic_fixture(n_points = 20, n_crops = 2)
+    expected = fixture.get_model(backend = 'cube')
+    expected.run('get_water_demand')
+    for i in range(2):
+        model = fixture.get_model(backend = 'cube')
+        model.set_cache(str(tmp_path))
+        model.run('get_water_demand')
+        for name in ['kc', 'acwr', 'harvest']:
+            np.testing.assert_array_equal(model.cubes[name].values,
+                                          expected.cubes[name].values)
+        pd.testing.assert_frame_equal(model.df, expected.df, check_like=True)
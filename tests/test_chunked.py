@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nexus_tool import Model
+
+def get_points(n_points = 7):
+    df = pd.DataFrame({'gw_depth': np.linspace(10, 100, n_points),
+                       'crop_area': np.arange(1., n_points + 1),
+                       'country': ['a', 'b'] * (n_points // 2) + ['a'] * (n_points % 2)})
+    for i in range(1,13):
+        df[f'PWD_{i}'] = np.linspace(1, 3, n_points)
+        df[f'SSWD_{i}'] = np.linspace(100, 300, n_points)
+    return df
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+def test_chunks_match_whole_run(tmp_path, extension):
+    if extension == 'parquet':
+        pytest.importorskip('pyarrow')
+    df = get_points()
+    source = str(tmp_path / f'points.{extension}')
+    output = str(tmp_path / f'results.{extension}')
+    if extension == 'csv':
+        df.to_csv(source, index=False)
+    else:
+        df.to_parquet(source, index=False)
+
+    model = Model(df.copy(), pump_eff = 0.6, trans_eff = 0.9)
+    model.run('get_annual_electricity')
+    summary, technologies = Model(None, pump_eff = 0.6, trans_eff = 0.9).run_chunked(
+                                source, output, target='get_annual_electricity',
+                                chunk_size=3, geo_boundary='country')
+    results = pd.read_csv(output) if extension == 'csv' else pd.read_parquet(output)
+    pd.testing.assert_frame_equal(results, model.df, check_dtype=False)
+
+    water = df.filter(like='SSWD_').sum(axis=1).groupby(df['country']).sum()
+    np.testing.assert_allclose(summary['Irrigated area (ha)'], [16, 12])
+    np.testing.assert_allclose(summary['Water demand (Mm3)'], water / 1e6)
+    np.testing.assert_allclose(summary['Energy demand (GWh)'],
+                               model.df.groupby('country')['annual_el_demand'].sum() / 1e6)
+    assert technologies is None
+
+def add_technologies(model):
+    model.start_year = 2020
+    model.end_year = 2030
+    model.create_standard_tech('Grid pump', life=10, om_cost=0.1,
+                               capital_cost=845, efficiency=0.55, cf=0.8,
+                               fuel_cost=0.1, fuel_req=1, emission_factor=0,
+                               env_cost=0)
+    model.create_standard_tech('Diesel set', life=10, om_cost=0.1,
+                               capital_cost=938, efficiency=0.27, cf=0.5,
+                               fuel_cost=np.linspace(0.5, 1, model.df.shape[0]),
+                               fuel_req=0.095, emission_factor=2.7, env_cost=0)
+    model.set_grid_extension('Grid pump', cost_per_km=10000)
+    return model
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+def test_chunks_with_values_per_point(tmp_path, extension):
+    if extension == 'parquet':
+        pytest.importorskip('pyarrow')
+    df = get_points()
+    # the grid is only cheaper for the points close to it
+    df['grid_distance'] = np.linspace(0, 2000, df.shape[0])
+    source = str(tmp_path / f'points.{extension}')
+    output = str(tmp_path / 'results.csv')
+    if extension == 'csv':
+        df.to_csv(source, index=False)
+    else:
+        df.to_parquet(source, index=False)
+
+    model = add_technologies(Model(df.copy(), pump_eff = 0.6, trans_eff = 0.9))
+    model.run('get_least_cost')
+    parent = add_technologies(Model(df.copy(), pump_eff = 0.6, trans_eff = 0.9))
+    parent.run_chunked(source, output, target='get_least_cost', chunk_size=3)
+    results = pd.read_csv(output)
+    assert results['least_cost_tech'].nunique() == 2
+    assert list(results['least_cost_tech']) == list(model.df['least_cost_tech'])
+    np.testing.assert_allclose(results['lcoe'], model.df['lcoe'])
+    # the blocks do not change the model they are copied from
+    assert parent.stage_state == {} and parent.cubes == {}
+    assert parent.technologies['Grid pump'].extension_cost.shape == (7,)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nexus_tool.cube import Cube
+
+def get_wide():
+    df = pd.DataFrame(index=[10, 20])
+    for i in range(1,13):
+        for j, crop in enumerate(['dates', 'olives']):
+            df[f'ACWR_{i}_{crop}'] = [i + j / 10, -i - j / 10]
+    return df
+
+def test_wide_round_trip():
+    df = get_wide()
+    cube = Cube.from_wide(df, 'ACWR_', crops=['dates', 'olives'])
+    assert cube.shape == (2, 12, 2)
+    pd.testing.assert_frame_equal(cube.to_wide('ACWR_'), df)
+
+def test_selection():
+    cube = Cube.from_wide(get_wide(), 'ACWR_', crops=['dates', 'olives'])
+    np.testing.assert_allclose(cube.sel(month=3, crop='olives').values, [3.1, -3.1])
+    np.testing.assert_allclose(cube.sel(point=20, month=12).values, [-12, -12.1])
+    assert cube.sel(point=10, month=2, crop='olives') == 2.1
+    months = cube.sel(month=[12, 1], crop='dates')
+    assert months.dims == ['point', 'month']
+    np.testing.assert_allclose(months.values, [[12, 1], [-12, -1]])
+    total = cube.sum('crop')
+    pd.testing.assert_frame_equal(total.to_wide('ACWR_'),
+                                  pd.DataFrame({f'ACWR_{i}': [2 * i + 0.1,
+                                                              -2 * i - 0.1]
+                                                for i in range(1,13)},
+                                               index=[10, 20]))
+    with pytest.raises(KeyError):
+        cube.sel(crop=['dates', 'wheat'])
+    with pytest.raises(ValueError, match='shape'):
+        Cube(np.zeros((2, 3)), {'point': [1, 2], 'month': [1, 2]})
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from nexus_tool.datasets import write_dataset, read_dataset, load_data
+
+def get_results(value):
+    return pd.DataFrame({'Year': [2020, 2020, 2021], 'Month': [1, 2, 1],
+                         'value': [value, value + 1, value + 2]})
+
+def test_uneven_partitions(tmp_path):
+    path = str(tmp_path / 'results')
+    # the first case in folder order has no level and a year per folder, the
+    # second one has a level and no year column
+    write_dataset(get_results(0.), path, scenario = 'A')
+    write_dataset(get_results(10.).drop(columns='Year'), path,
+                  scenario = 'B', level = '01')
+    df = read_dataset(path)
+    assert sorted(df.columns) == ['Month', 'Year', 'level', 'scenario', 'value']
+    a = df[df['scenario'] == 'A'].sort_values('value')
+    assert list(a['Year']) == [2020, 2020, 2021]
+    assert a['level'].isna().all()
+    b = df[df['scenario'] == 'B']
+    # level is kept as a string, with its leading zero
+    assert list(b['level'].unique()) == ['01']
+    assert b['Year'].isna().all()
+
+def test_filters(tmp_path):
+    path = str(tmp_path / 'results')
+    write_dataset(get_results(0.), path, scenario = 'A', level = 1)
+    write_dataset(get_results(10.), path, scenario = 'B', level = 2)
+    df = read_dataset(path, columns = ['value'],
+                      filters = [('level', '=', '2'), ('Year', '>=', 2021)])
+    assert list(df['value']) == [12.]
+
+def test_rewriting_a_case_replaces_it(tmp_path):
+    path = str(tmp_path / 'results')
+    write_dataset(get_results(0.), path, scenario = 'A')
+    write_dataset(get_results(5.), path, scenario = 'A')
+    df = read_dataset(path)
+    assert sorted(df['value']) == [5., 6., 7.]
+    # the years missing in the new results are removed too
+    write_dataset(get_results(1.), path, scenario = 'B level', level = '1')
+    results = get_results(10.)
+    write_dataset(results[results['Year'] == 2020], path, scenario = 'A')
+    write_dataset(get_results(20.).iloc[:1], path, scenario = 'B level', level = '1')
+    df = read_dataset(path)
+    assert sorted(df['value']) == [10., 11., 20.]
+
+def test_load_data_keeps_dtypes(tmp_path):
+    path = str(tmp_path / 'points.csv')
+    pd.DataFrame({'gw_depth': [10.1, 20.2, 30.3], 'country': ['A'] * 3,
+                  'Year': [2020, 2021, 2022]}).to_csv(path, index=False)
+    df = load_data(path, columns = ['gw_depth', 'Year', 'missing'])
+    assert list(df.columns) == ['gw_depth', 'Year']
+    assert df['gw_depth'].dtype == 'float64'
+    assert list(df['gw_depth']) == [10.1, 20.2, 30.3]
+    df = load_data(path, compact = True)
+    assert df['gw_depth'].dtype == 'float32'
+    assert df['country'].dtype == 'category'
+
+def test_load_data_from_dataset(tmp_path):
+    path = str(tmp_path / 'results')
+    write_dataset(get_results(0.), path, scenario = 'A')
+    df = load_data(path, columns = ['value', 'scenario', 'missing'])
+    assert sorted(df.columns) == ['scenario', 'value']
+    assert sorted(df['value']) == [0., 1., 2.]
@@ -0,0 +1,12 @@
+import pytest
+
+pytest.importorskip('pyeto')
+pytest.importorskip('openpyxl')
+
+from benchmarks.equivalence import check
+
+@pytest.mark.parametrize('fixture', ['nwsas', 'weap'])
+def test_engines_match_the_baseline(fixture):
+    summary, details = check([fixture])
+    failed = details.loc[~details['passed']] if not details.empty else details
+    assert summary['passed'].all(), (summary, failed)
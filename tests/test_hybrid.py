@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from nexus_tool.hybrid import (get_hourly_load, get_hybrid_candidates,
+                               get_hybrid_sizing, days_in_month)
+from test_pipeline import get_gw_model
+
+costs = dict(discount_rate=0, pv_cost=1000, pv_om=0, pv_life=10,
+             battery_cost=100, battery_life=10, battery_eff=1, dod=1,
+             diesel_cost=1000, diesel_om=0, diesel_life=10, fuel_cost=1,
+             fuel_req=1, diesel_eff=0.5)
+
+def get_profiles(n_points):
+    # 1 kW of load in the afternoon and evening and pv in the morning only
+    load = np.zeros((n_points, 12, 24))
+    load[:, :, 12:] = 1
+    pv_cf = np.zeros((n_points, 12, 24))
+    pv_cf[:, :, :12] = 1
+    return pv_cf, load
+
+def test_battery_shifts_pv():
+    pv_cf, load = get_profiles(3)
+    candidates = get_hybrid_candidates([0, 1], [0, 12], [0, 1])
+    sizing = get_hybrid_sizing(pv_cf, load, candidates, chunk_size=2, **costs)
+    # 1 kW of pv charges the 12 kWh battery that serves the 12 kWh of the
+    # evening: (1000 / 10 + 12 * 100 / 10) / (12 * 365) $/kWh, against
+    # (1000 / 10 + 12 * 365 * 1 / 0.5) / (12 * 365) $/kWh with the diesel set
+    np.testing.assert_allclose(sizing['hybrid_pv_kw'], 1)
+    np.testing.assert_allclose(sizing['hybrid_battery_kwh'], 12)
+    np.testing.assert_allclose(sizing['hybrid_diesel_kw'], 0)
+    np.testing.assert_allclose(sizing['hybrid_lcoe'], 220 / 4380)
+    np.testing.assert_allclose(sizing['hybrid_pv_share'], 1)
+    np.testing.assert_allclose(sizing['hybrid_unmet_share'], 0)
+
+def test_diesel_and_infeasible_designs():
+    pv_cf, load = get_profiles(2)
+    candidates = get_hybrid_candidates([1], [0], [0, 1])
+    sizing = get_hybrid_sizing(pv_cf, load, candidates,
+                               **dict(costs, fuel_cost=[1, 2]))
+    # pv without battery does not serve the evening load
+    np.testing.assert_allclose(sizing['hybrid_diesel_kw'], 1)
+    np.testing.assert_allclose(sizing['hybrid_lcoe'],
+                               (200 + 4380 * np.array([1, 2]) / 0.5) / 4380)
+    np.testing.assert_allclose(sizing['hybrid_diesel_share'], 1)
+    # no design serves the load without the diesel set
+    candidates = get_hybrid_candidates([1], [0], [0])
+    sizing = get_hybrid_sizing(pv_cf, load, candidates, **costs)
+    assert sizing['hybrid_lcoe'].isna().all()
+
+def test_hourly_load():
+    # 12 kWh a day pumped in 12 hours centered at noon
+    df = pd.DataFrame({f'swpa_e{i}': [12. * days_in_month[i - 1]]
+                       for i in range(1,13)})
+    load = get_hourly_load(df, 'swpa_e', 12)
+    expected = np.zeros(24)
+    expected[6:18] = 1
+    np.testing.assert_allclose(load[0], np.tile(expected, (12, 1)))
+
+def test_model_sizing_of_ground_water_pumping():
+    model = get_gw_model()
+    for i in range(1,13):
+        model.df[f'srad{i}'] = 20000.
+    model.df['lat'] = 30.
+    model.create_pv_system('PV', life=15, om_cost=0.01, capital_cost=1140,
+                           efficiency=0.7)
+    model.create_standard_tech('Diesel', life=10, om_cost=0.1, capital_cost=938,
+                               efficiency=0.27, cf=0.5, fuel_cost=0.8,
+                               fuel_req=0.095, emission_factor=2.7, env_cost=0)
+    model.run('get_total_pumping_energy')
+    sizing = model.get_hybrid_sizing('PV', 'Diesel')
+    # without surface water the load is the ground water pumping energy
+    pd.testing.assert_frame_equal(sizing, model.get_hybrid_sizing('PV', 'Diesel',
+                                                                  energy='ED_E_'))
+    assert sizing['hybrid_lcoe'].notna().all()
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nexus_tool.least_cost import (get_lcoe, get_fuel_cost, get_least_cost,
+                                   get_least_cost_allocation, get_pareto_front,
+                                   get_carbon_price_sweep)
+
+def test_int_fuel_cost_is_paid_by_every_point():
+    # 100 $ of capital, 10 kWh/year in years 1 and 2 and 2 * 1 / 0.5 = 4 $/kWh
+    # of fuel: (100 + 2 * 10 * 4) / (2 * 10) = 9 $/kWh for every point. The
+    # baseline zeroed the fuel of the first point (fuel[0] = 0) when the fuel
+    # cost was an int, giving it 100 / 20 = 5 $/kWh
+    lcoe = get_lcoe(max_capacity=np.ones(3), total_demand=np.full(3, 10.),
+                    tech_life=3, om_cost=0, capital_cost=100, discount_rate=0,
+                    project_life=3, fuel_cost=2, fuel_req=1, efficiency=0.5,
+                    emission_factor=0, env_cost=0, start_year=0, end_year=3)
+    np.testing.assert_allclose(lcoe, [9, 9, 9])
+
+def test_fuel_cost_shapes():
+    el_gen = np.array([[0, 10, 10], [0, 20, 20]], dtype=float)
+    scalar = get_fuel_cost(2, el_gen, 0.5, 1)
+    np.testing.assert_allclose(scalar, [[0, 40, 40], [0, 80, 80]])
+    per_point = get_fuel_cost(np.array([2, 1]), el_gen, 0.5, 1)
+    np.testing.assert_allclose(per_point, [[0, 40, 40], [0, 40, 40]])
+    per_year = get_fuel_cost(np.array([[1, 2, 3]]), el_gen, 0.5, 1)
+    np.testing.assert_allclose(per_year, [[0, 40, 60], [0, 80, 120]])
+
+def get_allocation_inputs():
+    lcoe_df = pd.DataFrame({'A': [1., 1, 1, 1], 'B': [2., 3, 4, 5]})
+    capacity_df = pd.DataFrame({'A': [1., 1, 1, 1], 'B': [1., 1, 1, 1]})
+    return lcoe_df, np.full(4, 10.), capacity_df
+
+def test_allocation_global_cap():
+    lcoe_df, demand, capacity_df = get_allocation_inputs()
+    allocation = get_least_cost_allocation(lcoe_df, demand, capacity_df,
+                                           {'A': 3})
+    # the point where B is cheapest takes it
+    assert list(allocation['least_cost_technology']) == ['B', 'A', 'A', 'A']
+    np.testing.assert_allclose(allocation['lcoe'], [2, 1, 1, 1])
+
+def test_allocation_combined_caps():
+    lcoe_df, demand, capacity_df = get_allocation_inputs()
+    lcoe_df['B'] = [5., 4, 2, 3]
+    province = np.array(['p1', 'p1', 'p2', 'p2'])
+    province_caps = pd.DataFrame({'A': [1, np.nan]}, index=['p1', 'p2'])
+    country = np.array(['c'] * 4)
+    country_caps = pd.DataFrame({'A': [2]}, index=['c'])
+    allocation = get_least_cost_allocation(lcoe_df, demand, capacity_df,
+                                           province_caps, cap_boundary=province)
+    assert list(allocation['least_cost_technology']) == ['A', 'B', 'A', 'A']
+    allocation = get_least_cost_allocation(lcoe_df, demand, capacity_df,
+                                           country_caps, cap_boundary=country)
+    assert list(allocation['least_cost_technology']) == ['A', 'A', 'B', 'B']
+    # both caps: one point of p1 and the point where B is cheapest take B
+    allocation = get_least_cost_allocation(lcoe_df, demand, capacity_df,
+                                           [province_caps, country_caps],
+                                           cap_boundary=[province, country])
+    assert list(allocation['least_cost_technology']) == ['A', 'B', 'B', 'A']
+    np.testing.assert_allclose(allocation['lcoe'], [1, 4, 2, 1])
+
+def test_allocation_invalid_caps():
+    lcoe_df, demand, capacity_df = get_allocation_inputs()
+    caps = pd.DataFrame({'A': [1]}, index=['p1'])
+    with pytest.raises(ValueError, match='cap_boundary'):
+        get_least_cost_allocation(lcoe_df, demand, capacity_df, caps)
+    with pytest.raises(ValueError, match='cap_boundary'):
+        get_least_cost_allocation(lcoe_df, demand, capacity_df, caps,
+                                  cap_boundary=['p1'])
+    with pytest.raises(ValueError):
+        get_least_cost_allocation(lcoe_df, demand, capacity_df, [caps, caps],
+                                  cap_boundary=[['p1'] * 4])
+
+def test_least_cost():
+    lcoe_df = pd.DataFrame({'A': [1., 3, np.nan], 'B': [2., 1, 4]})
+    least_cost = get_least_cost(lcoe_df)
+    assert list(least_cost['least_cost_technology']) == ['A', 'B', 'B']
+    np.testing.assert_allclose(least_cost['lcoe'], [1, 1, 4])
+
+def test_pareto_front():
+    lcoe_df = pd.DataFrame({'A': [1., 1], 'B': [2., 2], 'C': [3., np.nan]})
+    emissions_df = pd.DataFrame({'A': [3., 3], 'B': [1., 2], 'C': [2., 0]})
+    front = get_pareto_front(lcoe_df, emissions_df)
+    # C is dominated by B in the first point and has no lcoe in the second
+    assert front.values.tolist() == [[True, True, False], [True, True, False]]
+    # with the same emissions the cheaper A dominates B
+    emissions_df['B'] = 3.
+    assert get_pareto_front(lcoe_df, emissions_df)['B'].tolist() == [False, False]
+
+def test_carbon_price_sweep():
+    lcoe_df = pd.DataFrame({'Diesel': [0.1, 0.1, np.nan], 'PV': [0.15, 0.2, np.nan]})
+    # 1 kgCO2/kWh: 0.1 $/kWh + 1 kg/kWh * price $/t / 1000
+    sweep = get_carbon_price_sweep(lcoe_df, {'Diesel': 1, 'PV': 0},
+                                   [0, 40, 60, 80, 120])
+    assert sweep.loc[0, [0., 40., 60.]].tolist() == ['Diesel', 'Diesel', 'PV']
+    assert sweep.loc[1, [80., 120.]].tolist() == ['Diesel', 'PV']
+    np.testing.assert_allclose(sweep['switch_carbon_price'], [60, 120, np.nan])
+    assert pd.isna(sweep.loc[2, 0.])
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nexus_tool import Model
+from nexus_tool.memory import load_spilled
+from test_pipeline import get_gw_model
+
+def get_crop_model():
+    df = pd.DataFrame({'gw_depth': [10., 50, 100, 20, 30],
+                       'country': ['a', 'a', 'b', 'a', 'b'],
+                       'id': [1, 2, 3, 4, 5]})
+    for i in range(1,13):
+        df[f'kc_{i}_dates'] = 0.5 + i / 100
+        df[f'harvest_{i}_dates'] = 1.
+        df[f'SSWD_{i}'] = [100., 200, 300, 400, 500]
+    model = Model(df)
+    model.crop_calendar = pd.DataFrame({'crop': ['dates']})
+    return model
+
+def test_optimize_memory(tmp_path):
+    pytest.importorskip('pyarrow')
+    model = get_crop_model()
+    data = model.df.copy()
+    model.memory_spill = str(tmp_path)
+    report = model.optimize_memory(stage='get_water_demand')
+    # the kc and harvest columns of every month are not read by any stage
+    assert report['dropped_columns'] == 24
+    assert report['bytes_saved'] == report['bytes_before'] - report['bytes_after'] > 0
+    assert model.df['gw_depth'].dtype == 'float32'
+    assert model.df['id'].dtype == 'int8'
+    assert model.df['country'].dtype == 'category'
+    assert 'kc_1_dates' not in model.df.columns
+    np.testing.assert_allclose(model.df['SSWD_1'], data['SSWD_1'])
+    spilled = load_spilled(str(tmp_path), 'get_water_demand')
+    pd.testing.assert_frame_equal(spilled, data[spilled.columns], check_dtype=False)
+    assert len(model.get_memory_report()) == 1
+
+def test_optimizer_after_every_stage():
+    expected = get_gw_model()
+    expected.run('get_total_pumping_energy')
+    model = get_gw_model()
+    model.memory_optimizer = True
+    model.run('get_total_pumping_energy')
+    # only the new columns of every stage are compacted
+    assert model.df['gw_depth'].dtype == 'float64'
+    assert model.df['ED_E_1'].dtype == 'float32'
+    pd.testing.assert_frame_equal(model.df, expected.df, check_dtype=False,
+                                  rtol=1e-6)
+    assert list(model.get_memory_report()['stage']) == \
+           ['get_gw_tdh', 'get_GWpumping_energy', 'get_total_pumping_energy']
+
+def test_spill_needs_a_stage(tmp_path):
+    model = get_crop_model()
+    data = model.df.copy()
+    model.memory_spill = str(tmp_path)
+    with pytest.raises(ValueError):
+        model.optimize_memory()
+    # the data is left untouched
+    pd.testing.assert_frame_equal(model.df, data)
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,166 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+
+from nexus_tool import Model
+from benchmarks.synthetic import get_points, add_technologies
+
+def test_lcoe_without_years():
+    model = Model(pd.DataFrame({'Demand point': ['a'], 'Year': [2020],
+                                'Month': [1], 'swpa_e': [1.]}))
+    model.create_standard_tech('Grid pump', life=10, om_cost=0.1,
+                               capital_cost=845, efficiency=0.55, cf=0.8,
+                               fuel_cost=0.1, fuel_req=1, emission_factor=0,
+                               env_cost=0)
+    with pytest.raises(ValueError, match='No years'):
+        model.get_lcoe(years=[], axis=0)
+    model.start_year = 2030
+    model.end_year = 2020
+    with pytest.raises(ValueError, match='No years'):
+        model.get_lcoe(axis=0)
+
+def get_least_cost_model():
+    model = Model(pd.DataFrame({'province': ['p1', 'p1', 'p2']}))
+    for name, lcoe in [('Grid', [1., 3, 2]), ('PV', [2., 1, 3]),
+                       ('Diesel', [3., 2, 1])]:
+        model.create_standard_tech(name, life=10, om_cost=0, capital_cost=0,
+                                   efficiency=1, cf=1, fuel_cost=0,
+                                   fuel_req=0, emission_factor=0, env_cost=0)
+        model.technologies[name].df['lcoe'] = lcoe
+    return model
+
+def test_least_cost():
+    model = get_least_cost_model()
+    model.get_least_cost()
+    assert list(model.df['least_cost_tech']) == ['Grid', 'PV', 'Diesel']
+    assert list(model.df['lcoe']) == [1, 1, 1]
+
+def test_least_cost_by_boundary():
+    model = get_least_cost_model()
+    model.get_least_cost(technologies={'p1': ['Grid', 'Diesel'], 'p2': 'PV'},
+                         geo_boundary='province')
+    # PV is the cheapest of the second point but not allowed in p1
+    assert list(model.df['least_cost_tech']) == ['Grid', 'Diesel', 'PV']
+    assert list(model.df['lcoe']) == [1, 2, 3]
+
+def run_energy_stages(n_workers = 1, executor = 'thread'):
+    df = get_points(50)
+    for i in range(1,13):
+        df[f'PD_E_{i}'] = df['crop_area'] * i
+    df['annual_el_demand'] = df['crop_area'] * 1000
+    model = Model(df)
+    model.start_year = 2020
+    model.end_year = 2050
+    model.discount_rate = 0.05
+    add_technologies(model, 8)
+    for stage in [model.get_cf, model.get_installed_capacity,
+                  model.get_max_capacity, model.get_lcoe]:
+        stage(n_workers=n_workers, executor=executor)
+    return model
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_workers_match_serial(executor):
+    serial = run_energy_stages()
+    model = run_energy_stages(n_workers=3, executor=executor)
+    assert list(model.technologies) == list(serial.technologies)
+    for name, tech in serial.technologies.items():
+        pd.testing.assert_frame_equal(model.technologies[name].df, tech.df)
+
+def get_pumping_model(copy_mode):
+    df = pd.DataFrame({'gw_depth': [10., 50], 'country': ['a', 'b']})
+    for i in range(1,13):
+        df[f'PWD_{i}'] = [1., 2]
+        df[f'SSWD_{i}'] = [100., 200]
+    df['tdh_gw'] = df['gw_depth']
+    return Model(df, trans_eff=0.9, pump_eff=0.5, copy_mode=copy_mode)
+
+def test_columns_copy_mode():
+    full = get_pumping_model('full')
+    columns = get_pumping_model('columns')
+    data = columns.df.copy()
+    expected = full.get_GWpumping_energy()
+    output = columns.get_GWpumping_energy()
+    # only the computed columns are returned and the data is not modified
+    assert sorted(output.columns) == sorted([f'{name}{i}' for name in
+                                             ['PD_E_', 'ED_E_'] for i in range(1,13)])
+    pd.testing.assert_frame_equal(output, expected[output.columns])
+    pd.testing.assert_frame_equal(columns.df, data)
+    # 9.81 * 2 l/s / 1000 * 50 m / 0.45 and 200 m3 * 50 m * 0.00272 / 0.45
+    assert output.loc[1, 'PD_E_1'] == pytest.approx(9.81 * 0.1 / 0.45)
+    assert output.loc[1, 'ED_E_1'] == pytest.approx(27.2 / 0.45)
+
+def test_models_do_not_share_state():
+    first = get_least_cost_model()
+    second = Model(pd.DataFrame({'province': ['p1']}))
+    second.kc_dict['crop'] = [0.5, 0.8, 1, 0.7]
+    assert list(second.technologies) == []
+    assert first.kc_dict == {}
+    assert Model.technologies == {} and Model.kc_dict == {}
+
+def test_concurrent_models():
+    models = [get_pumping_model('full') for i in range(4)]
+    for i, model in enumerate(models):
+        model.df['gw_depth'] *= i + 1
+    expected = [model.get_GWpumping_energy() for model in models]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda model: model.get_GWpumping_energy(),
+                                models))
+    for result, _expected in zip(results, expected):
+        pd.testing.assert_frame_equal(result, _expected)
+    clone = pickle.loads(pickle.dumps(models[1]))
+    pd.testing.assert_frame_equal(clone.get_GWpumping_energy(), expected[1])
+
+def get_long_format_model(**tech):
+    df = pd.DataFrame([{'Demand point': 'a', 'Year': year, 'Month': month,
+                        'swpa_e': 1.} for year in [2020, 2021, 2022]
+                       for month in range(1,13)])
+    model = Model(df)
+    model.start_year = 2020
+    model.end_year = 2022
+    params = dict(life=10, om_cost=0, capital_cost=0, efficiency=1, cf=1,
+                  fuel_cost=1, fuel_req=1, emission_factor=0, env_cost=0)
+    params.update(tech)
+    model.create_standard_tech('Grid pump', **params)
+    model.technologies['Grid pump'].max_cap = pd.DataFrame(
+                                        {'Demand point': ['a'] * 3,
+                                         'Year': [2020, 2021, 2022],
+                                         'ic': [1.] * 3}).set_index('Demand point')
+    return model
+
+@pytest.mark.parametrize('tech', [{'fuel_escalation': 0.5},
+                                  {'fuel_cost': np.array([[1, 1.5]])}])
+def test_long_format_lcoe_fuel_trajectory(tech):
+    model = get_long_format_model(**tech)
+    model.get_lcoe(years=[2020], axis=0)
+    # 12 kWh a year at 1, 1.5 and 2.25 $/kWh (a price matrix keeps its last
+    # price, 1.5 $/kWh, after its last year)
+    expected = 57 / 36 if 'fuel_escalation' in tech else 48 / 36
+    lcoe = model.technologies['Grid pump'].lcoe
+    assert lcoe['lcoe'].tolist() == [pytest.approx(expected)]
+
+def test_long_format_lcoe_per_point_price():
+    model = get_long_format_model(fuel_cost=np.array([1., 2]),
+                                  fuel_escalation=0.5)
+    with pytest.raises(ValueError, match='per point'):
+        model.get_lcoe(years=[2020], axis=0)
+
+def test_columns_copy_mode_with_missing_reads():
+    # ground water only data, without the surface water energy columns
+    model = get_pumping_model('columns')
+    model.get_gw_tdh(inplace=True)
+    model.get_GWpumping_energy(inplace=True)
+    output = model.get_total_pumping_energy()
+    assert list(output.columns) == [f'total_pumping_energy{i}'
+                                    for i in range(1,13)]
+    pd.testing.assert_series_equal(output['total_pumping_energy1'],
+                                   model.df['ED_E_1'], check_names=False)
+    # the columns computed again are returned, even if they are in the data
+    output = model.get_gw_tdh()
+    assert list(output.columns) == ['tdh_gw']
+
+def test_invalid_executor():
+    model = get_least_cost_model()
+    with pytest.raises(ValueError, match='executor'):
+        model.get_max_capacity(n_workers=2, executor='threads')
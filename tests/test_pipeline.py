@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from nexus_tool import Model
+
+def get_gw_model():
+    # ground water only data: the water demand is given and there are no
+    # surface water columns
+    df = pd.DataFrame({'gw_depth': [10., 50., 100.]})
+    for i in range(1,13):
+        df[f'PWD_{i}'] = [1., 2., 3.]
+        df[f'SSWD_{i}'] = [100., 200., 300.]
+    return Model(df, pump_eff = 0.6, trans_eff = 0.9)
+
+def test_total_pumping_energy_without_surface_water():
+    model = get_gw_model()
+    model.run('get_total_pumping_energy')
+    assert 'SWPA_E_1' not in model.df.columns
+    for i in range(1,13):
+        np.testing.assert_allclose(model.df[f'total_pumping_energy{i}'],
+                                   model.df[f'ED_E_{i}'])
+
+def test_surface_water_energy_is_added():
+    model = get_gw_model()
+    for i in range(1,13):
+        model.df[f'SWPA_E_{i}'] = 5.
+    model.run('get_total_pumping_energy')
+    np.testing.assert_allclose(model.df['total_pumping_energy1'],
+                               model.df['ED_E_1'] + 5)
+
+def test_edited_data_is_recomputed():
+    model = get_gw_model()
+    model.run('get_total_pumping_energy')
+    energy = model.df['ED_E_1'].copy()
+    model.df['gw_depth'] = model.df['gw_depth'] * 2
+    model.run('get_total_pumping_energy')
+    assert (model.df['ED_E_1'] > energy).all()
+    np.testing.assert_allclose(model.df['total_pumping_energy1'],
+                               model.df['ED_E_1'])
+
+def test_unchanged_data_is_not_recomputed():
+    model = get_gw_model()
+    model.run('get_total_pumping_energy')
+    model.df['total_pumping_energy1'] = -1.
+    model.run('get_total_pumping_energy')
+    assert (model.df['total_pumping_energy1'] == -1).all()
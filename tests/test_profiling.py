@@ -0,0 +1,69 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nexus_tool import Model
+from nexus_tool.profiling import (profile, record_profile, get_profile,
+                                  write_chrome_trace)
+
+@profile
+def add_column(df, size):
+    df['new'] = np.ones(size)
+    return df
+
+def test_calls_are_recorded():
+    with record_profile():
+        add_column(pd.DataFrame({'a': np.zeros(10)}), 10)
+    # not recorded once profiling is disabled again
+    add_column(pd.DataFrame({'a': np.zeros(5)}), 5)
+    table = get_profile()
+    assert list(table['name']) == ['add_column']
+    assert table.loc[0, 'rows'] == 10
+    assert table.loc[0, 'columns_added'] == 1
+
+def test_calls_with_keyword_arguments():
+    with record_profile():
+        add_column(df=pd.DataFrame({'a': np.zeros(10)}), size=10)
+    table = get_profile()
+    assert table.loc[0, 'rows'] == 10
+    assert table.loc[0, 'columns_added'] == 1
+
+def test_memory_kept_by_a_call():
+    pytest.importorskip('psutil')
+    size = 20000000
+    with record_profile():
+        add_column(pd.DataFrame({'a': np.zeros(size)}), size)
+        add_column(pd.DataFrame({'a': np.zeros(size)}), size)
+    # both calls keep a new 160 MB column, not only the first one
+    assert (get_profile()['rss_delta'] > 100e6).all()
+
+def test_worker_calls_are_merged():
+    model = Model(pd.DataFrame({f'srad{i}': [15000., 20000.]
+                                for i in range(1,13)}))
+    for name in ['PV 1', 'PV 2']:
+        model.create_pv_system(name, life=15, om_cost=0.01, capital_cost=1140,
+                               efficiency=0.7)
+    with record_profile():
+        model.get_cf(n_workers = 2, executor = 'process')
+    table = get_profile()
+    workers = table.loc[table['name'] == 'get_pv_cf', 'pid']
+    assert len(workers) == 2
+    assert (workers != os.getpid()).all()
+    assert (table.loc[table['name'] == 'Model.get_cf', 'pid'] == os.getpid()).all()
+
+def test_chrome_trace(tmp_path):
+    with record_profile():
+        add_column(pd.DataFrame({'a': np.zeros(10)}), 10)
+    path = str(tmp_path / 'trace.json')
+    write_chrome_trace(path)
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    record = get_profile().iloc[0]
+    assert len(events) == 1
+    assert events[0]['name'] == 'add_column' and events[0]['ph'] == 'X'
+    assert events[0]['ts'] == pytest.approx(record['start'] * 1e6)
+    assert events[0]['dur'] == pytest.approx(record['wall_time'] * 1e6)
+    assert events[0]['args']['rows'] == 10
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from nexus_tool.least_cost import (get_pv_cf, get_hourly_pv_cf,
+                                   get_clear_sky_profile)
+
+def get_srad_df():
+    df = pd.DataFrame({'lat': [-33.2, 10.2, 10.4, 35.]})
+    for i in range(1,13):
+        df[f'srad{i}'] = np.linspace(15000, 25000, df.shape[0]) + 100 * i
+    return df
+
+def test_horizontal_matches_daily_cf():
+    # on a horizontal panel the hourly profile only redistributes the daily
+    # radiation, so the daily mean is the cf of the simple model
+    df = get_srad_df()
+    cf = get_hourly_pv_cf(df, 'srad', 'lat', tilt=0)
+    simple = get_pv_cf(df, 'srad')
+    for i in range(1,13):
+        np.testing.assert_allclose(cf[:, i-1].mean(axis=1), simple[f'cf_{i}'])
+
+def test_clear_sky_profiles_are_cached():
+    get_clear_sky_profile.cache_clear()
+    df = get_srad_df()
+    get_hourly_pv_cf(df, 'srad', 'lat')
+    # the points at 10.2 and 10.4 degrees share the 10 degrees band
+    assert get_clear_sky_profile.cache_info().currsize == 3 * 12
+    get_hourly_pv_cf(df, 'srad', 'lat')
+    assert get_clear_sky_profile.cache_info().hits == 3 * 12
+    horizontal, beam, _ = get_clear_sky_profile(10., 6, 10.)
+    np.testing.assert_allclose(horizontal.sum(), 1)
+    assert not (horizontal.flags.writeable or beam.flags.writeable)
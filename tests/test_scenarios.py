@@ -0,0 +1,59 @@
+import os
+import pandas as pd
+import pytest
+
+from nexus_tool.profiling import profile, record_profile, get_profile
+from nexus_tool.scenarios import ScenarioRunner
+
+def scale_case(load_data, factor):
+    df = pd.read_csv(os.path.join(load_data, 'input.csv'))
+    df['y'] = df['x'] * factor
+    return {'results': df}
+
+@profile
+def profiled_case(load_data, factor):
+    return scale_case(load_data, factor)
+
+def make_tree(path):
+    for i, case in enumerate([('Reference', 'Sub', '1'), ('Reference', 'Sub', '2'),
+                              ('Solar', 'Sub', '1')]):
+        folder = path.joinpath(*case)
+        folder.mkdir(parents=True)
+        pd.DataFrame({'Year': [2020, 2021], 'x': [i, i + 0.5]}).to_csv(
+                                        folder / 'input.csv', index=False)
+    # a case without data is recorded as an error
+    path.joinpath('Solar', 'Sub', '2').mkdir()
+    return str(path)
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_runner(tmp_path, n_workers):
+    load_folder = make_tree(tmp_path / 'load')
+    results_folder = str(tmp_path / 'results')
+    index = ScenarioRunner(scale_case, load_folder, results_folder,
+                           shared={'factor': 2}, n_workers=n_workers).run()
+    assert index[['scenario', 'level']].values.tolist() == \
+           [['Reference', '1'], ['Reference', '2'], ['Solar', '1'], ['Solar', '2']]
+    assert index['error'].isna().tolist() == [True, True, True, False]
+    df = pd.read_csv(os.path.join(results_folder, 'Solar', 'Sub', '1',
+                                  'results.csv'))
+    assert list(df['y']) == [4, 5]
+    stored = pd.read_csv(os.path.join(results_folder, 'results_index.csv'))
+    assert list(stored['rows']) == [2, 2, 2, 0]
+
+def test_parquet_output_and_worker_records(tmp_path):
+    pytest.importorskip('pyarrow')
+    from nexus_tool.datasets import read_dataset
+    load_folder = make_tree(tmp_path / 'load')
+    results_folder = str(tmp_path / 'results')
+    with record_profile():
+        ScenarioRunner(profiled_case, load_folder, results_folder,
+                       scenarios=['Reference'], shared={'factor': 2},
+                       n_workers=2, output_format='parquet').run()
+    # one record per case from the worker processes
+    table = get_profile()
+    assert list(table['name']) == ['profiled_case'] * 2
+    assert os.getpid() not in list(table['pid'])
+    df = read_dataset(os.path.join(results_folder, 'results'))
+    df = df.sort_values(['level', 'Year'])
+    assert list(df['y']) == [0, 1, 2, 3]
+    assert list(df['level']) == ['1', '1', '2', '2']
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nexus_tool.least_cost import get_lcoe, get_price_trajectory
+from nexus_tool.sensitivity import sample_parameters, get_lcoe_sensitivity
+
+n_points = 10
+project_life = 30
+discount_rate = 0.05
+
+def get_tech(fuel_cost):
+    return {'max_cap': np.linspace(1, 3, n_points), 'life': 10,
+            'om_cost': 0.1, 'capital_cost': 900, 'efficiency': 0.3,
+            'fuel_cost': fuel_cost, 'fuel_req': 0.1, 'emission_factor': 2.7,
+            'env_cost': 0.01}
+
+def get_demand():
+    return np.linspace(1e3, 1e4, n_points)
+
+fuel_costs = {'scalar': 0.8,
+              'per point': np.linspace(0.5, 1, n_points),
+              'trajectory': get_price_trajectory(0.8, 2020, 2020 + project_life,
+                                                 escalation=0.02),
+              'per year': get_price_trajectory(0.8, 2020, 2020 + project_life,
+                                               escalation=0.02)[0],
+              'points x years': get_price_trajectory(np.linspace(0.5, 1, n_points),
+                                                     2020, 2020 + project_life,
+                                                     escalation=0.02)}
+
+@pytest.mark.parametrize('fuel_cost', list(fuel_costs))
+def test_base_sample_matches_get_lcoe(fuel_cost):
+    tech = get_tech(fuel_costs[fuel_cost])
+    lcoe_df, probability_df = get_lcoe_sensitivity({'Diesel': tech}, {},
+                                                   get_demand(), project_life,
+                                                   discount_rate,
+                                                   percentiles=(50,))
+    price = np.asarray(tech['fuel_cost'], dtype=float)
+    if fuel_cost == 'per year':
+        price = price.reshape(1, -1)
+    expected = get_lcoe(tech['max_cap'], get_demand(), tech['life'],
+                        tech['om_cost'], tech['capital_cost'], discount_rate,
+                        project_life, price, tech['fuel_req'],
+                        tech['efficiency'], tech['emission_factor'],
+                        tech['env_cost'], 2020, 2020 + project_life)
+    np.testing.assert_allclose(lcoe_df['Diesel p50'], expected, rtol=1e-10)
+    assert (probability_df['probability'] == 1).all()
+
+@pytest.mark.parametrize('fuel_cost', list(fuel_costs))
+def test_blocks_match_single_block(fuel_cost):
+    techs = {'Diesel': get_tech(fuel_costs[fuel_cost]),
+             'PV': dict(get_tech(0), capital_cost=1140, life=15)}
+    samples = sample_parameters({'discount_rate': ('uniform', 0.03, 0.08),
+                                 'Diesel': {'fuel_cost_scale': ('normal', 1, 0.2)}},
+                                50, seed=1)
+    single = get_lcoe_sensitivity(techs, samples, get_demand(), project_life,
+                                  discount_rate, chunk_size=100)
+    blocks = get_lcoe_sensitivity(techs, samples, get_demand(), project_life,
+                                  discount_rate, chunk_size=3)
+    for expected, actual in zip(single, blocks):
+        pd.testing.assert_frame_equal(actual, expected)
+
+def test_default_chunk_size_with_trajectory():
+    # 16e6 / (1000 samples * 4 technologies) = 4000 points per block
+    n = 4500
+    tech = dict(get_tech(fuel_costs['trajectory']),
+                max_cap=np.ones(n))
+    techs = {name: dict(tech) for name in ['a', 'b', 'c', 'd']}
+    samples = sample_parameters({'a': {'capital_cost': ('uniform', 800, 1000)}},
+                                1000, seed=0)
+    lcoe_df, _ = get_lcoe_sensitivity(techs, samples, np.full(n, 1e3),
+                                      project_life, discount_rate,
+                                      percentiles=(50,))
+    assert lcoe_df.shape[0] == n
+    np.testing.assert_allclose(lcoe_df['b p50'], lcoe_df['b p50'].iloc[0])
+
+def test_least_cost_probability():
+    # the capital cost of PV is cheaper than the diesel one in 1 of 4 samples
+    # and the diesel set is not allowed in the last point
+    techs = {'Diesel': get_tech(0), 'PV': get_tech(0)}
+    samples = {'PV': {'capital_cost': np.array([800., 1000, 1100, 1200])}}
+    mask = np.ones((n_points, 2), dtype=bool)
+    mask[-1, 0] = False
+    lcoe_df, probability_df = get_lcoe_sensitivity(techs, samples, get_demand(),
+                                                   project_life, discount_rate,
+                                                   mask=mask, chunk_size=4)
+    np.testing.assert_allclose(probability_df['PV'], [0.25] * 9 + [1])
+    np.testing.assert_allclose(probability_df['Diesel'], [0.75] * 9 + [0])
+    assert list(probability_df['least_cost_tech']) == ['Diesel'] * 9 + ['PV']
+    assert lcoe_df['Diesel p50'].isna().tolist() == [False] * 9 + [True]
+    np.testing.assert_allclose(lcoe_df['lcoe p95'][:9], lcoe_df['Diesel p95'][:9])
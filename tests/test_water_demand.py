@@ -0,0 +1,43 @@
+import os
+import io
+import ast
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('openpyxl')
+
+from nexus_tool import Model
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def read_nwsas_results():
+    # the NWSAS 20 points data with the results of the original notebooks
+    lines = pd.read_excel(os.path.join(root, 'NWSAS_waterdemand_20points_data.xlsx'),
+                          header=None)[0]
+    df = pd.read_csv(io.StringIO('\n'.join(lines)))
+    df['crop_share'] = df['crop_share'].map(ast.literal_eval)
+    return df
+
+def test_water_demand_matches_the_nwsas_results():
+    results = read_nwsas_results()
+    columns = list(results.columns)
+    # inputs and the ETo of the original run (computed with pyeto)
+    df = results[columns[:columns.index('crop_share') + 1] +
+                 [f'ETo_{i}' for i in range(1,13)]].copy()
+    crop_calendar = pd.read_excel(os.path.join(root, 'nwsas_data',
+                                               'NWSAS_crop_calendar.xlsx'))
+    model = Model(df, crop_calendar = crop_calendar)
+    model.kc_dict = {'dates': [0.8,0.9,1,0.8], 'vegetable': [0.5,1,1,0.8],
+                     'olives': [0.45,0.55,0.55,0.6]}
+    model.ky_dict = {'dates': 0.5, 'vegetable': 1.1, 'olives': 0.8}
+    model.pumping_hours_per_day = 10
+    model.deff = 1
+    model.aeff = 0.45
+    model.run('get_water_demand')
+    for name in ['eff_', 'PCWR_', 'PWD_', 'SSWD_']:
+        for i in range(1,13):
+            np.testing.assert_allclose(model.df[f'{name}{i}'],
+                                       results[f'{name}{i}'],
+                                       rtol=1e-12, atol=1e-12)
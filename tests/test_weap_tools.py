@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+
+gpd = pytest.importorskip('geopandas')
+pytest.importorskip('rasterio')
+
+from shapely.geometry import LineString
+
+from nexus_tool.weap_tools import get_distance_to_lines
+from nexus_tool.least_cost import get_grid_extension_cost
+
+def test_distance_to_lines_in_metres():
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy([500000, 503000, 0],
+                                                          [3000100, 2999000, 0]),
+                              crs='EPSG:32632')
+    lines = gpd.GeoDataFrame(geometry=[LineString([(490000, 3000000),
+                                                   (510000, 3000000)])],
+                             crs='EPSG:32632')
+    distance = get_distance_to_lines(points, lines)
+    np.testing.assert_allclose(distance[:2], [100, 1000])
+
+def test_distance_to_lines_projects_geographic_points():
+    # 0.01 degrees of latitude are about 1109 m
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy([10.5], [30.01]),
+                              crs='EPSG:4326')
+    lines = gpd.GeoDataFrame(geometry=[LineString([(x, 30) for x in
+                                                   np.linspace(10, 11, 101)])],
+                             crs='EPSG:4326')
+    distance = get_distance_to_lines(points, lines)
+    np.testing.assert_allclose(distance, [1109], rtol=0.01)
+    with pytest.raises(ValueError):
+        get_distance_to_lines(points, lines, crs='EPSG:4326')
+
+def test_grid_extension_cost():
+    cost = get_grid_extension_cost(np.array([500, 2000, np.nan, 10000]),
+                                   cost_per_km=1000, max_distance=5000)
+    np.testing.assert_allclose(cost, [500, 2000, np.inf, np.inf])
+
+def write_raster(path, data, left = 0, top = 100, res = 1, nodata = None,
+                 crs = 'EPSG:32632'):
+    import rasterio
+    from rasterio.transform import from_origin
+
+    data = np.asarray(data)
+    data = data[None] if data.ndim == 2 else data
+    with rasterio.open(path, 'w', driver='GTiff', width=data.shape[2],
+                       height=data.shape[1], count=data.shape[0],
+                       dtype=data.dtype, crs=crs, nodata=nodata,
+                       transform=from_origin(left, top, res, res),
+                       tiled=True, blockxsize=16, blockysize=16) as dst:
+        dst.write(data)
+    return str(path)
+
+def get_raster_data(shape = (2, 100, 100)):
+    return np.arange(np.prod(shape), dtype='float32').reshape(shape)
+
+def test_sample_raster_matches_rasterio_sample(tmp_path):
+    import rasterio
+    from nexus_tool.weap_tools import sample_raster
+
+    path = write_raster(tmp_path / 'dem.tif', get_raster_data((1, 100, 100)))
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0, 100, 500), rng.uniform(0, 100, 500)
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y),
+                              crs='EPSG:32632')
+    with rasterio.open(path) as src:
+        expected = [float(value[0]) for value in src.sample(zip(x, y))]
+    assert sample_raster(path, points) == expected
+
+def test_sample_raster_links(tmp_path):
+    from nexus_tool.weap_tools import sample_raster
+
+    path = write_raster(tmp_path / 'dem.tif', get_raster_data((1, 100, 100)))
+    # links are sampled at their first coordinate, as before
+    links = gpd.GeoDataFrame(geometry=[LineString([(10.5, 89.5), (50, 50)]),
+                                       LineString([(0.5, 99.5), (90, 10)])],
+                             crs='EPSG:32632')
+    assert sample_raster(path, links) == [1010., 0.]
+    with pytest.raises(ValueError):
+        sample_raster(path, gpd.GeoDataFrame(geometry=[LineString()],
+                                             crs='EPSG:32632'))
+
+def test_sample_rasters_bands_and_nodata(tmp_path):
+    from nexus_tool.weap_tools import sample_rasters
+
+    data = get_raster_data()
+    data[1, 0, 0] = -1
+    path = write_raster(tmp_path / 'climate.tif', data, nodata=-1)
+    x = np.array([0.5, 20.5, 200])
+    y = np.array([99.5, 89.5, 50])
+    values = sample_rasters(path, (x, y))
+    np.testing.assert_array_equal(values, [[0, np.nan], [1020, 11020],
+                                           [np.nan, np.nan]])
+    values = sample_rasters([path, path], (x, y), bands=[2], nodata=None)
+    np.testing.assert_array_equal(values, [[-1, -1], [11020, 11020],
+                                           [-1, -1]])
+
+def get_tiles(tmp_path):
+    data = get_raster_data((2, 60, 50))
+    # two overlapping tiles, the second one with a nodata hole
+    second = data + 1000
+    second[:, :5, :5] = -1
+    return [write_raster(tmp_path / 'a.tif', data, nodata=-1),
+            write_raster(tmp_path / 'b.tif', second, left=30, top=80,
+                         nodata=-1)]
+
+@pytest.mark.parametrize('method', ['first', 'last'])
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_windowed_mosaic_matches_merge(tmp_path, method, n_workers):
+    import rasterio
+    from rasterio.merge import merge
+    from nexus_tool.weap_tools import merge_rasters_windowed
+
+    files = get_tiles(tmp_path)
+    with rasterio.open(files[0]) as a, rasterio.open(files[1]) as b:
+        expected, transform = merge([a, b], method=method)
+    output = merge_rasters_windowed(files, str(tmp_path / 'mosaic.tif'),
+                                    method=method, memory_limit=20000,
+                                    n_workers=n_workers, block_size=16)
+    with rasterio.open(output) as src:
+        assert src.transform == transform
+        assert src.crs == 'EPSG:32632'
+        np.testing.assert_array_equal(src.read(), expected)
+
+def test_mosaic_sources_must_match(tmp_path):
+    from nexus_tool.weap_tools import merge_rasters_windowed
+
+    files = get_tiles(tmp_path)
+    bands = write_raster(tmp_path / 'c.tif', get_raster_data((1, 10, 10)))
+    with pytest.raises(ValueError, match='number of bands'):
+        merge_rasters_windowed(files + [bands], str(tmp_path / 'mosaic.tif'))
+    dtype = write_raster(tmp_path / 'd.tif',
+                         get_raster_data((2, 10, 10)).astype('int16'))
+    with pytest.raises(ValueError, match='data type'):
+        merge_rasters_windowed(files + [dtype], str(tmp_path / 'mosaic.tif'))
+    crs = write_raster(tmp_path / 'e.tif', get_raster_data((2, 10, 10)),
+                       crs='EPSG:32633')
+    with pytest.raises(ValueError, match='CRS'):
+        merge_rasters_windowed(files + [crs], str(tmp_path / 'mosaic.tif'))
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_windowed_reprojection_matches_reproject(tmp_path, n_workers):
+    import rasterio
+    from nexus_tool.weap_tools import (reproject_raster,
+                                       reproject_raster_windowed)
+
+    path = write_raster(tmp_path / 'dem.tif', get_raster_data((2, 80, 60)),
+                        left=500000, top=3000000, res=100, nodata=-1)
+    expected = reproject_raster(path, 'EPSG:4326', str(tmp_path / 'full.tif'))
+    output = reproject_raster_windowed(path, 'EPSG:4326',
+                                       str(tmp_path / 'windowed.tif'),
+                                       n_workers=n_workers,
+                                       memory_limit=20000, block_size=16)
+    with rasterio.open(str(tmp_path / 'full.tif')) as full, \
+         rasterio.open(output) as windowed:
+        assert windowed.crs == full.crs
+        assert windowed.transform.almost_equals(full.transform)
+        np.testing.assert_array_equal(windowed.read(), full.read())